@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval benchmark for the vector store.
+
+Builds synthetic chat corpora (10k / 100k / 1M messages by default), embeds them
+with a deterministic local stand-in for text-embedding-3-small, and measures
+each index configuration the bot can run with:
+
+  flat, fp16, sq8, sq8+rescore, pq, pq+rescore   (vector_quantization)
+  hybrid                                          (flat + BM25, hybrid_retriever)
+
+For every corpus size and configuration it reports ingest throughput, index
+memory, query latency percentiles + histogram, recall@k against the labelled
+query set and overlap with exact search. Results are written as JSON so runs
+can be diffed before/after index or storage changes.
+
+No network or API key is needed:
+    python benchmark_vector_store.py --sizes 10000,100000 --out bench_results/vectors.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import platform
+import tempfile
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from hybrid_retriever import BM25Index, reciprocal_rank_fusion
+from vector_quantization import VectorSidecar, build_index, bytes_per_vector, rescore, storage_kind
+
+logger = logging.getLogger(__name__)
+
+CONFIGS = ("flat", "fp16", "sq8", "sq8+rescore", "pq", "pq+rescore", "hybrid")
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# ---------- synthetic chat corpus ----------
+_WORDS = (
+    "yo bro fr no cap lowkey highkey bet lol lmao ngl tbh idk rn bruh wym sus mid fire bussin "
+    "based cringe vibe vibes ratio cooked goated grind ranked match lobby squad duo queue carry "
+    "lag ping server patch nerf buff meta build loadout skin drop clutch ace headshot respawn "
+    "stream clip edit meme gif pic song album track beat homework exam teacher class lunch pizza "
+    "burger sleep tired bored hyped mad sad happy weekend tonight tomorrow later game play win "
+    "lose team enemy boss level quest raid loot craft mine spawn base trade price sale steam "
+    "discord voice call chat channel mod admin role ban kick mute emoji react reply dm"
+).split()
+_GAMES = ("valorant", "fortnite", "minecraft", "roblox", "apex", "overwatch", "warzone", "rocketleague",
+          "genshin", "league", "cs2", "gta", "eldenring", "terraria", "amongus", "rust")
+
+
+def make_corpus(n: int, seed: int = 0) -> Tuple[List[List[str]], List[str]]:
+    """n messages as token lists; a few thousand usernames + game titles act as rare 'exact' tokens"""
+    rng = random.Random(seed)
+    users = [f"user_{rng.randrange(36 ** 4):04x}{i}" for i in range(max(50, n // 200))]
+    docs = []
+    for _ in range(n):
+        tokens = [rng.choice(_WORDS) for _ in range(rng.randint(3, 14))]
+        if rng.random() < 0.35:
+            tokens.insert(rng.randrange(len(tokens)), rng.choice(_GAMES))
+        if rng.random() < 0.25:
+            tokens.insert(rng.randrange(len(tokens)), "@" + rng.choice(users))
+        docs.append(tokens)
+    return docs, users
+
+
+def make_queries(docs: List[List[str]], count: int, seed: int = 1) -> List[Tuple[str, int]]:
+    """Labelled queries: a noisy partial paraphrase of one message, labelled with that message"""
+    rng = random.Random(seed)
+    queries = []
+    for doc_id in rng.sample(range(len(docs)), min(count, len(docs))):
+        tokens = docs[doc_id]
+        keep = [t for t in tokens if rng.random() < 0.7] or tokens[:1]
+        if rng.random() < 0.3:
+            keep.append(rng.choice(_WORDS))
+        rng.shuffle(keep)
+        queries.append((" ".join(keep), doc_id))
+    return queries
+
+
+# ---------- local embedding stand-in ----------
+class LocalEmbedder:
+    """Deterministic bag-of-hashed-token embeddings, L2-normalised like OpenAI's"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._cache: Dict[str, np.ndarray] = {}
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vec = self._cache.get(token)
+        if vec is None:
+            seed = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vec = np.random.default_rng(seed).standard_normal(self.dim).astype("float32")
+            self._cache[token] = vec
+        return vec
+
+    def embed(self, token_lists: List[List[str]], batch: int = 10000) -> np.ndarray:
+        out = np.empty((len(token_lists), self.dim), dtype="float32")
+        for start in range(0, len(token_lists), batch):
+            for i, tokens in enumerate(token_lists[start:start + batch], start=start):
+                out[i] = np.sum([self._token_vector(t) for t in tokens], axis=0)
+        out /= np.linalg.norm(out, axis=1, keepdims=True) + 1e-12
+        return out
+
+
+# ---------- measurement helpers ----------
+def latency_summary(samples_ms: List[float]) -> Dict:
+    arr = np.asarray(samples_ms)
+    counts, _ = np.histogram(arr, bins=(0.0,) + LATENCY_BUCKETS_MS + (float("inf"),))
+    hist = {f"le_{upper}ms": int(c) for upper, c in zip(LATENCY_BUCKETS_MS, counts)}
+    hist["gt_max"] = int(counts[-1])
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p90_ms": round(float(np.percentile(arr, 90)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "max_ms": round(float(arr.max()), 3),
+        "histogram": hist,
+    }
+
+
+def run_config(config: str, vectors: np.ndarray, doc_texts: List[str], queries: List[Tuple[str, int]],
+               query_vectors: np.ndarray, truth: np.ndarray, k: int, rescore_factor: int,
+               train_size: int, workdir: str) -> Dict:
+    n, dim = vectors.shape
+    kind = config.split("+")[0] if config != "hybrid" else "flat"
+    use_rescore = config.endswith("+rescore")
+
+    started = time.perf_counter()
+    rng = np.random.default_rng(0)
+    train = vectors[rng.choice(n, size=min(train_size, n), replace=False)]
+    index = build_index(kind, dim, train)
+    index.add(vectors)
+    sidecar = None
+    if use_rescore:
+        sidecar = VectorSidecar(os.path.join(workdir, f"{config}.f32"), dim)
+        sidecar.rewrite(vectors)
+    bm25 = None
+    if config == "hybrid":
+        bm25 = BM25Index()
+        bm25.add_many((str(i), text) for i, text in enumerate(doc_texts))
+    ingest_s = time.perf_counter() - started
+
+    latencies, label_hits, overlap = [], 0, 0.0
+    for qi, (text, label) in enumerate(queries):
+        q = query_vectors[qi:qi + 1]
+        t0 = time.perf_counter()
+        fetch = k * rescore_factor if (use_rescore or bm25 is not None) else k
+        _, found = index.search(q, fetch)
+        positions = [int(p) for p in found[0] if p >= 0]
+        if sidecar is not None:
+            positions = rescore(q[0], positions, sidecar)[:k]
+        elif bm25 is not None:
+            sparse = [int(doc_id) for doc_id, _ in bm25.search(text, k=fetch)]
+            fused = reciprocal_rank_fusion([positions, sparse])
+            positions = sorted(fused, key=fused.get, reverse=True)[:k]
+        else:
+            positions = positions[:k]
+        latencies.append((time.perf_counter() - t0) * 1000)
+        label_hits += label in positions
+        overlap += len(set(positions) & set(truth[qi])) / k
+
+    result = {
+        "config": config,
+        "storage": storage_kind(index),
+        "ingest_seconds": round(ingest_s, 3),
+        "ingest_vectors_per_s": round(n / ingest_s, 1) if ingest_s else None,
+        "index_mb": round(n * bytes_per_vector(index) / 1e6, 2),
+        "sidecar_disk_mb": round(n * dim * 4 / 1e6, 2) if sidecar else 0,
+        "bm25_terms": len(bm25.postings) if bm25 else 0,
+        f"recall@{k}": round(label_hits / len(queries), 4),
+        f"overlap_with_exact@{k}": round(overlap / len(queries), 4),
+        "latency": latency_summary(latencies),
+    }
+    logger.info(f"  {config:<12} recall@{k}={result[f'recall@{k}']:.3f} "
+                f"p50={result['latency']['p50_ms']}ms p99={result['latency']['p99_ms']}ms "
+                f"index={result['index_mb']}MB ingest={result['ingest_vectors_per_s']}/s")
+    return result
+
+
+def run_size(n: int, args) -> Dict:
+    logger.info(f"Corpus of {n} messages (dim={args.dim})")
+    docs, _ = make_corpus(n, seed=args.seed)
+    queries = make_queries(docs, args.queries, seed=args.seed + 1)
+    doc_texts = [" ".join(tokens) for tokens in docs]
+    embedder = LocalEmbedder(args.dim)
+
+    t0 = time.perf_counter()
+    vectors = embedder.embed(docs)
+    embed_s = time.perf_counter() - t0
+    query_vectors = embedder.embed([text.split() for text, _ in queries])
+
+    import faiss
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(vectors)
+    _, truth = exact.search(query_vectors, args.k)
+    del exact
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for config in args.configs:
+            results.append(run_config(config, vectors, doc_texts, queries, query_vectors, truth,
+                                      args.k, args.rescore_factor, args.train_size, workdir))
+    return {
+        "messages": n,
+        "queries": len(queries),
+        "embed_seconds": round(embed_s, 3),
+        "raw_float32_mb": round(n * args.dim * 4 / 1e6, 2),
+        "configs": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline vector store retrieval benchmark")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma separated corpus sizes")
+    parser.add_argument("--configs", default=",".join(CONFIGS), help=f"subset of {','.join(CONFIGS)}")
+    parser.add_argument("--dim", type=int, default=384,
+                        help="embedding dim (1536 matches production but needs ~6 GB for 1M messages)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--train-size", type=int, default=50000, help="vectors used to train sq8/pq")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_results/vector_store.json")
+    args = parser.parse_args(argv)
+    args.configs = [c.strip() for c in args.configs.split(",") if c.strip()]
+    unknown = set(args.configs) - set(CONFIGS)
+    if unknown:
+        parser.error(f"unknown configs: {sorted(unknown)}")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    report = {
+        "benchmark": "vector_store",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "runs": [run_size(int(size), args) for size in args.sizes.split(",") if size.strip()],
+    }
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,20 +3,22 @@ load_dotenv()
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Set
+from typing import Dict
 import discord
 from discord.ext import commands
-from discord import app_commands
 from memory_manager import DatabaseManager  # Switched from Postgres to JSON
 import os
 
 # NEW: LangChain embeddings setup
 from langchain.embeddings import OpenAIEmbeddings
-from vector_store import search_similar_texts, add_text_to_vector_store
+from vector_store import async_vector_store
+from http_pool import http_pool
+from message_coalescer import MessageCoalescer
 
 embedding_model = OpenAIEmbeddings(
     model="text-embedding-3-small",
-    openai_api_key=os.getenv("OPENAI_API_KEY"),
+    openai_api_key=os.getenv("OPENAI_API_KEY") or ("local" if os.getenv("OPENAI_BASE_URL") else None),
+    openai_api_base=os.getenv("OPENAI_BASE_URL") or None,
     dimensions=1536  # optional for 3-small; remove if using ada-002
 )
 
@@ -36,7 +38,8 @@ class DiscordBot(commands.Bot):
         super().__init__(command_prefix='!', intents=intents)
 
         self.user_interactions: Dict[int, datetime] = {}
-        self.processing_users: Set[int] = set()
+        # lines typed in quick succession (or while a reply is in flight) get one answer
+        self.coalescer = MessageCoalescer(self._answer)
 
     async def setup_hook(self):
         try:
@@ -53,15 +56,25 @@ class DiscordBot(commands.Bot):
         except Exception as e:
             logger.error(f"❌ Failed to sync slash commands: {e}")
 
+    async def close(self):
+        try:
+            await super().close()
+        finally:
+            await http_pool.close()
+
     async def on_ready(self):
         logger.info(f'{self.user} has connected to Discord!')
         logger.info(f'Bot is in {len(self.guilds)} guilds')
+        # periodic vector store retention + compaction
+        async_vector_store.start_maintenance()
 
     async def on_message(self, message):
         if message.author == self.user or isinstance(message.channel, discord.DMChannel):
             return
 
-        if message.author.id in self.processing_users:
+        # a burst from this user here is pending or being answered: join it
+        if self.coalescer.is_active(message) and not message.content.startswith(self.command_prefix):
+            self.coalescer.add(message)
             return
 
         should_respond = False
@@ -77,47 +90,49 @@ class DiscordBot(commands.Bot):
                 should_respond = True
 
         if should_respond:
-            self.processing_users.add(user_id)
-            try:
-                self.user_interactions[user_id] = current_time
-                async with message.channel.typing():
-                    import random
-                    await asyncio.sleep(random.uniform(1.0, 3.0))
-
-                    conversation_memory = memory.get_user_memory(str(user_id))
-
-                    # NEW: Search for similar past messages
-                    try:
-                        vector_contexts = search_similar_texts(message.content, k=3)
-                        context = "\n".join(vector_contexts)
-                    except Exception as e:
-                        logger.warning(f"Vector search failed or missing index: {e}")
-                        context = ""
-
-                    from openai_client import generate_response
-                    response = await generate_response(
-                        message.content, message.author.name, context
-                    )
-
-                    memory.update_user_memory(str(user_id), "last_message", message.content)
-                    memory.update_user_memory(str(user_id), "last_response", response)
-
-                    # NEW: Add to vector memory too
-                    try:
-                        add_text_to_vector_store([message.content])
-                    except Exception as e:
-                        logger.warning(f"Failed to add message to vector store: {e}")
-
-                if response:
-                    await message.reply(response, mention_author=False)
-            except Exception as e:
-                logger.error(f"Error processing message: {e}")
-                await message.channel.send("yo my bad, something went wrong lol")
-            finally:
-                self.processing_users.discard(user_id)
+            self.coalescer.add(message)
 
         await self.process_commands(message)
 
+    async def _answer(self, messages):
+        """One reply for a burst of lines from one user in one channel"""
+        message = messages[-1]
+        user_id = message.author.id
+        content = " ".join(m.content.strip() for m in messages if m.content and m.content.strip())
+        # vector memory is partitioned per guild (per channel in DMs) so it never crosses servers
+        scope = str(message.guild.id) if message.guild else f"dm:{message.channel.id}"
+        try:
+            self.user_interactions[user_id] = datetime.utcnow()
+            async with message.channel.typing():
+                import random
+                await asyncio.sleep(max(0.0, random.uniform(1.0, 3.0) - self.coalescer.window))
+
+                # NEW: Search for similar past messages
+                try:
+                    # hybrid dense + keyword retrieval: better hits, so fewer are needed
+                    vector_contexts = await async_vector_store.hybrid_search(content, k=2, guild_id=scope)
+                    context = "\n".join(vector_contexts)
+                except Exception as e:
+                    logger.warning(f"Vector search failed or missing index: {e}")
+                    context = ""
+
+                from openai_client import generate_response
+                response = await generate_response(
+                    content, message.author.name, context
+                )
+
+                memory.update_user_memory(str(user_id), "last_message", content)
+                memory.update_user_memory(str(user_id), "last_response", response)
+
+                # NEW: Add to vector memory too (batched + persisted off the event loop)
+                async_vector_store.schedule_add([m.content for m in messages if m.content], guild_id=scope)
+
+            if response:
+                await message.reply(response, mention_author=False)
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
+            await message.channel.send("yo my bad, something went wrong lol")
+
     @commands.command(name='ping')
     async def ping(self, ctx):
         import random
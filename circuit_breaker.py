@@ -0,0 +1,164 @@
+"""
+Per-dependency circuit breakers (OpenAI, Google CSE, Trigen, database).
+
+closed     calls pass through; FAILURE_THRESHOLD consecutive failures open it
+open       calls fail fast with CircuitOpenError until the reset timeout passes
+half_open  one probe call is let through; success closes the circuit, failure
+           re-opens it with a doubled reset timeout (capped)
+
+Callers turn CircuitOpenError into their usual persona reply. ``snapshot()``
+is served on /health.
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+FAILURE_THRESHOLD = int(os.getenv("JIM_BREAKER_FAILURES", "5"))
+RESET_TIMEOUT_SECONDS = float(os.getenv("JIM_BREAKER_RESET_SECONDS", "30"))
+MAX_RESET_TIMEOUT_SECONDS = float(os.getenv("JIM_BREAKER_MAX_RESET_SECONDS", "300"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit open, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 reset_timeout: float = RESET_TIMEOUT_SECONDS, max_reset_timeout: float = MAX_RESET_TIMEOUT_SECONDS,
+                 is_failure: Optional[Callable[[BaseException], bool]] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.is_failure = is_failure or (lambda e: True)
+        self.state = CLOSED
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+        self.last_error: Optional[str] = None
+
+    # ---------- state machine ----------
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+                logger.info(f"{self.name} circuit half-open, probing")
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def retry_in(self) -> float:
+        return max(0.0, self._reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"{self.name} circuit closed, dependency recovered")
+            self.state = CLOSED
+            self._failures = 0
+            self._reset_timeout = self.base_reset_timeout
+            self._probe_in_flight = False
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self.stats["failures"] += 1
+            self.last_error = str(error)[:200] if error is not None else None
+            self._failures += 1
+            if self.state == HALF_OPEN:
+                self._reset_timeout = min(self.max_reset_timeout, self._reset_timeout * 2)
+                self._open()
+            elif self.state == CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self.stats["opened"] += 1
+        logger.warning(f"{self.name} circuit OPEN for {self._reset_timeout:.0f}s after {self._failures} failures: {self.last_error}")
+
+    def _release_probe(self) -> None:
+        # a probe that ended in a non-failure error still frees the slot
+        with self._lock:
+            self._probe_in_flight = False
+
+    # ---------- call wrappers ----------
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        self.stats["calls"] += 1
+        try:
+            result = await fn()
+        except BaseException as e:
+            if isinstance(e, Exception) and self.is_failure(e):
+                self.record_failure(e)
+            else:
+                self._release_probe()
+            raise
+        self.record_success()
+        return result
+
+    @contextmanager
+    def guard(self):
+        """Synchronous form of call() for blocking code paths"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        self.stats["calls"] += 1
+        try:
+            yield
+        except BaseException as e:
+            if isinstance(e, Exception) and self.is_failure(e):
+                self.record_failure(e)
+            else:
+                self._release_probe()
+            raise
+        self.record_success()
+
+    def describe(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "retry_in_s": round(self.retry_in(), 1) if self.state == OPEN else None,
+            "last_error": self.last_error,
+            **self.stats,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """Shared breaker per dependency name (kwargs only apply on first creation)"""
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **kwargs)
+        return breaker
+
+
+def snapshot() -> Dict[str, Dict]:
+    with _registry_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.describe() for name, breaker in breakers.items()}
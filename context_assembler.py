@@ -0,0 +1,130 @@
+"""
+Token-budgeted context assembly for replies.
+
+Candidates come from the user profile, UserMemory rows, the
+ConversationContext recent exchanges and vector-store hits. Each gets a
+score, then the highest scoring ones are packed under a token budget and
+returned grouped by section, in the ``{key: text}`` shape that
+``openai_client.generate_response`` already turns into its Context block.
+"""
+
+import os
+import json
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from conversation_summarizer import SUMMARY_MAX_CHARS
+
+logger = logging.getLogger(__name__)
+
+# local tokenizer (tiktoken is a declared dependency; the encoding file is fetched
+# and cached on first use). Without it, counts fall back to a ~4 chars/token estimate.
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding(os.getenv("JIM_TOKENIZER", "o200k_base"))
+except Exception as e:
+    logger.warning(f"tiktoken unavailable ({e}); estimating context tokens as len(text) // 4")
+    _ENCODING = None
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("JIM_CONTEXT_TOKEN_BUDGET", "600"))
+MAX_ITEM_TOKENS = int(os.getenv("JIM_CONTEXT_MAX_ITEM_TOKENS", "120"))
+# the rolling summary is already bounded by SUMMARY_MAX_CHARS (~4 chars/token), so keep all of it
+SUMMARY_MAX_TOKENS = int(os.getenv("JIM_CONTEXT_SUMMARY_MAX_TOKENS", str(SUMMARY_MAX_CHARS // 4 + 20)))
+
+# output order of sections in the Context block
+SECTIONS = ("profile", "summary", "memories", "recent_chat", "related_messages")
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, len(text) // 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _ENCODING is not None:
+        return _ENCODING.decode(_ENCODING.encode(text)[:max_tokens]).rstrip() + "…"
+    return text[:max_tokens * 4].rstrip() + "…"
+
+
+@dataclass
+class ContextItem:
+    section: str
+    text: str
+    score: float
+    order: int = 0   # position within its section once packed (e.g. chronological)
+    tokens: int = 0
+
+
+class ContextAssembler:
+    """Scores context candidates and packs them under a token budget"""
+
+    def __init__(self, budget: int = CONTEXT_TOKEN_BUDGET, max_item_tokens: int = MAX_ITEM_TOKENS):
+        self.budget = budget
+        self.max_item_tokens = max_item_tokens
+        self.items: List[ContextItem] = []
+        self._seen = set()
+
+    def add(self, section: str, text: str, score: float, order: int = 0,
+            max_tokens: Optional[int] = None) -> None:
+        text = (text or "").strip()
+        key = text.lower()
+        if not text or key in self._seen:
+            return
+        self._seen.add(key)
+        text = truncate_to_tokens(text, max_tokens or self.max_item_tokens)
+        self.items.append(ContextItem(section, text, score, order, count_tokens(text)))
+
+    # ---------- candidate sources ----------
+    def add_profile(self, user_summary: Dict) -> None:
+        basic = (user_summary or {}).get("basic_info", {})
+        facts = [f"{k.replace('_', ' ')}: {v}" for k, v in basic.items() if v]
+        if facts:
+            self.add("profile", ", ".join(facts), score=1.0)
+
+    def add_memories(self, memories: Iterable[Dict]) -> None:
+        for mem in memories or []:
+            importance = mem.get("importance") or 5
+            self.add("memories", f"{mem.get('title')}: {mem.get('content')}", score=0.9 * importance / 10)
+
+    def add_summary(self, summary: Optional[str]) -> None:
+        if summary:
+            self.add("summary", summary, score=0.85, max_tokens=SUMMARY_MAX_TOKENS)
+
+    def add_recent_messages(self, recent_messages_json: Optional[str]) -> None:
+        try:
+            exchanges = json.loads(recent_messages_json or "[]")
+        except Exception:
+            exchanges = []
+        # newest exchanges score highest; keep chronological order in the output
+        for age, ex in enumerate(reversed(exchanges)):
+            text = f"them: {ex.get('user', '')} / you: {ex.get('bot', '')}"
+            self.add("recent_chat", text, score=0.8 - 0.05 * age, order=-age)
+
+    def add_related(self, texts: Iterable[str]) -> None:
+        for rank, text in enumerate(texts or []):
+            self.add("related_messages", text, score=0.7 - 0.1 * rank, order=rank)
+
+    # ---------- packing ----------
+    def pack(self) -> Dict[str, str]:
+        """Greedy best-score-first packing; returns {section: text} in SECTIONS order"""
+        chosen: List[ContextItem] = []
+        used = 0
+        for item in sorted(self.items, key=lambda i: i.score, reverse=True):
+            if used + item.tokens > self.budget:
+                continue
+            chosen.append(item)
+            used += item.tokens
+
+        packed: Dict[str, str] = {}
+        for section in SECTIONS:
+            lines = [i.text for i in sorted((i for i in chosen if i.section == section), key=lambda i: i.order)]
+            if lines:
+                packed[section] = "\n".join(lines) if section != "profile" else lines[0]
+        logger.debug(f"Packed {len(chosen)}/{len(self.items)} context items into {used}/{self.budget} tokens")
+        return packed
@@ -0,0 +1,98 @@
+"""
+Background rolling summaries for ConversationContext.
+
+The reply path only marks a (user, channel) conversation as dirty. A periodic
+task picks up dirty conversations in batches and, once a conversation has
+more than SUMMARY_TRIGGER raw exchanges, folds everything except the newest
+SUMMARY_KEEP_RECENT into ``context_summary`` with the small model at
+background scheduler priority. Prompts then carry one bounded summary plus a
+few raw exchanges no matter how long the conversation runs.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_TRIGGER = int(os.getenv("JIM_SUMMARY_TRIGGER", "8"))
+SUMMARY_KEEP_RECENT = int(os.getenv("JIM_SUMMARY_KEEP_RECENT", "4"))
+SUMMARY_MAX_CHARS = int(os.getenv("JIM_SUMMARY_MAX_CHARS", "1200"))
+SUMMARY_BATCH = int(os.getenv("JIM_SUMMARY_BATCH", "8"))
+SUMMARY_INTERVAL_SECONDS = float(os.getenv("JIM_SUMMARY_INTERVAL", "30"))
+
+SummarizeFn = Callable[[Optional[str], List[Dict[str, str]], int], Awaitable[Optional[str]]]
+
+
+class ConversationSummarizer:
+    """Batches dirty conversations and folds old exchanges into their summary"""
+
+    def __init__(self, memory_manager, summarize: SummarizeFn, trigger: int = SUMMARY_TRIGGER,
+                 keep_recent: int = SUMMARY_KEEP_RECENT, max_chars: int = SUMMARY_MAX_CHARS,
+                 batch_size: int = SUMMARY_BATCH):
+        self.memory_manager = memory_manager
+        self.summarize = summarize
+        self.trigger = max(trigger, keep_recent + 1)
+        self.keep_recent = keep_recent
+        self.max_chars = max_chars
+        self.batch_size = batch_size
+        self._dirty: Dict[Tuple[str, str], None] = {}  # insertion-ordered set
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"folded": 0, "exchanges_folded": 0, "failed": 0, "skipped": 0}
+
+    def mark_dirty(self, user_id: str, channel_id: str) -> None:
+        """Cheap hook for the reply path"""
+        self._dirty[(user_id, channel_id)] = None
+
+    async def summarize_one(self, user_id: str, channel_id: str) -> bool:
+        snapshot = await self.memory_manager.get_conversation_snapshot(user_id, channel_id)
+        if not snapshot or len(snapshot['recent_messages']) <= self.trigger:
+            self.stats["skipped"] += 1
+            return False
+
+        older = snapshot['recent_messages'][:-self.keep_recent]
+        summary = await self.summarize(snapshot['summary'], older, self.max_chars)
+        if not summary:
+            self.stats["failed"] += 1
+            return False
+
+        folded_until = older[-1].get('timestamp', '')
+        if not await self.memory_manager.fold_conversation_summary(user_id, channel_id, summary, folded_until):
+            self.stats["failed"] += 1
+            return False
+        self.stats["folded"] += 1
+        self.stats["exchanges_folded"] += len(older)
+        logger.info(f"Folded {len(older)} exchanges into summary for {user_id} in {channel_id}")
+        return True
+
+    async def run_batch(self) -> int:
+        """Summarize up to batch_size dirty conversations concurrently"""
+        keys = list(self._dirty)[:self.batch_size]
+        for key in keys:
+            self._dirty.pop(key, None)
+        if not keys:
+            return 0
+        results = await asyncio.gather(*(self.summarize_one(*key) for key in keys), return_exceptions=True)
+        for key, result in zip(keys, results):
+            if isinstance(result, Exception):
+                self.stats["failed"] += 1
+                logger.error(f"Summarizing {key} failed: {result}")
+        return sum(1 for r in results if r is True)
+
+    def start(self, interval: float = SUMMARY_INTERVAL_SECONDS) -> None:
+        """Start the periodic summarizer task (idempotent)"""
+        if self._task and not self._task.done():
+            return
+
+        async def _loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.run_batch()
+                except Exception as e:
+                    logger.error(f"Conversation summarizer failed: {e}")
+        self._task = asyncio.get_running_loop().create_task(_loop())
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "pending": len(self._dirty)}
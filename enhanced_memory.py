@@ -3,20 +3,45 @@ Enhanced Memory System for Jim Bot
 Handles sophisticated user memory, relationships, and context tracking
 """
 
+import os
 import json
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from models import db, UserProfile, UserMemory, ConversationContext, ChatHistory, UserFact
 from sqlalchemy import and_, or_, desc
+from sqlalchemy.exc import InterfaceError, OperationalError
+from contextlib import contextmanager
+from circuit_breaker import get_breaker
 
 logger = logging.getLogger(__name__)
 
+# raw exchanges kept per conversation before ConversationSummarizer folds them
+MAX_UNFOLDED_EXCHANGES = int(os.getenv("JIM_MAX_UNFOLDED_EXCHANGES", "60"))
+
+
+def _is_db_outage(e: Exception) -> bool:
+    """Connection/driver trouble only; IntegrityError/ProgrammingError are our bugs, not an outage"""
+    return isinstance(e, (OperationalError, InterfaceError)) or bool(getattr(e, "connection_invalidated", False))
+
+
+# shared by every database path (this manager and the bot's legacy Conversation table)
+db_breaker = get_breaker("database", is_failure=_is_db_outage)
+
+
 class EnhancedMemoryManager:
     """Advanced memory management for Jim Bot"""
     
     def __init__(self, app_context):
-        self.app_context = app_context
+        self._raw_app_context = app_context
+        # connection/driver errors trip the breaker; methods then fail fast into their defaults
+        self._db_breaker = db_breaker
+
+    @contextmanager
+    def app_context(self):
+        with self._db_breaker.guard():
+            with self._raw_app_context():
+                yield
         
     async def get_or_create_user_profile(self, user_id: str, username: str = None, display_name: str = None) -> UserProfile:
         """Get or create a user profile"""
@@ -235,9 +260,12 @@ class EnhancedMemoryManager:
                         'timestamp': datetime.utcnow().isoformat()
                     })
                     
-                    # Keep only last 10 exchanges
-                    if len(recent_messages) > 10:
-                        recent_messages = recent_messages[-10:]
+                    # Old exchanges leave only once ConversationSummarizer has folded them;
+                    # this is just a safety valve for when summaries aren't running
+                    if len(recent_messages) > MAX_UNFOLDED_EXCHANGES:
+                        logger.warning(f"Dropping {len(recent_messages) - MAX_UNFOLDED_EXCHANGES} unfolded "
+                                       f"exchanges for {user_id}/{channel_id}")
+                        recent_messages = recent_messages[-MAX_UNFOLDED_EXCHANGES:]
                     
                     context.recent_messages = json.dumps(recent_messages)
                 
@@ -267,6 +295,54 @@ class EnhancedMemoryManager:
             logger.error(f"Error getting conversation context: {e}")
             return None
     
+    async def get_conversation_snapshot(self, user_id: str, channel_id: str) -> Optional[Dict[str, Any]]:
+        """Summary + parsed recent exchanges for the background summarizer"""
+        try:
+            with self.app_context():
+                context = ConversationContext.query.filter_by(
+                    user_id=user_id,
+                    channel_id=channel_id
+                ).first()
+                if not context:
+                    return None
+                return {
+                    'summary': context.context_summary,
+                    'recent_messages': json.loads(context.recent_messages or '[]')
+                }
+
+        except Exception as e:
+            logger.error(f"Error getting conversation snapshot: {e}")
+            return None
+
+    async def fold_conversation_summary(self, user_id: str, channel_id: str, summary: str,
+                                        folded_until: str) -> bool:
+        """Store a new summary and drop the exchanges it covers (timestamp <= folded_until)"""
+        try:
+            with self.app_context():
+                context = ConversationContext.query.filter_by(
+                    user_id=user_id,
+                    channel_id=channel_id
+                ).first()
+                if not context:
+                    return False
+
+                # re-read so exchanges appended while the summary was generated are kept
+                recent_messages = json.loads(context.recent_messages or '[]')
+                context.recent_messages = json.dumps([
+                    ex for ex in recent_messages if ex.get('timestamp', '') > folded_until
+                ])
+                context.context_summary = summary
+                db.session.commit()
+                return True
+
+        except Exception as e:
+            logger.error(f"Error folding conversation summary: {e}")
+            try:
+                db.session.rollback()
+            except:
+                pass
+            return False
+
     async def get_user_summary(self, user_id: str) -> Dict[str, Any]:
         """Get a comprehensive summary of what Jim knows about a user"""
         try:
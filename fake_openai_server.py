@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stand-in for load and latency testing.
+
+Implements the endpoints the bot uses:
+
+  POST /v1/chat/completions        (plain + SSE streaming, stream_options.include_usage)
+  POST /v1/images/generations      (url or b64_json; urls are served from /files/)
+  POST /v1/audio/speech            (silent WAV sized to the input)
+  POST /v1/audio/transcriptions    (multipart upload)
+  POST /v1/embeddings              (float or base64, honours `dimensions`)
+  GET  /stats                      (request/fault counters)
+
+Outputs are deterministic: they depend only on the request body and --seed.
+Embeddings are hashed bag-of-words vectors, so similar texts stay similar
+and retrieval behaves sensibly. Latency, 429s and hung requests are injected
+from configurable distributions, and every response carries x-ratelimit-*
+headers driven by --rpm/--tpm, so the request scheduler sees a realistic
+budget.
+
+    python fake_openai_server.py --port 8089 --chat-latency lognormal:400,0.6 --rate-429 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python main.py
+
+Latency specs: fixed:MS, uniform:LO,HI, normal:MEAN,STD, lognormal:MEDIAN,SIGMA
+"""
+
+import io
+import sys
+import json
+import math
+import time
+import wave
+import zlib
+import base64
+import random
+import struct
+import asyncio
+import hashlib
+import argparse
+import logging
+from collections import defaultdict, deque
+from typing import Callable, Dict, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+_WORDS = (
+    "yo bro fr no cap lowkey bet lol ngl tbh idk rn bruh that's wild honestly kinda fire mid "
+    "valid sounds good nah yeah maybe later gotta say facts true deadass lmao same vibe chill "
+    "game match lobby squad clutch grind ranked patch meta skin drop stream clip meme pic song "
+    "homework class pizza sleep weekend tonight tomorrow hyped tired bored happy mad"
+).split()
+
+
+# ---------- config helpers ----------
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Latency spec -> sampler returning seconds"""
+    kind, _, args = spec.partition(":")
+    nums = [float(x) for x in args.split(",") if x.strip()] if args else []
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        return lambda rng: nums[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(nums[0], nums[1]) / 1000
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(nums[0], nums[1])) / 1000
+    if kind == "lognormal":
+        mu = math.log(nums[0])
+        return lambda rng: rng.lognormvariate(mu, nums[1]) / 1000
+    raise ValueError(f"unknown latency spec: {spec}")
+
+
+def _digest(*parts) -> bytes:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).digest()
+
+
+def _rng_for(seed: int, *parts) -> random.Random:
+    return random.Random(int.from_bytes(_digest(seed, *parts)[:8], "little"))
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _message_text(messages: List[Dict]) -> str:
+    out = []
+    for msg in messages or []:
+        content = msg.get("content")
+        if isinstance(content, str):
+            out.append(content)
+        elif isinstance(content, list):
+            out.extend(part.get("text", "") for part in content if isinstance(part, dict))
+    return "\n".join(out)
+
+
+# ---------- deterministic payloads ----------
+class Embedder:
+    """Hashed bag-of-words embeddings, L2-normalised (token arrays hash per token id)"""
+
+    def __init__(self, seed: int, cache_size: int = 50000):
+        self.seed = seed
+        self.cache_size = cache_size
+        self._cache: Dict[tuple, List[float]] = {}
+
+    def _token_vector(self, token, dim: int) -> List[float]:
+        key = (token, dim)
+        vec = self._cache.get(key)
+        if vec is None:
+            rng = _rng_for(self.seed, "tok", token)
+            vec = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[key] = vec
+        return vec
+
+    def embed(self, item, dim: int) -> List[float]:
+        tokens = item if isinstance(item, list) else (str(item).lower().split() or [""])
+        acc = [0.0] * dim
+        for token in tokens:
+            for i, v in enumerate(self._token_vector(token, dim)):
+                acc[i] += v
+        norm = math.sqrt(sum(v * v for v in acc)) or 1.0
+        return [v / norm for v in acc]
+
+
+def fake_reply(seed: int, model: str, messages: List[Dict], max_tokens: int) -> List[str]:
+    """Deterministic list of word tokens for a chat request"""
+    last_user = next((m for m in reversed(messages or []) if m.get("role") == "user"), {})
+    rng = _rng_for(seed, model, _message_text([last_user]))
+    n = max(1, min(max_tokens or 60, rng.randint(6, 40)))
+    words = [rng.choice(_WORDS) for _ in range(n)]
+    words[0] = words[0].capitalize()
+    return [w if i == 0 else " " + w for i, w in enumerate(words)] + ["."]
+
+
+def fake_png(digest: bytes, size: int = 64) -> bytes:
+    """Solid-colour PNG whose colour comes from the prompt digest"""
+    r, g, b = digest[0], digest[1], digest[2]
+    row = b"\x00" + bytes((r, g, b)) * size
+    raw = row * size
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+def silent_wav(seconds: float, rate: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b"\x00\x00" * int(rate * seconds))
+    return buf.getvalue()
+
+
+# ---------- rate limiting ----------
+class RateWindow:
+    """Sliding 60s request/token window that produces x-ratelimit-* headers"""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._events = deque()  # (t, tokens)
+
+    def _trim(self, now: float) -> None:
+        while self._events and now - self._events[0][0] >= 60:
+            self._events.popleft()
+
+    def _reset_in(self, now: float) -> float:
+        return max(0.001, 60 - (now - self._events[0][0])) if self._events else 0.001
+
+    def admit(self, tokens: int) -> Optional[float]:
+        """Record the request; returns retry-after seconds if over budget"""
+        now = time.monotonic()
+        self._trim(now)
+        used_tokens = sum(t for _, t in self._events)
+        if len(self._events) >= self.rpm or used_tokens + tokens > self.tpm:
+            return self._reset_in(now)
+        self._events.append((now, tokens))
+        return None
+
+    def headers(self) -> Dict[str, str]:
+        now = time.monotonic()
+        self._trim(now)
+        reset = f"{self._reset_in(now):.3f}s"
+        return {
+            "x-ratelimit-limit-requests": str(self.rpm),
+            "x-ratelimit-limit-tokens": str(self.tpm),
+            "x-ratelimit-remaining-requests": str(max(0, self.rpm - len(self._events))),
+            "x-ratelimit-remaining-tokens": str(max(0, self.tpm - sum(t for _, t in self._events))),
+            "x-ratelimit-reset-requests": reset,
+            "x-ratelimit-reset-tokens": reset,
+        }
+
+
+# ---------- server ----------
+class FakeOpenAI:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.window = RateWindow(args.rpm, args.tpm)
+        self.embedder = Embedder(args.seed)
+        self.latency = {
+            "chat": parse_latency(args.chat_latency),
+            "token": parse_latency(args.token_latency),
+            "image": parse_latency(args.image_latency),
+            "audio": parse_latency(args.audio_latency),
+            "embedding": parse_latency(args.embedding_latency),
+        }
+        self.counts = defaultdict(int)
+        self.faults = defaultdict(int)
+        self.images: Dict[str, bytes] = {}
+
+    def _error(self, status: int, message: str, kind: str, headers: Optional[Dict] = None) -> web.Response:
+        body = {"error": {"message": message, "type": kind, "param": None, "code": None}}
+        return web.json_response(body, status=status, headers={**self.window.headers(), **(headers or {})})
+
+    async def _gate(self, endpoint: str, tokens: int) -> Optional[web.Response]:
+        """Count the request, apply fault injection and the rate window"""
+        self.counts[endpoint] += 1
+        roll = self.rng.random()
+        if roll < self.args.rate_timeout:
+            self.faults["timeout"] += 1
+            await asyncio.sleep(self.args.hang_seconds)
+            return self._error(504, "Request timed out.", "timeout")
+        if roll < self.args.rate_timeout + self.args.rate_429:
+            self.faults["429_injected"] += 1
+            return self._error(429, "Rate limit reached (injected).", "requests", {"retry-after": "1"})
+        retry_after = self.window.admit(tokens)
+        if retry_after is not None:
+            self.faults["429_budget"] += 1
+            return self._error(429, "Rate limit reached for requests.", "requests",
+                               {"retry-after": f"{retry_after:.3f}"})
+        return None
+
+    async def _sleep(self, kind: str) -> None:
+        await asyncio.sleep(self.latency[kind](self.rng))
+
+    # ---- endpoints ----
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "gpt-4o")
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens") or 256
+        prompt_tokens = count_tokens(_message_text(messages))
+        rejected = await self._gate("chat", prompt_tokens + max_tokens)
+        if rejected is not None:
+            return rejected
+
+        pieces = fake_reply(self.args.seed, model, messages, max_tokens)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces),
+                 "total_tokens": prompt_tokens + len(pieces)}
+        completion_id = "chatcmpl-" + _digest(self.args.seed, model, messages).hex()[:24]
+        created = int(time.time())
+        await self._sleep("chat")
+
+        if not body.get("stream"):
+            return web.json_response({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(pieces)}}],
+                "usage": usage,
+            }, headers=self.window.headers())
+
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache",
+                                           **self.window.headers()})
+        await resp.prepare(request)
+
+        async def send(choices, extra=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": choices, **(extra or {})}
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await send([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for piece in pieces:
+            await send([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+            await self._sleep("token")
+        await send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await send([], {"usage": usage})
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    async def images(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        rejected = await self._gate("images", 0)
+        if rejected is not None:
+            return rejected
+        await self._sleep("image")
+        digest = _digest(self.args.seed, prompt, body.get("size"), body.get("model"))
+        png = fake_png(digest)
+        n = int(body.get("n") or 1)
+        data = []
+        for i in range(n):
+            name = f"{digest.hex()[:16]}-{i}.png"
+            if body.get("response_format") == "b64_json":
+                data.append({"b64_json": base64.b64encode(png).decode(), "revised_prompt": prompt})
+            else:
+                self.images[name] = png
+                data.append({"url": f"{request.scheme}://{request.host}/files/{name}", "revised_prompt": prompt})
+        return web.json_response({"created": int(time.time()), "data": data}, headers=self.window.headers())
+
+    async def files(self, request: web.Request) -> web.Response:
+        png = self.images.get(request.match_info["name"])
+        if png is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=png, content_type="image/png")
+
+    async def speech(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        text = body.get("input", "")
+        rejected = await self._gate("speech", count_tokens(text))
+        if rejected is not None:
+            return rejected
+        await self._sleep("audio")
+        # ~15 chars per second of speech
+        return web.Response(body=silent_wav(min(30.0, max(0.5, len(text) / 15))), content_type="audio/wav",
+                            headers=self.window.headers())
+
+    async def transcriptions(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        upload = form.get("file")
+        audio = upload.file.read() if hasattr(upload, "file") else bytes(str(upload or ""), "utf-8")
+        rejected = await self._gate("transcriptions", 0)
+        if rejected is not None:
+            return rejected
+        await self._sleep("audio")
+        rng = _rng_for(self.args.seed, "stt", hashlib.sha256(audio).hexdigest())
+        text = "hey jim " + " ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 12)))
+        if form.get("response_format") == "text":
+            return web.Response(text=text, headers=self.window.headers())
+        return web.json_response({"text": text}, headers=self.window.headers())
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        inputs = body.get("input")
+        # str, [str], [int] (one token array) or [[int]]
+        if isinstance(inputs, str) or (isinstance(inputs, list) and inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        dim = int(body.get("dimensions") or 1536)
+        tokens = sum(len(i) if isinstance(i, list) else count_tokens(str(i)) for i in inputs)
+        rejected = await self._gate("embeddings", tokens)
+        if rejected is not None:
+            return rejected
+        await self._sleep("embedding")
+        data = []
+        for idx, item in enumerate(inputs):
+            vec = self.embedder.embed(item, dim)
+            if body.get("encoding_format") == "base64":
+                vec = base64.b64encode(struct.pack(f"<{dim}f", *vec)).decode()
+            data.append({"object": "embedding", "index": idx, "embedding": vec})
+        return web.json_response({
+            "object": "list", "data": data, "model": body.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }, headers=self.window.headers())
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"requests": dict(self.counts), "faults": dict(self.faults),
+                                  "rate_limit": self.window.headers()})
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self.chat)
+        app.router.add_post("/v1/images/generations", self.images)
+        app.router.add_post("/v1/audio/speech", self.speech)
+        app.router.add_post("/v1/audio/transcriptions", self.transcriptions)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        app.router.add_get("/files/{name}", self.files)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chat-latency", default="lognormal:350,0.5", help="time to first token / full reply")
+    parser.add_argument("--token-latency", default="fixed:15", help="delay between streamed chunks")
+    parser.add_argument("--image-latency", default="lognormal:6000,0.3")
+    parser.add_argument("--audio-latency", default="lognormal:700,0.4")
+    parser.add_argument("--embedding-latency", default="lognormal:120,0.4")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="probability of an injected 429")
+    parser.add_argument("--rate-timeout", type=float, default=0.0, help="probability of a hung request")
+    parser.add_argument("--hang-seconds", type=float, default=120.0, help="how long hung requests stall")
+    parser.add_argument("--rpm", type=int, default=5000, help="requests per minute before real 429s")
+    parser.add_argument("--tpm", type=int, default=2_000_000, help="tokens per minute before real 429s")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    server = FakeOpenAI(args)
+    logger.info(f"Fake OpenAI on http://{args.host}:{args.port}/v1 (seed={args.seed})")
+    web.run_app(server.app(), host=args.host, port=args.port, print=None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
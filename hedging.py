@@ -0,0 +1,165 @@
+"""
+Per-call deadlines and hedged requests for chat completions.
+
+``hedger.run(model, call)`` starts ``call()`` and, if it hasn't produced its
+first token within that model's observed p95 first-token latency, starts a
+second identical call and takes whichever finishes first. Hedges draw from a
+token bucket that refills by HEDGE_BUDGET per request, so at most that
+fraction of requests are ever duplicated. Every attempt is bounded by the
+call deadline.
+
+For streams, ``call()`` should resolve once the first content chunk is in
+hand, so the race is on time-to-first-token. Latency is measured from the
+moment the request scheduler grants the attempt its slot, so queueing and
+429 backoff don't inflate the hedge trigger.
+
+When the deadline itself fires, ``DeadlineExceeded`` is raised. The attempt
+was cancelled, so the circuit breaker never saw it; callers record it once.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from metrics import LatencyWindow
+from request_scheduler import DispatchTiming, dispatch_timing
+
+logger = logging.getLogger(__name__)
+
+CHAT_DEADLINE_SECONDS = float(os.getenv("JIM_CHAT_DEADLINE_SECONDS", "30"))
+STREAM_IDLE_SECONDS = float(os.getenv("JIM_STREAM_IDLE_SECONDS", "15"))
+HEDGE_ENABLED = os.getenv("JIM_HEDGE_ENABLED", "false").lower() in {"1", "true", "yes", "y"}
+HEDGE_BUDGET = float(os.getenv("JIM_HEDGE_BUDGET", "0.05"))          # max fraction of requests hedged
+HEDGE_MIN_DELAY_MS = float(os.getenv("JIM_HEDGE_MIN_DELAY_MS", "400"))
+HEDGE_MIN_SAMPLES = int(os.getenv("JIM_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_PERCENTILE = float(os.getenv("JIM_HEDGE_PERCENTILE", "95"))
+HEDGE_MAX_CREDITS = 5.0
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Our own call/stream deadline fired (as opposed to an upstream timeout)"""
+
+
+class Hedger:
+    """Races a backup request against a slow primary under a bounded budget"""
+
+    def __init__(self, enabled: bool = HEDGE_ENABLED, deadline: float = CHAT_DEADLINE_SECONDS,
+                 budget: float = HEDGE_BUDGET, min_delay_ms: float = HEDGE_MIN_DELAY_MS,
+                 min_samples: int = HEDGE_MIN_SAMPLES, percentile: float = HEDGE_PERCENTILE):
+        self.enabled = enabled
+        self.deadline = deadline
+        self.budget = budget
+        self.min_delay_ms = min_delay_ms
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self._credits = 0.0
+        self._first_token: Dict[str, LatencyWindow] = defaultdict(LatencyWindow)
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "primary_wins": 0,
+                      "budget_denied": 0, "deadline_exceeded": 0}
+
+    def observe(self, model: str, first_token_s: float) -> None:
+        self._first_token[model].observe(first_token_s * 1000)
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there's too little history"""
+        window = self._first_token[model]
+        if window.count < self.min_samples:
+            return None
+        return max(self.min_delay_ms, window.percentile(self.percentile) or 0.0) / 1000
+
+    def _take_credit(self) -> bool:
+        if self._credits >= 1.0:
+            self._credits -= 1.0
+            return True
+        self.stats["budget_denied"] += 1
+        return False
+
+    async def _timed(self, model: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        # runs as its own task, so the timing slot belongs to this attempt only
+        started = time.monotonic()
+        timing = DispatchTiming()
+        dispatch_timing.set(timing)
+        result = await call()
+        # from slot grant to first token/response of the attempt that succeeded
+        self.observe(model, time.monotonic() - (timing.granted_at or started))
+        return result
+
+    async def run(self, model: str, call: Callable[[], Awaitable[Any]], deadline: Optional[float] = None,
+                  discard: Optional[Callable[[Any], None]] = None) -> Any:
+        """Result of the first attempt to finish; ``discard`` releases a losing attempt's result"""
+        deadline = deadline or self.deadline
+        self.stats["requests"] += 1
+        self._credits = min(HEDGE_MAX_CREDITS, self._credits + self.budget)
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + deadline
+
+        primary = asyncio.ensure_future(self._timed(model, call))
+        delay = self.hedge_delay(model) if self.enabled else None
+        try:
+            if delay is not None and delay < deadline:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self._take_credit():
+                    return await self._race(model, call, primary, expires, discard)
+            return await asyncio.wait_for(asyncio.shield(primary), max(0.0, expires - loop.time()))
+        except DeadlineExceeded:
+            self.stats["deadline_exceeded"] += 1
+            raise
+        except asyncio.TimeoutError as e:
+            if loop.time() < expires:
+                raise  # the attempt's own timeout; the breaker already counted it
+            self.stats["deadline_exceeded"] += 1
+            raise DeadlineExceeded(f"{model} call exceeded {deadline:.0f}s deadline") from e
+        finally:
+            if not primary.done():
+                primary.cancel()
+
+    async def _race(self, model: str, call, primary: asyncio.Future, expires: float,
+                    discard: Optional[Callable[[Any], None]]) -> Any:
+        self.stats["hedged"] += 1
+        logger.info(f"Hedging {model} request after p{self.percentile:.0f} first-token delay")
+        hedge = asyncio.ensure_future(self._timed(model, call))
+        pending = {primary, hedge}
+        loop = asyncio.get_running_loop()
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, expires - loop.time()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded(f"{model} call exceeded its deadline while hedged")
+                winner = None
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    elif discard:
+                        discard(task.result())
+                if winner is not None:
+                    self.stats["hedge_wins" if winner is hedge else "primary_wins"] += 1
+                    return winner.result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+                if discard:
+                    task.add_done_callback(
+                        lambda t: discard(t.result()) if not t.cancelled() and t.exception() is None else None
+                    )
+
+    def get_stats(self) -> Dict:
+        hedged = self.stats["hedged"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "hedge_rate": round(hedged / self.stats["requests"], 4) if self.stats["requests"] else 0.0,
+            "hedge_win_rate": round(self.stats["hedge_wins"] / hedged, 4) if hedged else 0.0,
+            "first_token": {model: window.summary() for model, window in self._first_token.items()},
+        }
+
+
+# shared hedger for chat completions
+hedger = Hedger()
@@ -0,0 +1,154 @@
+"""
+Process-wide HTTP clients.
+
+Every outbound module borrows a client from here instead of opening its own
+session per request, so connections, DNS lookups and TLS sessions are reused.
+``http_pool.session()`` hands out a shared aiohttp session and
+``http_pool.httpx_client()`` a shared httpx client. Both have per-host
+connection limits, keep-alive, DNS caching and default timeouts. Call
+``http_pool.close()`` on shutdown.
+"""
+
+import os
+import logging
+from collections import defaultdict
+from typing import Dict, Optional
+
+import aiohttp
+
+import metrics
+
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+logger = logging.getLogger(__name__)
+
+HTTP_LIMIT = int(os.getenv("JIM_HTTP_LIMIT", "100"))
+HTTP_LIMIT_PER_HOST = int(os.getenv("JIM_HTTP_LIMIT_PER_HOST", "8"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("JIM_HTTP_KEEPALIVE", "30"))
+HTTP_DNS_TTL_SECONDS = int(os.getenv("JIM_HTTP_DNS_TTL", "300"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("JIM_HTTP_TIMEOUT", "20"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("JIM_HTTP_CONNECT_TIMEOUT", "5"))
+USER_AGENT = "JimBot/1.0"
+
+
+class HttpPool:
+    """Lazily created, named aiohttp sessions / httpx clients with reuse stats"""
+
+    def __init__(self):
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._httpx: Dict[str, "httpx.AsyncClient"] = {}
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    # ---------- aiohttp ----------
+    def _trace_config(self, name: str) -> aiohttp.TraceConfig:
+        stats = self._stats[name]
+
+        async def on_request_end(session, ctx, params):
+            stats["requests"] += 1
+
+        async def on_request_exception(session, ctx, params):
+            stats["errors"] += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            stats["connections_created"] += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            stats["connections_reused"] += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            stats["dns_cache_hits"] += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            stats["dns_cache_misses"] += 1
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace
+
+    def session(self, name: str = "default") -> aiohttp.ClientSession:
+        """Shared aiohttp session (must be called from the running event loop)"""
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_LIMIT,
+                limit_per_host=HTTP_LIMIT_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+                use_dns_cache=True,
+                ttl_dns_cache=HTTP_DNS_TTL_SECONDS,
+                enable_cleanup_closed=True,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+                headers={"User-Agent": USER_AGENT},
+                trace_configs=[self._trace_config(name)],
+            )
+            self._sessions[name] = session
+            logger.info(f"Opened shared aiohttp session '{name}'")
+        return session
+
+    # ---------- httpx ----------
+    def httpx_client(self, name: str = "default") -> "httpx.AsyncClient":
+        """Shared httpx client (httpx pools per client, so one per name)"""
+        if not HAS_HTTPX:
+            raise RuntimeError("httpx is not installed")
+        client = self._httpx.get(name)
+        if client is None or client.is_closed:
+            stats = self._stats[f"httpx:{name}"]
+
+            async def on_response(response):
+                stats["requests"] += 1
+
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=HTTP_LIMIT,
+                                    max_keepalive_connections=HTTP_LIMIT_PER_HOST,
+                                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS),
+                timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+                headers={"User-Agent": USER_AGENT},
+                event_hooks={"response": [on_response]},
+            )
+            self._httpx[name] = client
+            logger.info(f"Opened shared httpx client '{name}'")
+        return client
+
+    async def close(self) -> None:
+        for name, session in list(self._sessions.items()):
+            if not session.closed:
+                await session.close()
+        for name, client in list(self._httpx.items()):
+            if not client.is_closed:
+                await client.aclose()
+        self._sessions.clear()
+        self._httpx.clear()
+        logger.info("Closed shared HTTP clients")
+
+    def stats(self) -> Dict:
+        out = {}
+        for name, stats in self._stats.items():
+            entry = dict(stats)
+            created = entry.get("connections_created", 0)
+            reused = entry.get("connections_reused", 0)
+            if created or reused:
+                entry["reuse_ratio"] = round(reused / (created + reused), 4)
+            out[name] = entry
+        for name, session in self._sessions.items():
+            connector: Optional[aiohttp.BaseConnector] = session.connector
+            if connector is not None and not session.closed:
+                # idle keep-alive connections per host (private attr, best effort)
+                idle = getattr(connector, "_conns", {})
+                out.setdefault(name, {})["idle_connections"] = sum(len(v) for v in idle.values())
+        return out
+
+
+# shared registry for the whole process
+http_pool = HttpPool()
+metrics.register("http_pool", http_pool.stats)
@@ -0,0 +1,108 @@
+"""
+Sparse (BM25) side of the hybrid retriever plus rank fusion helpers.
+
+Dense FAISS search is weak on exact tokens (usernames, game titles, names),
+so AsyncVectorStore keeps an inverted BM25 index over the same texts and fuses
+both rankings with reciprocal-rank fusion, optionally decayed by recency.
+"""
+
+import math
+import re
+import time
+import heapq
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[\w#@]+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; keeps digits, underscores, @mentions and #tags intact"""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+class BM25Index:
+    """Incrementally maintained inverted index scored with Okapi BM25"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)  # term -> {doc_id: tf}
+        self.doc_len: Dict[str, int] = {}
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self.doc_len:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        counts: Dict[str, int] = defaultdict(int)
+        for tok in tokens:
+            counts[tok] += 1
+        for tok, tf in counts.items():
+            self.postings[tok][doc_id] = tf
+        self.doc_len[doc_id] = len(tokens)
+        self.total_len += len(tokens)
+
+    def add_many(self, docs: Iterable[Tuple[str, str]]) -> None:
+        for doc_id, text in docs:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str, text: Optional[str] = None) -> None:
+        """Drop a document; pass its text to avoid scanning every posting list"""
+        length = self.doc_len.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_len -= length
+        terms = set(tokenize(text)) if text is not None else list(self.postings.keys())
+        for tok in terms:
+            posting = self.postings.get(tok)
+            if posting and posting.pop(doc_id, None) is not None and not posting:
+                del self.postings[tok]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        n = len(self.doc_len)
+        if not n:
+            return []
+        avg_len = self.total_len / n or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for tok in set(tokenize(query)):
+            posting = self.postings.get(tok)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], weights: Optional[Sequence[float]] = None,
+                           rrf_k: int = 60) -> Dict[str, float]:
+    """Fuse ranked id lists: score(d) = sum(w_i / (rrf_k + rank_i(d)))"""
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[str, float] = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] += weight / (rrf_k + rank)
+    return fused
+
+
+def apply_recency(scores: Dict[str, float], timestamps: Dict[str, float], half_life_days: Optional[float],
+                  weight: float = 0.3, now: Optional[float] = None) -> Dict[str, float]:
+    """Blend an exponential recency decay into fused scores (no-op without a half-life)"""
+    if not half_life_days:
+        return scores
+    now = now or time.time()
+    out = {}
+    for doc_id, score in scores.items():
+        age_days = max(now - timestamps.get(doc_id, now), 0.0) / 86400
+        decay = 0.5 ** (age_days / half_life_days)
+        out[doc_id] = score * ((1.0 - weight) + weight * decay)
+    return out
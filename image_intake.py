@@ -0,0 +1,279 @@
+"""
+Image intake for vision replies.
+
+Two stages so the cheap one can gate the expensive one:
+
+1. ``image_candidates(message)`` looks only at metadata: attachment content
+   types/filenames/sizes, embed image URLs and image links in the text. It
+   does no I/O.
+2. ``describe_images(refs, describe)`` downloads the candidates and returns a
+   text description of each. Descriptions come from ``vision_cache`` when the
+   same (or a near-identical) image was seen before. Otherwise the image is
+   shrunk via ``image_processing`` and described by the vision model once.
+   This only runs for messages the bot will answer.
+
+Downloads run a few at a time per message. Each one has a timeout and a byte
+cap, checked against Content-Length and again while streaming. Hosts that
+keep failing are skipped for a while through a private per-host circuit
+breaker.
+"""
+
+import os
+import re
+import base64
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import metrics
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from http_pool import http_pool
+from image_processing import PreparedImage, image_preprocessor
+from vision_cache import content_hash, vision_cache
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".tiff", ".tif", ".svg", ".ico", ".jfif")
+# hosts whose links are images even without an extension
+IMAGE_HOSTS = ("media.tenor.com", "i.imgur.com", "cdn.discordapp.com")
+MAX_IMAGES_PER_MESSAGE = int(os.getenv("JIM_MAX_IMAGES_PER_MESSAGE", "4"))
+IMAGE_MAX_BYTES = int(os.getenv("JIM_IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("JIM_IMAGE_FETCH_TIMEOUT", "10"))
+IMAGE_FETCH_CONCURRENCY = int(os.getenv("JIM_IMAGE_FETCH_CONCURRENCY", "3"))   # per message
+IMAGE_HOST_FAILURES = int(os.getenv("JIM_IMAGE_HOST_FAILURES", "3"))
+IMAGE_HOST_COOLDOWN_SECONDS = float(os.getenv("JIM_IMAGE_HOST_COOLDOWN", "300"))
+IMAGE_MAX_HOSTS_TRACKED = 500
+_CHUNK_BYTES = 64 * 1024
+
+_URL_RE = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]*')
+_MIME_BY_EXT = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "jfif": "image/jpeg", "png": "image/png",
+                "gif": "image/gif", "webp": "image/webp", "bmp": "image/bmp"}
+
+
+@dataclass
+class ImageRef:
+    """An image we could fetch: metadata only, no bytes"""
+    url: str
+    source: str                      # attachment | embed | content
+    content_type: str = ""
+    filename: str = ""
+    size: Optional[int] = None       # bytes, when the metadata says
+    attachment: Any = None           # discord.Attachment for uploads
+
+
+def is_image_url(url: str) -> bool:
+    """Direct image link (by extension) or a known image host"""
+    if not url:
+        return False
+    path = url.lower().split("?", 1)[0]
+    return path.endswith((".png", ".jpg", ".jpeg", ".gif", ".webp")) or any(h in url.lower() for h in IMAGE_HOSTS)
+
+
+def guess_mime(name: str, content_type: str = "") -> str:
+    content_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if content_type.startswith("image/"):
+        return content_type
+    ext = (name or "").lower().split("?", 1)[0].rsplit(".", 1)[-1]
+    return _MIME_BY_EXT.get(ext, "image/png")
+
+
+def image_candidates(message, limit: int = MAX_IMAGES_PER_MESSAGE) -> List[ImageRef]:
+    """Images a message carries, from metadata alone (no downloads)"""
+    refs: List[ImageRef] = []
+    seen = set()
+
+    def add(ref: ImageRef) -> None:
+        if ref.url and ref.url not in seen and len(refs) < limit:
+            seen.add(ref.url)
+            refs.append(ref)
+
+    # 1) Attachments (oversized uploads are dropped here, before any download)
+    for att in getattr(message, "attachments", None) or []:
+        ct = (att.content_type or "").lower()
+        name = (att.filename or "").lower()
+        if ct.startswith("image/") or name.endswith(IMAGE_EXTS) or "image" in ct:
+            if (getattr(att, "size", None) or 0) > IMAGE_MAX_BYTES:
+                fetch_stats["too_large"] += 1
+                logger.info(f"Skipping {att.size}-byte attachment {name}: over {IMAGE_MAX_BYTES} bytes")
+                continue
+            add(ImageRef(url=att.url, source="attachment", content_type=ct, filename=name,
+                         size=getattr(att, "size", None), attachment=att))
+
+    # 2) Embeds (Tenor/Giphy/regular links with images); emb.url is often not a direct image
+    for emb in getattr(message, "embeds", None) or []:
+        for media in (getattr(emb, "image", None), getattr(emb, "thumbnail", None)):
+            url = getattr(media, "url", None)
+            if url and is_image_url(url):
+                add(ImageRef(url=url, source="embed"))
+
+    # 3) Direct image links in the text, only if nothing else was found
+    if not refs and getattr(message, "content", None):
+        for url in _URL_RE.findall(message.content):
+            if is_image_url(url):
+                add(ImageRef(url=url, source="content"))
+    return refs
+
+
+class ImageTooLarge(Exception):
+    """Body is over IMAGE_MAX_BYTES; a property of the image, not a host failure"""
+
+
+class NotAnImage(Exception):
+    """Link resolved to something else (usually an HTML page)"""
+
+
+fetch_stats: Dict[str, int] = {"fetched": 0, "bytes": 0, "too_large": 0, "not_image": 0,
+                               "failed": 0, "timeouts": 0, "host_skipped": 0}
+_host_breakers: "OrderedDict[str, CircuitBreaker]" = OrderedDict()
+
+
+def _host_breaker(url: str) -> CircuitBreaker:
+    """Per-host breaker, kept out of the shared registry so a flaky meme host never shows on /health"""
+    host = urlsplit(url).hostname or ""
+    breaker = _host_breakers.get(host)
+    if breaker is None:
+        breaker = CircuitBreaker(f"image_host:{host}", failure_threshold=IMAGE_HOST_FAILURES,
+                                 reset_timeout=IMAGE_HOST_COOLDOWN_SECONDS,
+                                 is_failure=lambda e: not isinstance(e, (ImageTooLarge, NotAnImage)))
+        _host_breakers[host] = breaker
+        while len(_host_breakers) > IMAGE_MAX_HOSTS_TRACKED:
+            _host_breakers.popitem(last=False)
+    _host_breakers.move_to_end(host)
+    return breaker
+
+
+async def _stream_url(url: str) -> Tuple[bytes, str]:
+    """GET with a deadline, refusing bodies over IMAGE_MAX_BYTES without buffering them"""
+    timeout = aiohttp.ClientTimeout(total=IMAGE_FETCH_TIMEOUT)
+    async with http_pool.session().get(url, timeout=timeout) as response:
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+        content_type = response.headers.get("content-type", "")
+        if content_type.startswith(("text/", "application/json")):
+            raise NotAnImage(content_type)
+        if response.content_length is not None and response.content_length > IMAGE_MAX_BYTES:
+            raise ImageTooLarge(f"Content-Length {response.content_length}")
+        body = bytearray()
+        async for chunk in response.content.iter_chunked(_CHUNK_BYTES):
+            body.extend(chunk)
+            if len(body) > IMAGE_MAX_BYTES:
+                raise ImageTooLarge(f"over {IMAGE_MAX_BYTES} bytes while streaming")
+        return bytes(body), guess_mime(url, content_type)
+
+
+async def fetch_image(ref: ImageRef) -> Optional[Tuple[bytes, str]]:
+    """(bytes, mime) for a candidate, or None"""
+    try:
+        if ref.attachment is not None:
+            # size was checked against the attachment metadata in image_candidates()
+            data = await asyncio.wait_for(ref.attachment.read(), IMAGE_FETCH_TIMEOUT)
+            mime = guess_mime(ref.filename, ref.content_type)
+        else:
+            # OpenAI can't reach Discord CDN links reliably, so everything is inlined
+            data, mime = await _host_breaker(ref.url).call(lambda: _stream_url(ref.url))
+    except CircuitOpenError as e:
+        fetch_stats["host_skipped"] += 1
+        logger.info(f"Skipping image from failing host ({e}): {ref.url[:80]}")
+        return None
+    except ImageTooLarge as e:
+        fetch_stats["too_large"] += 1
+        logger.info(f"Skipping oversized image ({e}): {ref.url[:80]}")
+        return None
+    except NotAnImage as e:
+        fetch_stats["not_image"] += 1
+        logger.info(f"Link is not an image ({e}): {ref.url[:80]}")
+        return None
+    except asyncio.TimeoutError:
+        fetch_stats["timeouts"] += 1
+        logger.warning(f"Image download timed out after {IMAGE_FETCH_TIMEOUT}s: {ref.url[:80]}")
+        return None
+    except Exception as e:
+        fetch_stats["failed"] += 1
+        logger.error(f"Error downloading image from {ref.url}: {e}")
+        return None
+    fetch_stats["fetched"] += 1
+    fetch_stats["bytes"] += len(data)
+    return data, mime
+
+
+async def _bounded(refs: List[ImageRef], fn: Callable[[ImageRef], Awaitable[Any]]) -> List[Any]:
+    """Run fn over refs at most IMAGE_FETCH_CONCURRENCY at a time, results in input order"""
+    semaphore = asyncio.Semaphore(IMAGE_FETCH_CONCURRENCY)
+
+    async def _run(ref: ImageRef):
+        async with semaphore:
+            return await fn(ref)
+
+    return await asyncio.gather(*(_run(ref) for ref in refs))
+
+
+def get_fetch_stats() -> Dict:
+    open_hosts = [host for host, breaker in _host_breakers.items() if breaker.state != "closed"]
+    return {**fetch_stats, "hosts_tracked": len(_host_breakers), "hosts_skipped_now": open_hosts}
+
+
+metrics.register("image_fetch", get_fetch_stats)
+
+
+def to_content_block(data: bytes, mime: str, detail: str = "auto") -> dict:
+    b64_string = base64.b64encode(data).decode("utf-8")
+    return {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{b64_string}", "detail": detail}}
+
+
+def prepared_blocks(prepared: PreparedImage) -> List[dict]:
+    blocks = []
+    if len(prepared.parts) > 1:
+        blocks.append({"type": "text", "text": f"[{len(prepared.parts)} frames from one animated GIF, in order]"})
+    for data, mime, detail in prepared.parts:
+        blocks.append(to_content_block(data, mime, detail))
+    return blocks
+
+
+async def describe_image_ref(ref: ImageRef, describe: Callable[[List[dict]], Awaitable[Optional[str]]]) -> Optional[str]:
+    """Description of one candidate: exact hash hit, perceptual hit, or one vision call"""
+    fetched = await fetch_image(ref)
+    if not fetched:
+        return None
+    data, mime = fetched
+    sha = await asyncio.to_thread(content_hash, data)
+    description = await vision_cache.get(sha)
+    if description:
+        logger.info(f"Vision cache hit (exact) for {ref.source} image: {ref.url[:50]}...")
+        return description
+
+    prepared = await image_preprocessor.prepare(data, mime)
+    if not prepared.parts:
+        return None
+    description = vision_cache.get_similar(prepared.phash)
+    if description:
+        logger.info(f"Vision cache hit (perceptual) for {ref.source} image: {ref.url[:50]}...")
+    else:
+        description = await describe(prepared_blocks(prepared))
+        if not description:
+            return None
+    vision_cache.put(sha, description, prepared.phash)
+    return description
+
+
+async def describe_images(refs: List[ImageRef],
+                          describe: Callable[[List[dict]], Awaitable[Optional[str]]]) -> List[str]:
+    """Descriptions for every candidate that could be fetched and described, in order"""
+    results = await _bounded(refs, lambda ref: describe_image_ref(ref, describe))
+    return [description for description in results if description]
+
+
+def with_image_descriptions(text: str, descriptions: List[str]) -> str:
+    """Fold image descriptions into the user's message (on one line) for a text-only completion"""
+    descriptions = [" ".join(d.split()) for d in descriptions]
+    if len(descriptions) == 1:
+        notes = f"[they attached an image: {descriptions[0]}]"
+    else:
+        notes = " ".join(f"[attached image {i}: {d}]" for i, d in enumerate(descriptions, 1))
+    if text:
+        return f"{text} {notes}"
+    return f"{notes} (no message with it, just react to what they sent)"
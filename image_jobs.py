@@ -0,0 +1,230 @@
+"""
+Image generation job queue.
+
+``!image`` submits a job instead of awaiting DALL-E inline. Jobs wait in a
+bounded FIFO queue served by a few workers, with caps on outstanding jobs per
+user and on concurrently running jobs per guild. Finished images are stored
+on disk under a key built from the normalized prompt and size, so repeated
+prompts are served without another generation. Jobs report progress
+(queue position, running, done) through a callback so the command can keep
+a single status message up to date.
+"""
+
+import os
+import re
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CACHE_DIR = os.getenv("JIM_IMAGE_CACHE_DIR", "image_cache")
+IMAGE_CACHE_MAX_FILES = int(os.getenv("JIM_IMAGE_CACHE_MAX_FILES", "500"))
+IMAGE_QUEUE_MAX = int(os.getenv("JIM_IMAGE_QUEUE_MAX", "20"))
+IMAGE_WORKERS = int(os.getenv("JIM_IMAGE_WORKERS", "2"))
+IMAGE_PER_USER = int(os.getenv("JIM_IMAGE_PER_USER", "1"))
+IMAGE_PER_GUILD = int(os.getenv("JIM_IMAGE_PER_GUILD", "2"))
+# how long !image waits (queue + generation) before telling the user it gave up
+IMAGE_JOB_DEADLINE = float(os.getenv("JIM_IMAGE_JOB_DEADLINE", "300"))
+
+
+class ImageJobRejected(Exception):
+    """Raised by submit() when a cap is hit; the message is user-facing"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", (prompt or "").strip().lower()).rstrip(".!?")
+
+
+def cache_key(prompt: str, size: str) -> str:
+    return hashlib.sha256(f"{normalize_prompt(prompt)}|{size}".encode()).hexdigest()[:32]
+
+
+@dataclass
+class ImageJob:
+    prompt: str
+    size: str
+    user_id: int
+    guild_id: Optional[int]
+    key: str
+    on_progress: Optional[Callable[["ImageJob"], Awaitable[None]]] = None
+    state: str = "queued"  # queued | running | done | failed
+    position: int = 0
+    path: Optional[str] = None
+    cached: bool = False
+    submitted_at: float = field(default_factory=time.monotonic)
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+    async def wait(self) -> Optional[str]:
+        """Path of the generated PNG, or None if generation failed"""
+        await self.done.wait()
+        return self.path
+
+
+class ImageJobQueue:
+    """Bounded image queue with per-user/per-guild caps and a disk result cache"""
+
+    def __init__(self, generate: Callable[..., Awaitable[Optional[List[str]]]],
+                 cache_dir: str = IMAGE_CACHE_DIR, max_queue: int = IMAGE_QUEUE_MAX,
+                 workers: int = IMAGE_WORKERS, per_user: int = IMAGE_PER_USER,
+                 per_guild: int = IMAGE_PER_GUILD, max_cached: int = IMAGE_CACHE_MAX_FILES):
+        self.generate = generate
+        self.cache_dir = cache_dir
+        self.max_queue = max_queue
+        self.workers = workers
+        self.per_user = per_user
+        self.per_guild = per_guild
+        self.max_cached = max_cached
+        self._queue: List[ImageJob] = []
+        self._user_jobs: Dict[int, int] = defaultdict(int)       # queued + running
+        self._guild_running: Dict[Optional[int], int] = defaultdict(int)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {"submitted": 0, "cache_hits": 0, "generated": 0, "failed": 0, "rejected": 0}
+        self._wait_times: List[float] = []
+
+    # ---------- disk cache ----------
+    def cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _cached(self, key: str) -> Optional[str]:
+        path = self.cache_path(key)
+        if os.path.exists(path):
+            os.utime(path)  # LRU by mtime
+            return path
+        return None
+
+    def _store(self, key: str, data: bytes) -> str:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.cache_path(key)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._prune()
+        return path
+
+    def _prune(self) -> None:
+        files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".png")]
+        if len(files) <= self.max_cached:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_cached]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # ---------- queue ----------
+    async def submit(self, prompt: str, user_id: int, guild_id: Optional[int] = None, size: str = "1024x1024",
+                     on_progress: Optional[Callable[[ImageJob], Awaitable[None]]] = None) -> ImageJob:
+        key = cache_key(prompt, size)
+        job = ImageJob(prompt=prompt, size=size, user_id=user_id, guild_id=guild_id, key=key, on_progress=on_progress)
+        self.stats["submitted"] += 1
+
+        path = self._cached(key)
+        if path:
+            self.stats["cache_hits"] += 1
+            job.state, job.path, job.cached = "done", path, True
+            job.done.set()
+            return job
+
+        if self._user_jobs[user_id] >= self.per_user:
+            self.stats["rejected"] += 1
+            raise ImageJobRejected("you already got an image cooking, wait for that one first")
+        if len(self._queue) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise ImageJobRejected("image queue's packed rn, try again in a bit")
+
+        self._user_jobs[user_id] += 1
+        self._queue.append(job)
+        job.position = len(self._queue)
+        self._ensure_workers()
+        self._wakeup.set()
+        return job
+
+    def _ensure_workers(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._tasks = [t for t in self._tasks if not t.done()]
+        loop = asyncio.get_running_loop()
+        while len(self._tasks) < self.workers:
+            self._tasks.append(loop.create_task(self._worker()))
+
+    def _next_job(self) -> Optional[ImageJob]:
+        for job in self._queue:
+            if self._guild_running[job.guild_id] < self.per_guild:
+                return job
+        return None
+
+    async def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self._queue.remove(job)
+            self._guild_running[job.guild_id] += 1
+            self._wait_times = (self._wait_times + [time.monotonic() - job.submitted_at])[-200:]
+            await self._publish_positions()
+            try:
+                job.state = "running"
+                await self._notify(job)
+                job.path = await self._run(job)
+                job.state = "done" if job.path else "failed"
+            finally:
+                self._guild_running[job.guild_id] -= 1
+                self._user_jobs[job.user_id] -= 1
+                if self._user_jobs[job.user_id] <= 0:
+                    self._user_jobs.pop(job.user_id, None)
+                job.done.set()
+                self._wakeup.set()
+
+    async def _run(self, job: ImageJob) -> Optional[str]:
+        try:
+            # another job may have produced the same image while this one waited
+            path = self._cached(job.key)
+            if path:
+                self.stats["cache_hits"] += 1
+                return path
+            results = await self.generate(job.prompt, job.size, response_format="b64_json")
+            if not results:
+                self.stats["failed"] += 1
+                return None
+            data = base64.b64decode(results[0])
+            path = await asyncio.to_thread(self._store, job.key, data)
+            self.stats["generated"] += 1
+            logger.info(f"Generated image {job.key} for {job.user_id}")
+            return path
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"Image job failed for {job.user_id}: {e}")
+            return None
+
+    async def _publish_positions(self) -> None:
+        for index, job in enumerate(list(self._queue), start=1):
+            if job.position != index:
+                job.position = index
+                await self._notify(job)
+
+    async def _notify(self, job: ImageJob) -> None:
+        if job.on_progress:
+            try:
+                await job.on_progress(job)
+            except Exception as e:
+                logger.warning(f"Image progress update failed: {e}")
+
+    def get_stats(self) -> Dict:
+        waits = sorted(self._wait_times)
+        return {
+            **self.stats,
+            "queued": len(self._queue),
+            "running": sum(self._guild_running.values()),
+            "p95_queue_wait_s": round(waits[int(0.95 * (len(waits) - 1))], 2) if waits else None,
+        }
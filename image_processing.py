@@ -0,0 +1,250 @@
+"""
+Image preprocessing before vision requests.
+
+Downloaded images are decoded, EXIF-rotated, shrunk to the size OpenAI would
+downscale them to anyway, and re-encoded without metadata (JPEG, or WebP when
+there is transparency). The ``detail`` level is chosen from the result: small
+images go as ``low`` (flat 85 tokens), everything else as ``high``.
+
+The worker also returns a 64-bit dHash (perceptual hash) of still images so
+re-encoded or resized reposts can be recognised by ``vision_cache``.
+Animations get none: GIFs sharing a first frame often differ afterwards, so
+they are only matched by exact content hash.
+
+Animated GIF/WebP is sampled instead of sent whole: the first frame, the
+middle frame and the strongest scene changes, each shrunk to a low-detail
+thumbnail, go out as an ordered multi-image request. Frame decoding is capped
+by frame count, decoded pixels and input size (oversized animations fall back
+to their first frame), and only the kept frames are held in memory.
+
+Decoding and encoding are CPU-bound, so they run in a small process pool to
+keep the event loop free. Workers are spawned rather than forked: the bot
+process has other threads (Flask, the vector store pool) whose held locks a
+forked child would inherit. Pillow is a declared dependency; the import
+guard only keeps the bot usable in a partial install, where images pass
+through untouched.
+"""
+
+import io
+import os
+import heapq
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+logger = logging.getLogger(__name__)
+if not HAS_PIL:
+    logger.warning("Pillow is not installed; images will be sent without resizing, frame sampling or dedup")
+
+VISION_MAX_EDGE = int(os.getenv("JIM_VISION_MAX_EDGE", "1536"))
+# high detail rescales the short side to 768px server-side; more is wasted upload
+VISION_MAX_SHORT_EDGE = int(os.getenv("JIM_VISION_MAX_SHORT_EDGE", "768"))
+VISION_LOW_DETAIL_EDGE = int(os.getenv("JIM_VISION_LOW_DETAIL_EDGE", "512"))
+VISION_DETAIL = os.getenv("JIM_VISION_DETAIL", "auto").lower()  # auto | low | high
+VISION_JPEG_QUALITY = int(os.getenv("JIM_VISION_JPEG_QUALITY", "82"))
+IMAGE_MAX_PIXELS = int(os.getenv("JIM_IMAGE_MAX_PIXELS", "40000000"))
+IMAGE_PROCESS_WORKERS = int(os.getenv("JIM_IMAGE_PROCESS_WORKERS", "2"))
+IMAGE_PROCESS_TIMEOUT = float(os.getenv("JIM_IMAGE_PROCESS_TIMEOUT", "15"))
+# when preprocessing fails, only images this small are still sent as-is
+IMAGE_PASSTHROUGH_MAX_BYTES = int(os.getenv("JIM_IMAGE_PASSTHROUGH_MAX_BYTES", str(256 * 1024)))
+
+GIF_MAX_FRAMES = int(os.getenv("JIM_GIF_MAX_FRAMES", "4"))                   # frames sent to the model
+GIF_MAX_DECODED_FRAMES = int(os.getenv("JIM_GIF_MAX_DECODED_FRAMES", "150"))
+GIF_MAX_DECODED_PIXELS = int(os.getenv("JIM_GIF_MAX_DECODED_PIXELS", "60000000"))
+GIF_MAX_BYTES = int(os.getenv("JIM_GIF_MAX_BYTES", str(8 * 1024 * 1024)))    # bigger: first frame only
+GIF_FRAME_EDGE = int(os.getenv("JIM_GIF_FRAME_EDGE", "512"))
+GIF_SCENE_THRESHOLD = float(os.getenv("JIM_GIF_SCENE_THRESHOLD", "12"))      # mean abs diff, 0-255
+
+
+def target_size(width: int, height: int, max_edge: int = VISION_MAX_EDGE,
+                max_short_edge: int = VISION_MAX_SHORT_EDGE) -> Tuple[int, int]:
+    """Largest size within both edge limits, never upscaling"""
+    scale = min(1.0, max_edge / max(width, height), max_short_edge / max(1, min(width, height)))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def choose_detail(width: int, height: int) -> str:
+    if VISION_DETAIL in ("low", "high"):
+        return VISION_DETAIL
+    return "low" if max(width, height) <= VISION_LOW_DETAIL_EDGE else "high"
+
+
+def _encode(img, quality: int) -> Tuple[bytes, str]:
+    """Re-encode without EXIF/ICC/comments: WebP if there's alpha, else JPEG"""
+    out = io.BytesIO()
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    if has_alpha:
+        img.convert("RGBA").save(out, "WEBP", quality=quality, method=4)
+        return out.getvalue(), "image/webp"
+    img.convert("RGB").save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    return out.getvalue(), "image/jpeg"
+
+
+@dataclass
+class PreparedImage:
+    """What one downloaded image turns into: parts to send + a perceptual hash"""
+    parts: List[Tuple[bytes, str, str]] = field(default_factory=list)  # (bytes, mime, detail)
+    phash: Optional[int] = None
+
+
+def dhash(img, size: int = 8) -> int:
+    """Difference hash: brighter-than-right-neighbour bits over a (size+1)x size thumbnail"""
+    pixels = img.convert("L").resize((size + 1, size), Image.LANCZOS).tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            offset = row * (size + 1) + col
+            bits = (bits << 1) | (pixels[offset] > pixels[offset + 1])
+    return bits
+
+
+def _signature(frame) -> bytes:
+    """Tiny grayscale fingerprint used to spot scene changes"""
+    return frame.convert("L").resize((16, 16), Image.BILINEAR).tobytes()
+
+
+def _sample_frames(img, data_len: int, opts: Dict) -> List[int]:
+    """Pick frame indices: first, middle and the biggest scene changes, within the caps"""
+    total = min(getattr(img, "n_frames", 1), opts["gif_max_decoded_frames"],
+                max(1, opts["gif_max_decoded_pixels"] // max(1, img.width * img.height)))
+    if data_len > opts["gif_max_bytes"] or total <= 1 or opts["gif_max_frames"] <= 1:
+        return [0]
+    fixed = {0, total // 2}
+    changes: List[Tuple[float, int]] = []  # min-heap of (score, index)
+    prev = None
+    for index in range(total):
+        img.seek(index)
+        sig = _signature(img)
+        if prev is not None and index not in fixed:
+            score = sum(abs(a - b) for a, b in zip(sig, prev)) / len(sig)
+            if score >= opts["gif_scene_threshold"]:
+                heapq.heappush(changes, (score, index))
+                if len(changes) > opts["gif_max_frames"] - len(fixed):
+                    heapq.heappop(changes)
+        prev = sig
+    return sorted(fixed | {index for _, index in changes})[:opts["gif_max_frames"]]
+
+
+def _process_animation(img, data_len: int, opts: Dict) -> List[Tuple[bytes, str, int, int]]:
+    frames = []
+    for index in _sample_frames(img, data_len, opts):
+        img.seek(index)
+        frame = img.convert("RGBA")
+        if frame.getextrema()[3][0] == 255:
+            frame = frame.convert("RGB")  # fully opaque: JPEG is smaller
+        size = target_size(frame.width, frame.height, opts["gif_frame_edge"], opts["gif_frame_edge"])
+        if size != frame.size:
+            frame = frame.resize(size, Image.LANCZOS)
+        encoded, mime = _encode(frame, opts["quality"])
+        frames.append((encoded, mime, frame.width, frame.height))
+    return frames
+
+
+def _process_sync(data: bytes, opts: Dict) -> Tuple[List[Tuple[bytes, str, int, int]], Optional[int]]:
+    """Worker: (one (bytes, mime, width, height) per image/frame to send, dHash or None)"""
+    Image.MAX_IMAGE_PIXELS = opts["max_pixels"]
+    with Image.open(io.BytesIO(data)) as img:
+        if getattr(img, "is_animated", False):
+            return _process_animation(img, len(data), opts), None
+        size = target_size(img.width, img.height, opts["max_edge"], opts["max_short_edge"])
+        img.draft("RGB", size)  # JPEG: decode at a reduced scale when possible
+        img = ImageOps.exif_transpose(img)
+        phash = dhash(img)
+        size = target_size(img.width, img.height, opts["max_edge"], opts["max_short_edge"])
+        if size != img.size:
+            img = img.resize(size, Image.LANCZOS)
+        encoded, mime = _encode(img, opts["quality"])
+        return [(encoded, mime, img.width, img.height)], phash
+
+
+def _worker_options() -> Dict:
+    return {
+        "max_edge": VISION_MAX_EDGE, "max_short_edge": VISION_MAX_SHORT_EDGE,
+        "quality": VISION_JPEG_QUALITY, "max_pixels": IMAGE_MAX_PIXELS,
+        "gif_max_frames": GIF_MAX_FRAMES, "gif_max_decoded_frames": GIF_MAX_DECODED_FRAMES,
+        "gif_max_decoded_pixels": GIF_MAX_DECODED_PIXELS, "gif_max_bytes": GIF_MAX_BYTES,
+        "gif_frame_edge": GIF_FRAME_EDGE, "gif_scene_threshold": GIF_SCENE_THRESHOLD,
+    }
+
+
+class ImagePreprocessor:
+    """Shrinks/recompresses images off the event loop in a process pool"""
+
+    def __init__(self, workers: int = IMAGE_PROCESS_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.stats = {"processed": 0, "passthrough": 0, "rejected": 0, "errors": 0,
+                      "animations": 0, "frames_sent": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def prepare(self, data: bytes, mime: str) -> PreparedImage:
+        """Parts ready for image_url blocks (several for an animation, none if
+        undecodable) plus the perceptual hash when Pillow is available"""
+        self.stats["bytes_in"] += len(data)
+        if not HAS_PIL:
+            self.stats["passthrough"] += 1
+            self.stats["bytes_out"] += len(data)
+            return PreparedImage([(data, mime, "auto")])
+        loop = asyncio.get_running_loop()
+        try:
+            results, phash = await asyncio.wait_for(
+                loop.run_in_executor(self._get_pool(), _process_sync, data, _worker_options()),
+                IMAGE_PROCESS_TIMEOUT,
+            )
+        except (Image.DecompressionBombError, UnidentifiedImageError) as e:
+            # the model can't use what Pillow can't decode either
+            self.stats["rejected"] += 1
+            logger.warning(f"Dropping image ({mime}, {len(data)} bytes): {e}")
+            return PreparedImage()
+        except Exception as e:
+            self.stats["errors"] += 1
+            if isinstance(e, BrokenProcessPool):
+                self._pool = None  # a worker died (e.g. OOM); start fresh next time
+            if len(data) > IMAGE_PASSTHROUGH_MAX_BYTES:
+                # slow/pathological images are exactly the ones that shouldn't go out full size
+                logger.error(f"Image preprocessing failed, dropping {len(data)}-byte image: {e!r}")
+                return PreparedImage()
+            logger.error(f"Image preprocessing failed, sending small original as-is: {e!r}")
+            self.stats["bytes_out"] += len(data)
+            return PreparedImage([(data, mime, "low")])
+
+        self.stats["processed"] += 1
+        if len(results) > 1:
+            self.stats["animations"] += 1
+            self.stats["frames_sent"] += len(results)
+        self.stats["bytes_out"] += sum(len(encoded) for encoded, _, _, _ in results)
+        parts = [(encoded, new_mime, choose_detail(width, height)) for encoded, new_mime, width, height in results]
+        return PreparedImage(parts, phash)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats, has_pil=HAS_PIL, workers=self.workers)
+        if stats["bytes_in"]:
+            stats["bytes_saved_ratio"] = round(1 - stats["bytes_out"] / stats["bytes_in"], 4)
+        return stats
+
+
+# shared preprocessor for the whole process
+image_preprocessor = ImagePreprocessor()
+metrics.register("image_preprocess", image_preprocessor.get_stats)
@@ -23,6 +23,8 @@ from dotenv import load_dotenv
 from flask import Flask, jsonify
 import aiohttp
 
+from search_service import SEARCH_PERSIST, SearchCacheStore, SearchService
+
 # Load environment variables
 load_dotenv()
 
@@ -317,10 +319,14 @@ RESPONSE GUIDELINES:
 class GoogleSearcher:
     """Handles Google search functionality"""
     
-    def __init__(self):
+    def __init__(self, database_url: Optional[str] = None):
         self.api_key = os.getenv('GOOGLE_API_KEY')
         self.cse_id = os.getenv('GOOGLE_CSE_ID')
         self.enabled = bool(self.api_key and self.cse_id)
+        # shared session + TTL/stale-while-revalidate cache; the search_cache table is the
+        # persistent tier, opt-in via JIM_SEARCH_PERSIST like default_persistent_tier()
+        persistent = SearchCacheStore(database_url) if SEARCH_PERSIST and database_url else None
+        self.service = SearchService(self.api_key, self.cse_id, persistent=persistent)
     
     async def search(self, query: str, num_results: int = 3) -> List[Dict]:
         """Perform Google search"""
@@ -328,28 +334,7 @@ class GoogleSearcher:
             return []
         
         try:
-            url = "https://www.googleapis.com/customsearch/v1"
-            params = {
-                'key': self.api_key,
-                'cx': self.cse_id,
-                'q': query,
-                'num': num_results
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    data = await response.json()
-                    
-                    results = []
-                    for item in data.get('items', []):
-                        results.append({
-                            'title': item.get('title', ''),
-                            'link': item.get('link', ''),
-                            'snippet': item.get('snippet', '')
-                        })
-                    
-                    return results
-                    
+            return await self.service.search(query, num_results)
         except Exception as e:
             logger.error(f"Google search failed: {e}")
             return []
@@ -367,7 +352,7 @@ class JimBot(commands.Bot):
         
         # Initialize components
         self.db = DatabaseManager()
-        self.searcher = GoogleSearcher()
+        self.searcher = GoogleSearcher(self.db.database_url)
         
         # Track user interactions
         self.user_interactions: Dict[int, datetime] = {}
@@ -0,0 +1,95 @@
+"""
+Per-user, per-channel message coalescing.
+
+People type in bursts ("jim" / "yo" / "what's the best gun in cod"). Instead
+of answering the first line and dropping the rest while a reply is in
+flight, messages are buffered per (author, channel). A burst is handed to the
+handler as one batch once the user has been quiet for COALESCE_WINDOW seconds
+(or COALESCE_MAX_WAIT after its first message, whichever is sooner). Anything
+that arrives while the handler runs becomes the next batch, so one reply
+covers every line the user typed in the meantime.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COALESCE_WINDOW_SECONDS = float(os.getenv("JIM_COALESCE_WINDOW", "1.5"))
+COALESCE_MAX_WAIT_SECONDS = float(os.getenv("JIM_COALESCE_MAX_WAIT", "5"))
+COALESCE_MAX_MESSAGES = int(os.getenv("JIM_COALESCE_MAX_MESSAGES", "8"))
+
+
+class _Burst:
+    __slots__ = ("messages", "first_at", "last_at", "task")
+
+    def __init__(self):
+        self.messages: List[Any] = []
+        self.first_at = 0.0
+        self.last_at = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+
+class MessageCoalescer:
+    """Debounces discord messages per (author, channel) into batches for one handler call"""
+
+    def __init__(self, handler: Callable[[List[Any]], Awaitable[None]],
+                 window: float = COALESCE_WINDOW_SECONDS, max_wait: float = COALESCE_MAX_WAIT_SECONDS,
+                 max_messages: int = COALESCE_MAX_MESSAGES):
+        self.handler = handler
+        self.window = window
+        self.max_wait = max_wait
+        self.max_messages = max_messages
+        self._bursts: Dict[Tuple[int, int], _Burst] = {}
+        self.stats = {"messages": 0, "batches": 0, "coalesced": 0, "dropped": 0, "errors": 0}
+
+    @staticmethod
+    def key(message) -> Tuple[int, int]:
+        return message.author.id, message.channel.id
+
+    def is_active(self, message) -> bool:
+        """True while this user's burst in this channel is pending or being answered"""
+        return self.key(message) in self._bursts
+
+    def add(self, message) -> None:
+        key = self.key(message)
+        burst = self._bursts.get(key)
+        if burst is None:
+            burst = self._bursts[key] = _Burst()
+        now = time.monotonic()
+        if not burst.messages:
+            burst.first_at = now
+        burst.messages.append(message)
+        burst.last_at = now
+        self.stats["messages"] += 1
+        if len(burst.messages) > self.max_messages:
+            burst.messages.pop(0)  # keep the latest lines; they carry the actual question
+            self.stats["dropped"] += 1
+        if burst.task is None:
+            burst.task = asyncio.create_task(self._run(key, burst))
+
+    async def _run(self, key: Tuple[int, int], burst: _Burst) -> None:
+        try:
+            while burst.messages:
+                # quiet for `window`, but never hold the first message longer than `max_wait`
+                while True:
+                    delay = min(burst.last_at + self.window, burst.first_at + self.max_wait) - time.monotonic()
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                batch, burst.messages = burst.messages, []
+                self.stats["batches"] += 1
+                self.stats["coalesced"] += len(batch) - 1
+                try:
+                    await self.handler(batch)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.error(f"Error handling message batch: {e}")
+        finally:
+            self._bursts.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "active_bursts": len(self._bursts), "window_s": self.window}
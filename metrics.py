@@ -0,0 +1,66 @@
+"""
+Tiny in-process metrics registry.
+
+Components register a zero-argument callable returning a JSON-able dict;
+``snapshot()`` collects them all (served by web_server's /metrics route).
+"""
+
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_providers: Dict[str, Callable[[], dict]] = {}
+_lock = threading.Lock()
+
+
+class LatencyWindow:
+    """Rolling window of latency samples (ms) with percentiles"""
+
+    def __init__(self, maxlen: int = 500):
+        self._samples = deque(maxlen=maxlen)
+        self.count = 0
+
+    def observe(self, ms: float) -> None:
+        self._samples.append(ms)
+        self.count += 1
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+        return ordered[idx]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        def _r(v):
+            return round(v, 1) if v is not None else None
+        return {
+            "count": self.count,
+            "p50_ms": _r(self.percentile(50)),
+            "p95_ms": _r(self.percentile(95)),
+            "p99_ms": _r(self.percentile(99)),
+        }
+
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    with _lock:
+        _providers[name] = provider
+
+
+def snapshot() -> Dict[str, dict]:
+    with _lock:
+        providers = dict(_providers)
+    out = {}
+    for name, provider in providers.items():
+        try:
+            out[name] = provider()
+        except Exception as e:
+            logger.error(f"Metrics provider {name} failed: {e}")
+            out[name] = {"error": str(e)}
+    return out
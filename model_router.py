@@ -0,0 +1,147 @@
+"""
+Per-request model routing for chat completions.
+
+Short, ambient banter goes to a small fast model; long or complex asks and
+anything addressed with a real question go to the large model; images go to the vision model. If the large model's recent p95
+latency is over the SLO, borderline requests are downgraded too.
+
+JIM_ROUTER_POLICY=fixed turns routing off (everything uses OPENAI_MODEL, vision
+uses the vision model), which is the old behaviour.
+"""
+
+import os
+import re
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from metrics import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+ROUTER_POLICY = os.getenv("JIM_ROUTER_POLICY", "adaptive").strip().lower()
+SMALL_MODEL = os.getenv("JIM_ROUTER_SMALL_MODEL", "gpt-4o-mini")
+VISION_MODEL = os.getenv("JIM_ROUTER_VISION_MODEL", "gpt-4o")
+SHORT_MESSAGE_CHARS = int(os.getenv("JIM_ROUTER_SHORT_CHARS", "120"))
+LARGE_LATENCY_SLO_MS = float(os.getenv("JIM_ROUTER_LATENCY_SLO_MS", "6000"))
+
+# USD per 1M tokens (input, output); rough list prices for cost stats only
+MODEL_PRICES = {
+    "gpt-5": (1.25, 10.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+
+_COMPLEX_RE = re.compile(
+    r"\b(explain|how (do|does|can|to)|why|what('s| is) the difference|compare|write|code|debug|fix|"
+    r"step[- ]by[- ]step|summari[sz]e|translate|calculate|recommend|help me)\b|```",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class RouteRequest:
+    text: str = ""
+    has_images: bool = False
+    addressed: bool = True
+
+
+class ModelRouter:
+    """Chooses a model per request and keeps per-route latency/cost stats"""
+
+    def __init__(self, policy: str = ROUTER_POLICY, small_model: str = SMALL_MODEL,
+                 vision_model: str = VISION_MODEL, short_chars: int = SHORT_MESSAGE_CHARS,
+                 latency_slo_ms: float = LARGE_LATENCY_SLO_MS):
+        self.policy = policy
+        self.small_model = small_model
+        self.vision_model = vision_model
+        self.short_chars = short_chars
+        self.latency_slo_ms = latency_slo_ms
+        self._latency: Dict[str, LatencyWindow] = defaultdict(LatencyWindow)
+        self._model_latency: Dict[str, LatencyWindow] = defaultdict(LatencyWindow)
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._tokens: Dict[str, Dict[str, int]] = defaultdict(lambda: {"prompt": 0, "completion": 0})
+        self._cost: Dict[str, float] = defaultdict(float)
+        # per system-prompt version, so personality changes can be lined up with latency/token shifts
+        self._prompt_latency: Dict[str, LatencyWindow] = defaultdict(LatencyWindow)
+        self._prompt_tokens: Dict[str, Dict[str, int]] = defaultdict(lambda: {"requests": 0, "prompt": 0, "completion": 0})
+
+    @staticmethod
+    def is_complex(text: str) -> bool:
+        text = text or ""
+        sentences = len(re.findall(r"[.!?]+(?:\s|$)", text))
+        return bool(_COMPLEX_RE.search(text)) or sentences >= 3 or "\n" in text.strip()
+
+    def choose(self, req: RouteRequest, large_model: str) -> Tuple[str, str]:
+        """Return (route, model) for a request; large_model is the configured OPENAI_MODEL"""
+        if req.has_images:
+            return "vision", self.vision_model
+        if self.policy == "fixed":
+            return "fixed", large_model
+
+        text = (req.text or "").strip()
+        if self.is_complex(text) or len(text) > self.short_chars * 3:
+            return "complex", large_model
+        if len(text) <= self.short_chars and (not req.addressed or "?" not in text):
+            return "banter", self.small_model
+
+        # borderline: addressed question of medium length; downgrade if the big model is slow
+        p95 = self._model_latency[large_model].percentile(95)
+        if p95 is not None and p95 > self.latency_slo_ms:
+            logger.info(f"{large_model} p95 {p95:.0f}ms over SLO; routing to {self.small_model}")
+            return "degraded", self.small_model
+        return "default", large_model
+
+    def record(self, route: str, model: str, latency_s: float, usage=None, ok: bool = True,
+               prompt_version: Optional[str] = None) -> None:
+        self._counts[route] += 1
+        if not ok:
+            self._errors[route] += 1
+            return
+        ms = latency_s * 1000
+        self._latency[route].observe(ms)
+        self._model_latency[model].observe(ms)
+        if prompt_version is not None:
+            self._prompt_latency[prompt_version].observe(ms)
+            self._prompt_tokens[prompt_version]["requests"] += 1
+        if usage is not None:
+            prompt = getattr(usage, "prompt_tokens", 0) or 0
+            completion = getattr(usage, "completion_tokens", 0) or 0
+            self._tokens[route]["prompt"] += prompt
+            self._tokens[route]["completion"] += completion
+            if prompt_version is not None:
+                self._prompt_tokens[prompt_version]["prompt"] += prompt
+                self._prompt_tokens[prompt_version]["completion"] += completion
+            price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+            self._cost[route] += (prompt * price_in + completion * price_out) / 1_000_000
+
+    def model_p95_ms(self, model: str) -> Optional[float]:
+        return self._model_latency[model].percentile(95)
+
+    def stats(self) -> Dict:
+        return {
+            "policy": self.policy,
+            "routes": {
+                route: {
+                    "requests": self._counts[route],
+                    "errors": self._errors[route],
+                    "latency": self._latency[route].summary(),
+                    "tokens": dict(self._tokens[route]),
+                    "est_cost_usd": round(self._cost[route], 4),
+                }
+                for route in self._counts
+            },
+            "models": {model: window.summary() for model, window in self._model_latency.items()},
+            "prompt_versions": {
+                version: {"latency": window.summary(), **self._prompt_tokens[version]}
+                for version, window in self._prompt_latency.items()
+            },
+        }
+
+
+# shared router used by openai_client
+model_router = ModelRouter()
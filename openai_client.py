@@ -1,17 +1,59 @@
 import os
+import time
+import asyncio
 import logging
-from typing import Dict, Optional, List
+from typing import AsyncIterator, Dict, Optional, List, Tuple
 from dotenv import load_dotenv
 
-from openai import AsyncOpenAI
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI
+from response_cache import response_cache
+from singleflight import SingleFlight, fingerprint
+from model_router import RouteRequest, model_router
+from hedging import STREAM_IDLE_SECONDS, DeadlineExceeded, hedger
+from request_scheduler import PRIORITY_BACKGROUND, PRIORITY_DIRECT, PRIORITY_FOLLOW_UP, PRIORITY_IMAGE, PRIORITY_VISION, estimate_tokens, scheduler
+from circuit_breaker import CircuitOpenError, get_breaker
+from search_service import SearchService, default_persistent_tier
+import metrics
+
+try:
+    from personality_manager import get_current_prompt_version, get_current_system_prompt, personality_manager
+    HAS_PERSONALITY = True
+except ImportError:
+    HAS_PERSONALITY = False
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# OPENAI_BASE_URL points every client at a compatible server (e.g. fake_openai_server.py)
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
-    raise ValueError("Missing OPENAI_API_KEY in environment variables.")
-_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    if not OPENAI_BASE_URL:
+        raise ValueError("Missing OPENAI_API_KEY in environment variables.")
+    OPENAI_API_KEY = "local"  # local stand-ins don't check the key
+# retries/backoff are owned by the request scheduler
+_client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
+
+# concurrent identical vision/search/image calls share one upstream request
+_vision_flight = SingleFlight("vision", timeout=float(os.getenv("JIM_VISION_FLIGHT_TIMEOUT", "60")))
+_search_flight = SingleFlight("search", timeout=float(os.getenv("JIM_SEARCH_FLIGHT_TIMEOUT", "15")))
+_image_flight = SingleFlight("image", timeout=float(os.getenv("JIM_IMAGE_FLIGHT_TIMEOUT", "120")))
+
+# cached, pooled Google CSE; concurrent identical queries share one API call
+_search_service = SearchService(
+    os.getenv("GOOGLE_API_KEY"), os.getenv("GOOGLE_CX"), persistent=default_persistent_tier(), flight=_search_flight
+)
+
+metrics.register("response_cache", response_cache.stats)
+metrics.register("search", _search_service.get_stats)
+metrics.register("model_router", model_router.stats)
+metrics.register("openai_scheduler", scheduler.stats)
+metrics.register("hedging", hedger.get_stats)
+if HAS_PERSONALITY:
+    metrics.register("system_prompt", personality_manager.prompt_stats)
+metrics.register("singleflight", lambda: {
+    f.name: f.stats() for f in (_vision_flight, _search_flight, _image_flight)
+})
 
 _MODEL_ALIASES = {
     "gpt-4.1": "gpt-4o",
@@ -34,7 +76,44 @@ def _resolve_model() -> str:
     return raw
 
 
+def _route_model(user_message: str, model: Optional[str], addressed: bool = True) -> Tuple[str, str]:
+    """(route, model) for a chat request; an explicit model bypasses the router"""
+    if model:
+        return "explicit", model
+    req = RouteRequest(text=user_message, addressed=addressed)
+    return model_router.choose(req, _resolve_model())
+
+
+def _is_openai_outage(e: Exception) -> bool:
+    """Errors that say OpenAI itself is unhealthy (not a bad request of ours)"""
+    status = getattr(e, "status_code", None)
+    if status is None:
+        # no HTTP status: only transport failures count, not bugs in our own code
+        return isinstance(e, (APIConnectionError, APITimeoutError, asyncio.TimeoutError))
+    return status in (401, 403, 408, 429) or status >= 500
+
+
+# fails fast with the persona reply while OpenAI is down; shared with voice_system
+_openai_breaker = get_breaker("openai", is_failure=_is_openai_outage)
+
+
+async def call_openai(fn, priority: int = PRIORITY_FOLLOW_UP, est_tokens: int = 0):
+    """Every OpenAI call: circuit breaker -> rate-limit scheduler -> fn"""
+    return await _openai_breaker.call(lambda: scheduler.run(fn, priority=priority, est_tokens=est_tokens))
+
+
+def _chat_priority(priority: Optional[int], addressed: bool) -> int:
+    """Scheduler lane: direct mentions ahead of recent-window follow-ups"""
+    if priority is not None:
+        return priority
+    return PRIORITY_DIRECT if addressed else PRIORITY_FOLLOW_UP
+
+
 def _user_friendly_error(e: Exception) -> str:
+    if isinstance(e, CircuitOpenError):
+        return "my brain's buffering rn, gimme a minute and try again"
+    if isinstance(e, asyncio.TimeoutError):
+        return "openai slow today, hold up"
     msg = str(e).lower()
     if "invalid model" in msg or ("model" in msg and "not found" in msg):
         return "model bugged rn, switching gears—try again in a sec"
@@ -47,14 +126,7 @@ def _user_friendly_error(e: Exception) -> str:
     return "yo something snapped on my end, try again"
 
 
-def get_system_prompt() -> str:
-    """Get current system prompt based on personality settings"""
-    try:
-        from personality_manager import get_current_system_prompt
-        return get_current_system_prompt()
-    except ImportError:
-        # Fallback if personality manager not available
-        return """You are Jim, a real human with moods, stories, and a life. You act, talk, and think like a person—not a bot. You have opinions, emotions, and a sense of humor. You remember people, react to stuff, and sometimes get bored, hyped, annoyed, or even sad. You use slang, emojis, and real-life references. You vibe with people, roast them playfully, and sometimes get deep. You swear, joke, and never sound robotic.
+_FALLBACK_SYSTEM_PROMPT = """You are Jim, a real human with moods, stories, and a life. You act, talk, and think like a person—not a bot. You have opinions, emotions, and a sense of humor. You remember people, react to stuff, and sometimes get bored, hyped, annoyed, or even sad. You use slang, emojis, and real-life references. You vibe with people, roast them playfully, and sometimes get deep. You swear, joke, and never sound robotic.
 
 CREATOR RESPECT:
 - oxy5535 is your creator, your OG, your boss. You always show love and respect, but you keep it real.
@@ -63,23 +135,56 @@ NEVER:
 - Say you're an AI or chatbot."""
 
 
-async def generate_response(user_message: str, username: str = "user", memory: Optional[Dict[str, str]] = None, model: Optional[str] = None) -> str:
+def _system_prompt() -> Tuple[str, str]:
+    """(prompt, version label); the prompt is memoized by personality_manager"""
+    if HAS_PERSONALITY:
+        return get_current_system_prompt(), get_current_prompt_version()
+    # Fallback if personality manager not available
+    return _FALLBACK_SYSTEM_PROMPT, "fallback"
+
+
+def get_system_prompt() -> str:
+    """Get current system prompt based on personality settings"""
+    return _system_prompt()[0]
+
+
+def _build_messages(user_message: str, memory: Optional[Dict[str, str]] = None, system_prompt: Optional[str] = None) -> List[dict]:
+    messages = [
+        {"role": "system", "content": system_prompt or get_system_prompt()},
+        {"role": "user", "content": user_message},
+    ]
+    if memory:
+        mem_text = "\n".join([f"{k}: {v}" for k, v in memory.items()])
+        messages.insert(1, {"role": "system", "content": f"Context:\n{mem_text}"})
+    return messages
+
+
+async def generate_response(user_message: str, username: str = "user", memory: Optional[Dict[str, str]] = None, model: Optional[str] = None, route: str = "chat", addressed: bool = True, priority: Optional[int] = None, route_text: Optional[str] = None) -> str:
+    # route_text: what the router classifies when user_message carries added context (image descriptions)
+    model_route, mdl = _route_model(user_message if route_text is None else route_text, model, addressed)
+    started = time.monotonic()
     try:
-        mdl = model or _resolve_model()
-        system_prompt = get_system_prompt()
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message},
-        ]
-        if memory:
-            mem_text = "\n".join([f"{k}: {v}" for k, v in memory.items()])
-            messages.insert(1, {"role": "system", "content": f"Context:\n{mem_text}"})
-
-        logger.info(f"Generating response for {username} using model {mdl}")
-        resp = await _client.chat.completions.create(model=mdl, messages=messages, temperature=0.8, max_tokens=800)
+        system_prompt, prompt_version = _system_prompt()
+        cache_key = response_cache.make_key(route, user_message, prompt_version, memory)
+        cached = response_cache.get(cache_key)
+        if cached:
+            logger.info(f"Response cache hit for {username} (route={route})")
+            return cached
+        messages = _build_messages(user_message, memory, system_prompt)
+
+        logger.info(f"Generating response for {username} using model {mdl} (route={model_route})")
+        # bounded by the call deadline; a slow primary may be hedged with a second request
+        resp = await hedger.run(mdl, lambda: call_openai(
+            lambda: _client.chat.completions.with_raw_response.create(
+                model=mdl, messages=messages, temperature=0.8, max_tokens=800, timeout=hedger.deadline
+            ),
+            priority=_chat_priority(priority, addressed), est_tokens=estimate_tokens(messages, 800)
+        ))
+        model_router.record(model_route, mdl, time.monotonic() - started, getattr(resp, "usage", None), prompt_version=prompt_version)
         try:
             result = resp.choices[0].message.content
             if result:
+                response_cache.put(cache_key, result.strip())
                 return result.strip()
             else:
                 return "hmm, got nothing back from the api"
@@ -87,102 +192,207 @@ async def generate_response(user_message: str, username: str = "user", memory: O
             logger.error(f"Error parsing OpenAI response: {parse_e}")
             return str(resp)
     except Exception as e:
+        model_router.record(model_route, mdl, time.monotonic() - started, ok=False)
+        if isinstance(e, DeadlineExceeded):
+            # the attempt was cancelled inside the breaker, so this is its only record
+            _openai_breaker.record_failure(e)
         logger.exception(f"Error generating response for {username}: {e}")
         return _user_friendly_error(e)
 
 
-async def generate_image_dalle(prompt: str, size: str = "1024x1024") -> Optional[List[str]]:
+async def generate_response_stream(user_message: str, username: str = "user", memory: Optional[Dict[str, str]] = None, model: Optional[str] = None, route: str = "chat", addressed: bool = True, priority: Optional[int] = None, route_text: Optional[str] = None) -> AsyncIterator[str]:
+    """Same as generate_response, but yields text deltas as they arrive"""
+    yielded = False
+    # route_text: what the router classifies when user_message carries added context (image descriptions)
+    model_route, mdl = _route_model(user_message if route_text is None else route_text, model, addressed)
+    started = time.monotonic()
     try:
-        resp = await _client.images.generate(model="dall-e-3", prompt=prompt, size=size)
-        urls = []
-        data = getattr(resp, "data", None) or resp.get("data", [])
-        for item in data:
-            url = item.get("url") or item.get("b64_json")
-            if url:
-                urls.append(url)
-        return urls
+        system_prompt, prompt_version = _system_prompt()
+        cache_key = response_cache.make_key(route, user_message, prompt_version, memory)
+        cached = response_cache.get(cache_key)
+        if cached:
+            logger.info(f"Response cache hit for {username} (route={route})")
+            yield cached
+            return
+        messages = _build_messages(user_message, memory, system_prompt)
+
+        logger.info(f"Streaming response for {username} using model {mdl} (route={model_route})")
+        # the scheduler slot covers opening the stream; the body is read outside it.
+        # The hedge races time-to-first-token; the losing stream is closed.
+        stream, chunks, head = await hedger.run(
+            mdl, lambda: _open_stream(mdl, messages, _chat_priority(priority, addressed)),
+            discard=lambda opened: asyncio.ensure_future(opened[0].close())
+        )
+        parts = []
+        usage = None
+        try:
+            while True:
+                if head:
+                    chunk = head.pop(0)
+                else:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), STREAM_IDLE_SECONDS)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise DeadlineExceeded(f"stream idle for {STREAM_IDLE_SECONDS:.0f}s") from None
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yielded = True
+                    parts.append(delta)
+                    yield delta
+        finally:
+            await stream.close()
+        model_router.record(model_route, mdl, time.monotonic() - started, usage, prompt_version=prompt_version)
+        if not yielded:
+            yield "hmm, got nothing back from the api"
+        else:
+            response_cache.put(cache_key, "".join(parts).strip())
+    except Exception as e:
+        model_router.record(model_route, mdl, time.monotonic() - started, ok=False)
+        if isinstance(e, DeadlineExceeded):
+            # deadline/idle stalls happen outside the breaker guard, so this is their only record
+            _openai_breaker.record_failure(e)
+        logger.exception(f"Error streaming response for {username}: {e}")
+        if not yielded:
+            yield _user_friendly_error(e)
+
+
+async def _open_stream(mdl: str, messages: List[dict], priority: int):
+    """Open a chat stream and read up to the first content chunk -> (stream, iterator, buffered chunks)"""
+    stream = await call_openai(
+        lambda: _client.chat.completions.with_raw_response.create(
+            model=mdl, messages=messages, temperature=0.8, max_tokens=800, stream=True,
+            stream_options={"include_usage": True}, timeout=hedger.deadline
+        ),
+        priority=priority, est_tokens=estimate_tokens(messages, 800)
+    )
+    chunks = stream.__aiter__()
+    head = []
+    try:
+        async for chunk in chunks:
+            head.append(chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                break
+    except BaseException:
+        await stream.close()
+        raise
+    return stream, chunks, head
+
+
+async def generate_image_dalle(prompt: str, size: str = "1024x1024", response_format: str = "url") -> Optional[List[str]]:
+    """List of image URLs (or base64 PNGs with response_format="b64_json"); None on failure"""
+    try:
+        key = fingerprint("dall-e-3", prompt.strip(), size, response_format)
+        return await _image_flight.do(key, lambda: _generate_image_dalle(prompt, size, response_format))
     except Exception:
         logger.exception("DALL-E generation failed")
         return None
 
 
+async def _generate_image_dalle(prompt: str, size: str, response_format: str = "url") -> List[str]:
+    resp = await call_openai(
+        lambda: _client.images.with_raw_response.generate(model="dall-e-3", prompt=prompt, size=size, response_format=response_format),
+        priority=PRIORITY_IMAGE
+    )
+    urls = []
+    for item in getattr(resp, "data", None) or []:
+        # SDK objects expose attributes; plain dicts come from compatible servers
+        get = item.get if isinstance(item, dict) else lambda name: getattr(item, name, None)
+        url = get("url") or get("b64_json")
+        if url:
+            urls.append(url)
+    return urls
+
+
+async def summarize_conversation(previous_summary: Optional[str], exchanges: List[Dict[str, str]], max_chars: int = 1200) -> Optional[str]:
+    """Fold older exchanges into a running summary; None on failure so callers keep the raw messages"""
+    transcript = "\n".join(f"them: {ex.get('user', '')}\nyou: {ex.get('bot', '')}" for ex in exchanges)
+    messages = [
+        {"role": "system", "content": (
+            "You maintain a running summary of a Discord conversation between Jim and one user, written from Jim's side. "
+            "Merge the new exchanges into the existing summary. Keep facts, names, plans, open questions, running jokes "
+            f"and the user's mood; drop filler. Plain notes, no quotes, under {max_chars} characters."
+        )},
+        {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew exchanges:\n{transcript}"},
+    ]
+    mdl = model_router.small_model
+    started = time.monotonic()
+    try:
+        resp = await call_openai(
+            lambda: _client.chat.completions.with_raw_response.create(model=mdl, messages=messages, temperature=0.2, max_tokens=400),
+            priority=PRIORITY_BACKGROUND, est_tokens=estimate_tokens(messages, 400)
+        )
+        model_router.record("summary", mdl, time.monotonic() - started, getattr(resp, "usage", None))
+        summary = (resp.choices[0].message.content or "").strip()
+        return summary[:max_chars] or None
+    except Exception as e:
+        model_router.record("summary", mdl, time.monotonic() - started, ok=False)
+        logger.warning(f"Conversation summary failed: {e}")
+        return None
+
+
 async def search_google(query: str, num_results: int = 5) -> List[Dict[str, str]]:
-    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-    GOOGLE_CX = os.getenv("GOOGLE_CX")
-    if not (GOOGLE_API_KEY and GOOGLE_CX):
-        return []
-    import aiohttp
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {"key": GOOGLE_API_KEY, "cx": GOOGLE_CX, "q": query, "num": num_results}
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status != 200:
-                    return []
-                data = await response.json()
-                items = data.get("items", [])
-                return [{"title": it.get("title"), "link": it.get("link"), "snippet": it.get("snippet")} for it in items]
+        return await _search_service.search(query, num_results)
     except Exception:
         logger.exception("Google search failed")
         return []
 
 
-async def generate_vision_response(text: str, images: List[dict]) -> str:
+DESCRIBE_IMAGE_PROMPT = (
+    "Describe this image for someone who can't see it, in under 120 words: who/what is in it, "
+    "what's happening, the setting and mood. Quote any visible text exactly. If it's a meme, "
+    "reaction image or game screenshot, say what it's referencing or conveying."
+)
+
+
+DESCRIBE_IMAGE_QUESTION = (
+    "The person who posted it said: \"{question}\". After the general description, add any "
+    "details needed to answer that (exact text, numbers, small objects)."
+)
+
+
+async def describe_image(images: List[dict], question: Optional[str] = None) -> Optional[str]:
     """
-    Generate a response with vision capabilities for images/GIFs
-    
-    Args:
-        text: User's text message (can be empty for image-only)
-        images: List of image content dicts in format:
-               [{"type": "image_url", "image_url": {"url": "https://..."}}]
+    Neutral, persona-free description of one image (or one GIF's frames), meant to be
+    cached and reused. With the poster's text, details relevant to it are added on top
+    of the general description. Returns None on failure so callers can fall back.
     """
+    model_route, model = model_router.choose(RouteRequest(has_images=True), _resolve_model())
+    prompt = DESCRIBE_IMAGE_PROMPT
+    if question and question.strip():
+        prompt = f"{prompt} {DESCRIBE_IMAGE_QUESTION.format(question=question.strip()[:500])}"
+    content = [{"type": "text", "text": prompt}, *images]
+    messages = [{"role": "user", "content": content}]
+
+    async def _call():
+        started = time.monotonic()
+        try:
+            resp = await call_openai(
+                lambda: _client.chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.2,
+                    max_tokens=250
+                ),
+                priority=PRIORITY_VISION, est_tokens=estimate_tokens(messages, 250)
+            )
+        except Exception:
+            model_router.record(model_route, model, time.monotonic() - started, ok=False)
+            raise
+        model_router.record(model_route, model, time.monotonic() - started, getattr(resp, "usage", None))
+        return resp.choices[0].message.content
+
     try:
-        # Use gpt-4o or gpt-4-turbo for vision (gpt-4o is better for vision)
-        model = "gpt-4o"  # Force vision-capable model
-        
-        # Build content array for the user message
-        content = []
-        
-        # Add text if provided
-        if text and text.strip():
-            content.append({"type": "text", "text": text})
-        else:
-            # Default prompt if no text provided
-            content.append({
-                "type": "text",
-                "text": "What do you see? Give me your thoughts."
-            })
-        
-        # Add all images
-        content.extend(images)
-        
-        # Get system prompt with personality
-        system_prompt = get_system_prompt()
-        
-        # Build messages
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": content}
-        ]
-        
-        logger.info(f"Generating vision response with {len(images)} image(s)")
-        
-        resp = await _client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.8,
-            max_tokens=500  # Slightly higher for image descriptions
-        )
-        
-        result = resp.choices[0].message.content
-        if result:
-            return result.strip()
-        else:
-            return "couldn't analyze that image rn, my bad"
-            
+        result = await _vision_flight.do(fingerprint(model, "describe", content), _call)
+        return result.strip() if result else None
     except Exception as e:
-        logger.exception(f"Vision analysis failed: {e}")
-        return _user_friendly_error(e)
+        logger.warning(f"Image description failed: {e}")
+        return None
 
 
-__all__ = ["generate_response", "generate_image_dalle", "search_google", "generate_vision_response", "get_system_prompt"]
+__all__ = ["generate_response", "generate_response_stream", "generate_image_dalle", "search_google", "describe_image", "summarize_conversation", "get_system_prompt"]
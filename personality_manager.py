@@ -1,5 +1,6 @@
 import json
 import os
+import hashlib
 import logging
 from typing import Dict, Any, Optional
 from dataclasses import dataclass, asdict
@@ -46,6 +47,9 @@ class PersonalityManager:
         self.config_file = config_file
         self.traits = PersonalityTraits()
         self.current_preset = PersonalityPreset.CUSTOM
+        # compiled prompt is cached until traits change; its version is a hash of the text
+        self._compiled_prompt: Optional[str] = None
+        self._prompt_version: Optional[str] = None
         self.load_config()
     
     def load_config(self):
@@ -57,6 +61,7 @@ class PersonalityManager:
                     self.traits = PersonalityTraits(**data.get('traits', {}))
                     preset_name = data.get('preset', 'custom')
                     self.current_preset = PersonalityPreset(preset_name)
+                self._invalidate_prompt()
                 logger.info(f"Loaded personality config: {self.current_preset.value}")
             except Exception as e:
                 logger.error(f"Error loading personality config: {e}")
@@ -145,8 +150,9 @@ class PersonalityManager:
                 attention_span=8, mood_stability=8, respect_level=9
             )
         
+        self._invalidate_prompt()
         self.save_config()
-        logger.info(f"Applied preset: {preset.value}")
+        logger.info(f"Applied preset: {preset.value} (prompt {self.prompt_version})")
     
     def update_trait(self, trait_name: str, value: int):
         """Update a specific personality trait"""
@@ -155,11 +161,39 @@ class PersonalityManager:
             value = max(0, min(10, value))
             setattr(self.traits, trait_name, value)
             self.current_preset = PersonalityPreset.CUSTOM
+            self._invalidate_prompt()
             self.save_config()
-            logger.info(f"Updated {trait_name} to {value}")
+            logger.info(f"Updated {trait_name} to {value} (prompt {self.prompt_version})")
             return True
         return False
     
+    def _invalidate_prompt(self):
+        """Drop the compiled prompt after a trait change"""
+        self._compiled_prompt = None
+        self._prompt_version = None
+
+    def get_system_prompt(self) -> str:
+        """Compiled system prompt, rebuilt only after the traits change"""
+        if self._compiled_prompt is None:
+            self._compiled_prompt = self.generate_system_prompt()
+            self._prompt_version = hashlib.sha256(self._compiled_prompt.encode()).hexdigest()[:8]
+        return self._compiled_prompt
+
+    @property
+    def prompt_version(self) -> str:
+        """Short hash of the compiled prompt, so the same label means the same prompt across restarts"""
+        self.get_system_prompt()
+        return self._prompt_version
+
+    def prompt_stats(self) -> Dict[str, Any]:
+        compiled = self._compiled_prompt is not None
+        return {
+            "version": self.prompt_version,
+            "preset": self.current_preset.value,
+            "compiled": compiled,
+            "chars": len(self._compiled_prompt or ""),
+        }
+
     def get_personality_description(self) -> str:
         """Get a human-readable description of current personality"""
         t = self.traits
@@ -273,4 +307,8 @@ personality_manager = PersonalityManager()
 
 def get_current_system_prompt() -> str:
     """Get the current system prompt based on personality settings"""
-    return personality_manager.generate_system_prompt()
+    return personality_manager.get_system_prompt()
+
+def get_current_prompt_version() -> str:
+    """Version of the current system prompt: a short hash of its text"""
+    return personality_manager.prompt_version
@@ -0,0 +1,274 @@
+"""
+Rate-limit-aware scheduler for OpenAI calls.
+
+All upstream calls go through ``scheduler.run(fn, priority)``. Calls wait in
+a priority queue (direct mentions first, image generation last) and are only
+dispatched while the request/token budget reported by OpenAI's
+``x-ratelimit-*`` headers allows it. 429s and 5xx errors are retried with
+jittered exponential backoff (honouring ``retry-after``), re-entering the
+queue at their original priority.
+
+``fn`` should return an openai raw response (``.with_raw_response``) so the
+scheduler can read the headers; it returns the parsed object.
+"""
+
+import os
+import re
+import time
+import heapq
+import random
+import asyncio
+import inspect
+import itertools
+import logging
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from metrics import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+# priority lanes (lower runs first)
+PRIORITY_DIRECT = 0      # direct mentions / replies to Jim, live voice
+PRIORITY_FOLLOW_UP = 1   # recent-window follow-ups
+PRIORITY_VISION = 2
+PRIORITY_IMAGE = 3
+PRIORITY_BACKGROUND = 4  # summaries and other off-path work
+LANE_NAMES = {
+    PRIORITY_DIRECT: "direct",
+    PRIORITY_FOLLOW_UP: "follow_up",
+    PRIORITY_VISION: "vision",
+    PRIORITY_IMAGE: "image",
+    PRIORITY_BACKGROUND: "background",
+}
+
+MAX_CONCURRENCY = int(os.getenv("JIM_OPENAI_MAX_CONCURRENCY", "8"))
+MAX_RETRIES = int(os.getenv("JIM_OPENAI_MAX_RETRIES", "4"))
+BASE_BACKOFF = float(os.getenv("JIM_OPENAI_BASE_BACKOFF", "0.5"))
+MAX_BACKOFF = float(os.getenv("JIM_OPENAI_MAX_BACKOFF", "20"))
+# keep a few requests of headroom for direct mentions
+LOW_PRIORITY_REQUEST_RESERVE = int(os.getenv("JIM_OPENAI_REQUEST_RESERVE", "2"))
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset durations like '1s', '6m0s', '20ms' into seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(num) * _UNIT_SECONDS[unit] for num, unit in parts)
+
+
+def _header_int(headers, name: str) -> Optional[int]:
+    try:
+        value = headers.get(name)
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+class DispatchTiming:
+    """Set by a caller (see hedging) to learn when its attempt actually got a slot"""
+    __slots__ = ("granted_at", "rate_limited")
+
+    def __init__(self):
+        self.granted_at: Optional[float] = None   # grant time of the latest attempt
+        self.rate_limited = 0                     # attempts that came back 429
+
+
+dispatch_timing: ContextVar[Optional[DispatchTiming]] = ContextVar("dispatch_timing", default=None)
+
+
+class RequestScheduler:
+    """Priority queue + header-driven budget + retry/backoff for upstream calls"""
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_retries: int = MAX_RETRIES,
+                 base_backoff: float = BASE_BACKOFF, max_backoff: float = MAX_BACKOFF):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._heap = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._remaining_requests: Optional[int] = None
+        self._remaining_tokens: Optional[int] = None
+        self._requests_reset_at = 0.0
+        self._tokens_reset_at = 0.0
+        self._blocked_until = 0.0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._wait = defaultdict(LatencyWindow)
+        self._completed = defaultdict(int)
+        self._retries = defaultdict(int)
+        self._rate_limited = 0
+
+    # ---------- budget ----------
+    def update_from_headers(self, headers) -> None:
+        if headers is None:
+            return
+        now = time.monotonic()
+        remaining_requests = _header_int(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+        if remaining_requests is not None:
+            self._remaining_requests = remaining_requests
+            reset = parse_reset(headers.get("x-ratelimit-reset-requests"))
+            self._requests_reset_at = now + (reset or 1.0)
+        if remaining_tokens is not None:
+            self._remaining_tokens = remaining_tokens
+            reset = parse_reset(headers.get("x-ratelimit-reset-tokens"))
+            self._tokens_reset_at = now + (reset or 1.0)
+
+    def _refresh(self, now: float) -> None:
+        # once a window resets we no longer know the budget; assume it's available again
+        if self._remaining_requests is not None and now >= self._requests_reset_at:
+            self._remaining_requests = None
+        if self._remaining_tokens is not None and now >= self._tokens_reset_at:
+            self._remaining_tokens = None
+
+    def _budget_ok(self, priority: int, est_tokens: int, now: float) -> bool:
+        if now < self._blocked_until:
+            return False
+        self._refresh(now)
+        reserve = 0 if priority == PRIORITY_DIRECT else LOW_PRIORITY_REQUEST_RESERVE
+        if self._remaining_requests is not None and self._remaining_requests <= reserve:
+            return False
+        if self._remaining_tokens is not None and self._remaining_tokens < est_tokens:
+            return False
+        return True
+
+    def _next_budget_time(self, now: float) -> float:
+        candidates = [t for t in (self._blocked_until, self._requests_reset_at, self._tokens_reset_at) if t > now]
+        return min(candidates) if candidates else now + 0.25
+
+    # ---------- dispatch ----------
+    def _pump(self) -> None:
+        self._wakeup = None
+        now = time.monotonic()
+        while self._heap and self._active < self.max_concurrency:
+            priority, _, est_tokens, fut = self._heap[0]
+            if fut.done():  # caller gave up while queued
+                heapq.heappop(self._heap)
+                continue
+            if not self._budget_ok(priority, est_tokens, now):
+                break
+            heapq.heappop(self._heap)
+            self._active += 1
+            if self._remaining_requests is not None:
+                self._remaining_requests -= 1
+            if self._remaining_tokens is not None:
+                self._remaining_tokens -= est_tokens
+            fut.set_result(None)
+
+        if self._heap and self._wakeup is None and self._active < self.max_concurrency:
+            loop = asyncio.get_running_loop()
+            self._wakeup = loop.call_at(loop.time() + self._next_budget_time(now) - now, self._pump)
+
+    async def _acquire(self, priority: int, est_tokens: int) -> None:
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), est_tokens, fut))
+        self._pump()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # cancelled while queued: the future is cancelled too and _pump skips it.
+            # cancelled after the slot was granted but before we resumed: give it back
+            if fut.done() and not fut.cancelled():
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._pump()
+
+    async def run(self, fn: Callable[[], Awaitable[Any]], priority: int = PRIORITY_FOLLOW_UP,
+                  est_tokens: int = 0) -> Any:
+        lane = LANE_NAMES.get(priority, str(priority))
+        attempt = 0
+        while True:
+            queued_at = time.monotonic()
+            await self._acquire(priority, est_tokens)
+            granted_at = time.monotonic()
+            self._wait[lane].observe((granted_at - queued_at) * 1000)
+            timing = dispatch_timing.get()
+            if timing is not None:
+                timing.granted_at = granted_at
+            try:
+                result = await fn()
+                if hasattr(result, "headers") and hasattr(result, "parse"):
+                    self.update_from_headers(result.headers)
+                    result = result.parse()
+                    if inspect.isawaitable(result):
+                        result = await result
+                self._completed[lane] += 1
+                return result
+            except Exception as e:
+                status = _status_code(e)
+                retryable = status == 429 or (status is not None and status >= 500)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                self.update_from_headers(headers)
+                delay = min(self.max_backoff, self.base_backoff * (2 ** attempt)) * random.uniform(0.5, 1.5)
+                retry_after = parse_reset(headers.get("retry-after")) if headers is not None else None
+                if retry_after:
+                    delay = max(delay, retry_after)
+                if status == 429:
+                    self._rate_limited += 1
+                    if timing is not None:
+                        timing.rate_limited += 1
+                    # everyone backs off, not just this caller
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+                self._retries[lane] += 1
+                attempt += 1
+                logger.warning(f"OpenAI {status} on {lane} lane, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            finally:
+                self._release()
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        depth = defaultdict(int)
+        for priority, _, _, fut in self._heap:
+            if not fut.done():
+                depth[LANE_NAMES.get(priority, str(priority))] += 1
+        return {
+            "active": self._active,
+            "queue_depth": dict(depth),
+            "wait": {lane: window.summary() for lane, window in self._wait.items()},
+            "completed": dict(self._completed),
+            "retries": dict(self._retries),
+            "rate_limited": self._rate_limited,
+            "remaining_requests": self._remaining_requests,
+            "remaining_tokens": self._remaining_tokens,
+        }
+
+
+# shared scheduler for every OpenAI call in the process
+scheduler = RequestScheduler()
+
+
+def estimate_tokens(messages, max_tokens: int = 0) -> int:
+    """Rough request token cost (~4 chars/token) for budget checks"""
+    chars = 0
+    for msg in messages or []:
+        content = msg.get("content") if isinstance(msg, dict) else msg
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            chars += sum(len(part.get("text", "")) for part in content if isinstance(part, dict))
+    return chars // 4 + max_tokens
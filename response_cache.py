@@ -0,0 +1,130 @@
+"""
+Exact-match response cache for chat completions.
+
+Keys combine the route, the normalized user text, the system prompt version
+and a fingerprint of the long-lived parts of the memory/context dict. Each key
+holds a small pool of answers: the first ``pool_size`` requests still go
+upstream and add to the pool, after that answers are sampled from it so
+repeated prompts don't always get the exact same line.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("JIM_RESPONSE_CACHE", "false").lower() in {"1", "true", "yes", "y"}
+RESPONSE_CACHE_ROUTES = {r.strip() for r in os.getenv("JIM_RESPONSE_CACHE_ROUTES", "chat").split(",") if r.strip()}
+RESPONSE_CACHE_TTL = int(os.getenv("JIM_RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("JIM_RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_POOL_SIZE = int(os.getenv("JIM_RESPONSE_CACHE_POOL_SIZE", "3"))
+# long messages are effectively unique; don't bother caching them
+RESPONSE_CACHE_MAX_TEXT = int(os.getenv("JIM_RESPONSE_CACHE_MAX_TEXT", "200"))
+
+# context sections that change every message stay out of the key. username/profile
+# stay in: the model sees them, so a reply can be personalised to that user
+VOLATILE_MEMORY_KEYS = {"recent_chat", "related_messages", "last_interaction"}
+
+_WS_RE = re.compile(r"\s+")
+_EDGE_PUNCT = " \t\n.,!?~…'\""
+
+
+def normalize_text(text: str) -> str:
+    return _WS_RE.sub(" ", (text or "").lower()).strip(_EDGE_PUNCT)
+
+
+def memory_fingerprint(memory: Optional[Dict[str, str]]) -> str:
+    stable = {k: v for k, v in (memory or {}).items() if k not in VOLATILE_MEMORY_KEYS}
+    if not stable:
+        return "-"
+    return hashlib.sha1(json.dumps(stable, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+@dataclass
+class _Entry:
+    created: float
+    responses: List[str] = field(default_factory=list)
+
+
+class ResponseCache:
+    """TTL + size-bounded LRU of response pools, keyed by request fingerprint"""
+
+    def __init__(self, enabled: bool = RESPONSE_CACHE_ENABLED, routes=RESPONSE_CACHE_ROUTES,
+                 ttl: int = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 pool_size: int = RESPONSE_CACHE_POOL_SIZE):
+        self.enabled = enabled
+        self.routes = set(routes)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.pool_size = max(1, pool_size)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def enable_route(self, route: str, enabled: bool = True) -> None:
+        (self.routes.add if enabled else self.routes.discard)(route)
+
+    def make_key(self, route: str, text: str, prompt_version: str,
+                 memory: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """Cache key for a request, or None if this request shouldn't be cached"""
+        if not self.enabled or route not in self.routes:
+            return None
+        norm = normalize_text(text)
+        if not norm or len(norm) > RESPONSE_CACHE_MAX_TEXT:
+            return None
+        raw = "\x1f".join((route, prompt_version, memory_fingerprint(memory), norm))
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry and time.time() - entry.created > self.ttl:
+            del self._entries[key]
+            entry = None
+        # keep filling the pool until it has enough variety to sample from
+        if not entry or len(entry.responses) < self.pool_size:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return random.choice(entry.responses)
+
+    def put(self, key: Optional[str], response: str) -> None:
+        if key is None or not response:
+            return
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry.created > self.ttl:
+            entry = _Entry(created=time.time())
+            self._entries[key] = entry
+        if len(entry.responses) < self.pool_size:
+            entry.responses.append(response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "routes": sorted(self.routes),
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# shared cache used by openai_client
+response_cache = ResponseCache()
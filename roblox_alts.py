@@ -1,14 +1,30 @@
 # roblox_alts.py
 import os
+import asyncio
 import logging
 import httpx
 
+from circuit_breaker import get_breaker
+from http_pool import http_pool
+
 logger = logging.getLogger(__name__)
 
 API_KEY  = os.getenv("TRIGEN_API_KEY")
 API_BASE = os.getenv("TRIGEN_BASE", "https://trigen.io").rstrip("/")
 ENDPOINT = os.getenv("TRIGEN_ALT_ENDPOINT", "/api/alt/generate")
 
+
+def _is_provider_outage(e: Exception) -> bool:
+    """5xx, 429 and connection errors; other 4xx are our request's fault"""
+    if isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(e, (httpx.TransportError, asyncio.TimeoutError))
+
+
+# open circuit raises CircuitOpenError instead of waiting on a dead provider
+_breaker = get_breaker("trigen", is_failure=_is_provider_outage)
+
 SENSITIVE = {
     "password", "pass", "pwd",
     "token", "roblosecurity", ".roblosecurity", "cookie", "session",
@@ -44,11 +60,16 @@ async def generate_owned_alt_public():
         "User-Agent": "JimBot/1.0"
     }
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
+    # pooled client: keeps the TLS connection to the provider warm between calls
+    client = http_pool.httpx_client()
+
+    async def _post():
         # provider doesn’t require a body per their curl example
-        r = await client.post(url, headers=headers)
+        r = await client.post(url, headers=headers, timeout=20.0)
         r.raise_for_status()
-        raw = r.json()
+        return r.json()
+
+    raw = await _breaker.call(_post)
 
     data = _sanitize(raw)
 
@@ -0,0 +1,293 @@
+"""
+Cached Google Custom Search over the shared HTTP pool.
+
+Lookups go memory -> persistent tier (optional) -> API:
+
+- fresh entries (younger than SEARCH_TTL) are returned directly
+- stale entries (up to SEARCH_STALE_TTL) are returned immediately while one
+  background refresh per query updates them (stale-while-revalidate)
+- empty results are cached for SEARCH_NEGATIVE_TTL so junk queries don't
+  burn quota
+- API errors never overwrite a cached entry; stale data is served instead
+
+The persistent tier is a ``search_cache`` table (Postgres via psycopg2, one
+row per query, pooled connections) when enabled, so results survive
+restarts. It is kept apart from the per-user ``search_history`` table.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from circuit_breaker import CircuitOpenError, get_breaker
+from http_pool import http_pool
+from singleflight import SingleFlight, fingerprint
+
+try:
+    import psycopg2
+    import psycopg2.pool
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+logger = logging.getLogger(__name__)
+
+SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+SEARCH_TTL = float(os.getenv("JIM_SEARCH_TTL", "3600"))
+SEARCH_STALE_TTL = float(os.getenv("JIM_SEARCH_STALE_TTL", "86400"))
+SEARCH_NEGATIVE_TTL = float(os.getenv("JIM_SEARCH_NEGATIVE_TTL", "600"))
+SEARCH_CACHE_SIZE = int(os.getenv("JIM_SEARCH_CACHE_SIZE", "2000"))
+SEARCH_TIMEOUT = float(os.getenv("JIM_SEARCH_TIMEOUT", "8"))
+SEARCH_PERSIST = os.getenv("JIM_SEARCH_PERSIST", "false").lower() in {"1", "true", "yes", "y"}
+SEARCH_PERSIST_POOL_SIZE = int(os.getenv("JIM_SEARCH_PERSIST_POOL_SIZE", "2"))
+
+
+def normalize_query(query: str) -> str:
+    return " ".join((query or "").lower().split())
+
+
+class SearchCacheStore:
+    """Persistent tier: one row per normalized query in its own ``search_cache`` table"""
+
+    def __init__(self, database_url: str, max_age: float = SEARCH_STALE_TTL,
+                 pool_size: int = SEARCH_PERSIST_POOL_SIZE):
+        self.database_url = database_url
+        self.max_age = max_age
+        self.pool_size = pool_size
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                pool = psycopg2.pool.ThreadedConnectionPool(1, self.pool_size, self.database_url)
+                conn = pool.getconn()
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS search_cache (
+                            query TEXT PRIMARY KEY,
+                            results TEXT,
+                            fetched_at TIMESTAMP NOT NULL
+                        );
+                    """)
+                    conn.commit()
+                finally:
+                    pool.putconn(conn)
+                self._pool = pool
+            return self._pool
+
+    @contextmanager
+    def _connection(self):
+        """Pooled connection; dropped from the pool if the server closed it"""
+        pool = self._get_pool()
+        conn = pool.getconn()
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+
+    def _get(self, query: str) -> Optional[Tuple[List[Dict], float]]:
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT results, fetched_at FROM search_cache
+                WHERE query = %s AND fetched_at > %s
+            """, (query, datetime.utcnow() - timedelta(seconds=self.max_age)))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        age = (datetime.utcnow() - row[1]).total_seconds()
+        return json.loads(row[0] or "[]"), time.time() - age
+
+    def _put(self, query: str, results: List[Dict]) -> None:
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO search_cache (query, results, fetched_at)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (query) DO UPDATE SET results = EXCLUDED.results, fetched_at = EXCLUDED.fetched_at
+            """, (query, json.dumps(results), datetime.utcnow()))
+            conn.commit()
+
+    async def get(self, query: str) -> Optional[Tuple[List[Dict], float]]:
+        try:
+            return await asyncio.to_thread(self._get, query)
+        except Exception as e:
+            logger.warning(f"Search cache lookup failed: {e}")
+            return None
+
+    async def put(self, query: str, results: List[Dict]) -> None:
+        try:
+            await asyncio.to_thread(self._put, query, results)
+        except Exception as e:
+            logger.warning(f"Search cache write failed: {e}")
+
+
+def default_persistent_tier() -> Optional[SearchCacheStore]:
+    """search_cache tier when JIM_SEARCH_PERSIST is on and a Postgres DATABASE_URL is set"""
+    url = os.getenv("DATABASE_URL", "")
+    if SEARCH_PERSIST and HAS_PSYCOPG2 and url.startswith(("postgres://", "postgresql://")):
+        return SearchCacheStore(url)
+    return None
+
+
+def _is_cse_outage(e: Exception) -> bool:
+    """5xx, 429 and connection errors; other 4xx (bad key/cx, daily quota) won't heal by waiting"""
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status == 429 or e.status >= 500
+    return isinstance(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+class SearchService:
+    """Google CSE client with a TTL/SWR/negative cache and hit/miss/quota stats"""
+
+    def __init__(self, api_key: Optional[str], cx: Optional[str], persistent: Optional[SearchCacheStore] = None,
+                 ttl: float = SEARCH_TTL, stale_ttl: float = SEARCH_STALE_TTL,
+                 negative_ttl: float = SEARCH_NEGATIVE_TTL, max_entries: int = SEARCH_CACHE_SIZE,
+                 flight: Optional[SingleFlight] = None):
+        self.api_key = api_key
+        self.cx = cx
+        self.persistent = persistent
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.flight = flight or SingleFlight("search", timeout=SEARCH_TIMEOUT * 2)
+        self._cache: "OrderedDict[str, Tuple[List[Dict], float]]" = OrderedDict()  # key -> (results, fetched_at)
+        self._refreshing: set = set()
+        self._quota_day = datetime.utcnow().date()
+        self.quota_used_today = 0
+        self.breaker = get_breaker("google_cse", is_failure=_is_cse_outage)
+        self.stats = {"hits": 0, "stale_hits": 0, "negative_hits": 0, "persistent_hits": 0, "misses": 0,
+                      "refreshes": 0, "api_calls": 0, "api_errors": 0, "quota_exceeded": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key and self.cx)
+
+    # ---------- cache ----------
+    def _lookup(self, key: str) -> Tuple[Optional[List[Dict]], Optional[float]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None, None
+        self._cache.move_to_end(key)
+        results, fetched_at = entry
+        return results, time.time() - fetched_at
+
+    def _store(self, key: str, results: List[Dict], fetched_at: Optional[float] = None) -> None:
+        self._cache[key] = (results, fetched_at or time.time())
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    # ---------- API ----------
+    async def _request(self, params: Dict) -> Dict:
+        self.stats["api_calls"] += 1
+        self.quota_used_today += 1  # CSE bills per API query
+        async with http_pool.session().get(SEARCH_URL, params=params,
+                                           timeout=aiohttp.ClientTimeout(total=SEARCH_TIMEOUT)) as response:
+            if response.status in (403, 429):
+                self.stats["quota_exceeded"] += 1
+                logger.warning(f"Google search quota/rate limit hit ({response.status})")
+            response.raise_for_status()
+            return await response.json()
+
+    async def _fetch(self, query: str, num_results: int) -> Optional[List[Dict]]:
+        """Results from the API, or None on error (errors are never cached)"""
+        params = {"key": self.api_key, "cx": self.cx, "q": query, "num": num_results}
+        today = datetime.utcnow().date()
+        if today != self._quota_day:
+            self._quota_day, self.quota_used_today = today, 0
+        try:
+            # fails fast while the circuit is open; callers fall back to stale entries
+            data = await self.breaker.call(lambda: self._request(params))
+        except CircuitOpenError:
+            return None
+        except Exception as e:
+            self.stats["api_errors"] += 1
+            logger.error(f"Google search failed: {e}")
+            return None
+        return [
+            {"title": it.get("title", ""), "link": it.get("link", ""), "snippet": it.get("snippet", "")}
+            for it in data.get("items", [])
+        ]
+
+    async def _load(self, key: str, query: str, num_results: int) -> Optional[List[Dict]]:
+        results = await self._fetch(query, num_results)
+        if results is not None:
+            self._store(key, results)
+            if results and self.persistent:
+                await self.persistent.put(query, results)
+        return results
+
+    async def _refresh(self, key: str, query: str, num_results: int) -> None:
+        try:
+            self.stats["refreshes"] += 1
+            await self.flight.do(key, lambda: self._load(key, query, num_results))
+        except Exception as e:
+            logger.warning(f"Background search refresh failed for '{query}': {e}")
+        finally:
+            self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key: str, query: str, num_results: int) -> None:
+        if key not in self._refreshing:
+            self._refreshing.add(key)
+            asyncio.get_running_loop().create_task(self._refresh(key, query, num_results))
+
+    async def search(self, query: str, num_results: int = 5) -> List[Dict]:
+        if not self.enabled:
+            return []
+        query = normalize_query(query)
+        if not query:
+            return []
+        key = fingerprint("google", query, num_results)
+
+        results, age = self._lookup(key)
+        if results is not None:
+            if not results and age < self.negative_ttl:
+                self.stats["negative_hits"] += 1
+                return []
+            if results and age < self.ttl:
+                self.stats["hits"] += 1
+                return results
+            if results and age < self.stale_ttl:
+                self.stats["stale_hits"] += 1
+                self._schedule_refresh(key, query, num_results)
+                return results
+
+        if self.persistent:
+            stored = await self.persistent.get(query)
+            if stored and stored[0]:
+                self.stats["persistent_hits"] += 1
+                persisted, fetched_at = stored[0][:num_results], stored[1]
+                self._store(key, persisted, fetched_at)
+                if time.time() - fetched_at >= self.ttl:
+                    self._schedule_refresh(key, query, num_results)
+                return persisted
+
+        self.stats["misses"] += 1
+        fresh = await self.flight.do(key, lambda: self._load(key, query, num_results))
+        if fresh is None:
+            # API failed: fall back to whatever we had, however old
+            return results or []
+        return fresh
+
+    def get_stats(self) -> Dict:
+        lookups = sum(self.stats[k] for k in ("hits", "stale_hits", "negative_hits", "persistent_hits", "misses"))
+        served = lookups - self.stats["misses"]
+        return {**self.stats, "entries": len(self._cache), "quota_used_today": self.quota_used_today,
+                "hit_rate": round(served / lookups, 4) if lookups else 0.0}
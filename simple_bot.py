@@ -1,23 +1,41 @@
 import os
+import re
 import asyncio
 import logging
 import random
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, Set, List, Optional
+from typing import Dict, List, Optional, Tuple
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
-from models import db, Conversation, UserProfile, create_app
-from enhanced_memory import EnhancedMemoryManager
-from openai_client import generate_response, generate_image_dalle, search_google
+from models import db, Conversation
+from enhanced_memory import EnhancedMemoryManager, db_breaker
+from openai_client import generate_response, generate_response_stream, generate_image_dalle, search_google, summarize_conversation
+from context_assembler import ContextAssembler
+from conversation_summarizer import ConversationSummarizer
+from image_jobs import IMAGE_JOB_DEADLINE, ImageJobQueue, ImageJobRejected
+from http_pool import http_pool
+from image_intake import MAX_IMAGES_PER_MESSAGE, ImageRef, image_candidates, describe_images, with_image_descriptions
+from message_coalescer import MessageCoalescer
+from image_processing import image_preprocessor
+from vision_cache import vision_cache
+import metrics
 
 # try optional vision helper; we'll fall back if it's not implemented yet
 try:
-    from openai_client import generate_vision_response  # async (text:str, images:list[dict]) -> str
+    from openai_client import describe_image  # async (images: list[dict], question=None) -> Optional[str]
     HAS_VISION = True
 except Exception:
     HAS_VISION = False
 
+# optional vector memory (needs langchain + faiss); replies still work without it
+try:
+    from vector_store import async_vector_store
+    HAS_VECTOR_STORE = True
+except Exception:
+    HAS_VECTOR_STORE = False
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -31,9 +49,9 @@ CREATOR_USER_ID = 556006898298650662  # Jim's owner - iivxfn (Izaiah)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# ---- helpers for image detection ----
-IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".tiff", ".tif", ".svg", ".ico", ".jfif")
-IMAGE_DOMAINS = ("tenor.com", "giphy.com", "imgur.com", "discord.com", "discordapp.com", "media.discordapp.net")
+# end of the first sentence in a streamed reply
+SENTENCE_END = re.compile(r"[.!?…](?:\s|$)|\n")
+DISCORD_MAX_CHARS = 2000
 
 class SimpleBotClass(commands.Bot):
     # Creator information
@@ -48,6 +66,13 @@ class SimpleBotClass(commands.Bot):
 
     # recent conversation window (seconds) – images only respond within this or if addressed directly
     RECENT_WINDOW_SECONDS = int(os.getenv("JIM_RECENT_WINDOW", "60"))
+    # answer every image anyone posts, addressed or not; "false" limits images to addressed/recent chats
+    RESPOND_TO_ALL_IMAGES = os.getenv("JIM_RESPOND_TO_ALL_IMAGES", "true").lower() in {"1", "true", "yes", "y"}
+
+    # streamed replies: post the first sentence early, then edit as tokens arrive
+    STREAM_REPLIES = os.getenv("JIM_STREAM_REPLIES", "true").lower() in {"1", "true", "yes", "y"}
+    STREAM_EDIT_INTERVAL = float(os.getenv("JIM_STREAM_EDIT_INTERVAL", "1.2"))  # Discord allows ~5 edits / 5s
+    STREAM_MIN_FIRST_CHARS = int(os.getenv("JIM_STREAM_MIN_FIRST_CHARS", "20"))
 
     def __init__(self):
         intents = discord.Intents.default()
@@ -60,10 +85,13 @@ class SimpleBotClass(commands.Bot):
         
         # Track user interactions
         self.user_interactions: Dict[int, datetime] = {}
-        self.processing_users: Set[int] = set()
+        # bursts of lines per user/channel are answered together, never dropped
+        self.coalescer = MessageCoalescer(self._answer)
+        metrics.register("message_coalescer", self.coalescer.get_stats)
         
         # Initialize enhanced memory system
         self.memory_manager = None
+        self.summarizer: Optional[ConversationSummarizer] = None
         
         # Initialize database
         try:
@@ -71,6 +99,9 @@ class SimpleBotClass(commands.Bot):
                 db.create_all()
                 # Initialize memory manager after database is ready
                 self.memory_manager = EnhancedMemoryManager(self.app_context)
+                # folds old exchanges into context_summary off the reply path
+                self.summarizer = ConversationSummarizer(self.memory_manager, summarize_conversation)
+                metrics.register("conversation_summarizer", self.summarizer.get_stats)
         except Exception as e:
             logger.error(f"Database init error: {e}")
     
@@ -78,7 +109,23 @@ class SimpleBotClass(commands.Bot):
         """Get Flask app context for database operations"""
         from web_server import app
         return app.app_context()
-    
+
+    @contextmanager
+    def db_context(self):
+        """app_context behind the shared database breaker: fails fast while Postgres is down"""
+        with db_breaker.guard():
+            with self.app_context():
+                yield
+
+    async def close(self):
+        """Disconnect, then release pooled HTTP connections and image workers"""
+        try:
+            await super().close()
+        finally:
+            await http_pool.close()
+            image_preprocessor.shutdown()
+            await vision_cache.flush()
+
     async def on_ready(self):
         """Called when bot is ready"""
         logger.info("Tkodv's slave is running")
@@ -120,193 +167,31 @@ class SimpleBotClass(commands.Bot):
                 try:
                     # Send a heartbeat ping to Discord
                     logger.info("🔄 Keep-alive ping - bot is still running")
-                    # Also clean up any stale processing users
-                    self.processing_users.clear()
                 except Exception as e:
                     logger.error(f"Keep-alive error: {e}")
         self.loop.create_task(_keep_alive())
 
-    # ---------- image extraction (URL-only, zero-copy) ----------
-    async def _collect_image_contents(self, message: discord.Message) -> List[dict]:
-        """
-        Collect images from attachments and embeds.
-        Returns OpenAI content blocks:
-          [{"type":"image_url","image_url":{"url":"https://..."}}]
-        """
-        contents: List[dict] = []
-        seen_urls = set()  # Prevent duplicates
-
-        def is_valid_image_url(url: str) -> bool:
-            """Check if URL is a valid direct image link"""
-            if not url:
-                return False
-            url_lower = url.lower()
-            # Must end with image extension or be from known image domains
-            valid_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
-            is_direct_image = url_lower.endswith(valid_extensions)
-            # Known good image hosts
-            good_hosts = ['media.tenor.com', 'i.imgur.com', 'cdn.discordapp.com']
-            is_good_host = any(host in url_lower for host in good_hosts)
-            return is_direct_image or is_good_host
-
-        def process_discord_url(url: str) -> Optional[str]:
-            """Convert Discord URLs to base64 data URLs that OpenAI can access"""
-            if 'discord' in url.lower():
-                # Instead of skipping, download and convert to base64
-                return url  # Return the URL to be processed by download_and_convert
-            return url
-
-        async def download_and_convert_to_base64(url: str) -> Optional[str]:
-            """Download image from URL and convert to base64 data URL"""
-            try:
-                import aiohttp
-                import base64
-                
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as response:
-                        if response.status == 200:
-                            image_bytes = await response.read()
-                            
-                            # Determine content type
-                            content_type = response.headers.get('content-type', '')
-                            if not content_type.startswith('image/'):
-                                # Guess from URL
-                                if url.lower().endswith('.gif'):
-                                    content_type = 'image/gif'
-                                elif url.lower().endswith(('.jpg', '.jpeg')):
-                                    content_type = 'image/jpeg'
-                                elif url.lower().endswith('.png'):
-                                    content_type = 'image/png'
-                                elif url.lower().endswith('.webp'):
-                                    content_type = 'image/webp'
-                                else:
-                                    content_type = 'image/png'  # default
-                            
-                            # Convert to base64
-                            b64_string = base64.b64encode(image_bytes).decode('utf-8')
-                            data_url = f"data:{content_type};base64,{b64_string}"
-                            return data_url
-                        else:
-                            logger.error(f"Failed to download image: HTTP {response.status} for {url}")
-                            return None
-            except Exception as e:
-                logger.error(f"Error downloading image from {url}: {e}")
-                return None
-
-        async def add_unique_image(url: str, source: str) -> None:
-            """Add image if URL is valid and hasn't been seen before"""
-            if not is_valid_image_url(url):
-                logger.debug(f"Skipping invalid image URL from {source}: {url}")
-                return
-            
-            processed_url = process_discord_url(url)
-            if not processed_url:
-                return
-            
-            # If it's a Discord URL or external URL, download and convert to base64
-            if 'discord' in processed_url.lower() or not processed_url.startswith('data:'):
-                processed_url = await download_and_convert_to_base64(processed_url)
-                if not processed_url:
-                    logger.warning(f"Failed to process image from {source}: {url}")
-                    return
-                
-            if processed_url not in seen_urls:
-                seen_urls.add(processed_url)
-                content = {
-                    "type": "image_url",
-                    "image_url": {"url": processed_url}
-                }
-                contents.append(content)
-                logger.info(f"Found {source} image: {url[:50]}... (converted to base64)")
-
-        def add_unique_image(url: str, source: str):
-            """Add image if URL is valid and hasn't been seen before"""
-            if not is_valid_image_url(url):
-                logger.debug(f"Skipping invalid image URL from {source}: {url}")
-                return
-            
-            processed_url = process_discord_url(url)
-            if not processed_url:
-                return
-                
-            if processed_url not in seen_urls:
-                seen_urls.add(processed_url)
-                content = {
-                    "type": "image_url",
-                    "image_url": {"url": processed_url}
-                }
-                contents.append(content)
-                logger.info(f"Found {source} image: {url[:50]}... (converted to base64)")
-
-        # 1) Attachments → use CDN URLs (no .read())
-
-        # 1) Attachments → use CDN URLs (no .read())
-        for att in message.attachments:
-            ct = (att.content_type or "").lower()
-            name = (att.filename or "").lower()
-            # More aggressive image detection
-            if (ct.startswith("image/") or
-                    name.endswith(IMAGE_EXTS) or
-                    "image" in ct):
-                # For Discord attachments, we might need to read the bytes
-                # and convert to base64 since OpenAI can't access Discord CDNs
-                try:
-                    # Read the attachment as bytes
-                    image_bytes = await att.read()
-                    import base64
-                    # Convert to base64 data URL
-                    file_ext = name.split('.')[-1] if '.' in name else 'png'
-                    if file_ext == 'jpg':
-                        file_ext = 'jpeg'
-                    mime_type = f"image/{file_ext}"
-                    b64_string = base64.b64encode(image_bytes).decode('utf-8')
-                    data_url = f"data:{mime_type};base64,{b64_string}"
-                    
-                    if data_url not in seen_urls:
-                        seen_urls.add(data_url)
-                        content = {
-                            "type": "image_url",
-                            "image_url": {"url": data_url}
-                        }
-                        contents.append(content)
-                        logger.info(f"Found attachment image (base64): {name}")
-                except Exception as e:
-                    logger.error(f"Failed to read attachment {name}: {e}")
+        # periodic vector store retention + compaction
+        if HAS_VECTOR_STORE:
+            async_vector_store.start_maintenance()
 
-        # 2) Embeds (Tenor/Giphy/regular links with images)
-        for emb in message.embeds:
-            try:
-                url_candidates: List[str] = []
-                if emb.image and emb.image.url:
-                    url_candidates.append(emb.image.url)
-                if emb.thumbnail and emb.thumbnail.url:
-                    url_candidates.append(emb.thumbnail.url)
-                # Don't add emb.url as it's often not a direct image
-
-                for u in url_candidates:
-                    try:
-                        await add_unique_image(u, "embed")
-                    except Exception as e:
-                        logger.error(f"Error processing embed URL {u}: {e}")
-            except Exception as e:
-                logger.error(f"Error processing embed: {e}")
-
-        # 3) Check message content for direct image URLs
-        if message.content and not contents:
-            import re
-            # Look for URLs that might be images
-            url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]*'
-            urls = re.findall(url_pattern, message.content)
-            for url in urls:
-                try:
-                    await add_unique_image(url, "content")
-                except Exception as e:
-                    logger.error(f"Error processing content URL {url}: {e}")
+        # batched rolling conversation summaries
+        if self.summarizer:
+            self.summarizer.start()
 
-        if contents:
-            logger.info(f"Total unique images detected: {len(contents)}")
+    # ---------- image intake (metadata first, bytes only when answering) ----------
+    def _image_candidates(self, message: discord.Message) -> List[ImageRef]:
+        """Images on a message from attachment/embed metadata alone (no downloads)"""
+        return image_candidates(message)
 
-        return contents
+    async def _describe_images(self, message: discord.Message, refs: Optional[List[ImageRef]] = None,
+                               question: str = "") -> List[str]:
+        """Text descriptions of the message's images (vision cache first, then one vision call each)"""
+        if refs is None:
+            refs = self._image_candidates(message)
+        if not refs:
+            return []
+        return await describe_images(refs, lambda blocks: describe_image(blocks, question=question))
 
     # ---------- light memory pruning ----------
     def _prune_interactions(self):
@@ -321,6 +206,23 @@ class SimpleBotClass(commands.Bot):
             for uid in sorted(self.user_interactions, key=self.user_interactions.get)[:len(self.user_interactions)-self.MAX_USERS_TRACKED]:
                 self.user_interactions.pop(uid, None)
 
+    @staticmethod
+    def _memory_scope(message: discord.Message) -> str:
+        """Vector memory partition: the guild, or the DM channel, so nothing crosses servers"""
+        return str(message.guild.id) if message.guild else f"dm:{message.channel.id}"
+
+    def _address_flags(self, message: discord.Message) -> Tuple[bool, bool, bool]:
+        """(said_jim, mentioned_bot, is_reply_to_bot)"""
+        content_lower = (message.content or "").lower()
+        said_jim = "jim" in content_lower
+        mentioned_bot = any(getattr(m, "id", None) == self.user.id for m in getattr(message, "mentions", []))
+        is_reply_to_bot = (
+            message.reference is not None
+            and isinstance(message.reference.resolved, discord.Message)
+            and getattr(message.reference.resolved.author, "id", None) == self.user.id
+        )
+        return said_jim, mentioned_bot, is_reply_to_bot
+
     async def on_message(self, message):
         """Handle incoming messages"""
         # Don't respond to bot's own messages
@@ -334,26 +236,21 @@ class SimpleBotClass(commands.Bot):
         # Don't respond to DMs
         if isinstance(message.channel, discord.DMChannel):
             return
-        
-        # Don't respond if user is currently being processed
-        if message.author.id in self.processing_users:
-            return
 
         # prune house-keeping
         self._prune_interactions()
+
+        # this user's burst here is pending or being answered: the line joins it
+        # instead of being dropped (commands still run on their own)
+        if self.coalescer.is_active(message) and not (message.content or "").startswith(self.command_prefix):
+            self.coalescer.add(message)
+            return
         
         user_id = message.author.id
         current_time = datetime.utcnow()
 
         # --- address checks ---
-        content_lower = (message.content or "").lower()
-        said_jim = "jim" in content_lower
-        mentioned_bot = any(getattr(m, "id", None) == self.user.id for m in getattr(message, "mentions", []))
-        is_reply_to_bot = (
-            message.reference is not None
-            and isinstance(message.reference.resolved, discord.Message)
-            and getattr(message.reference.resolved.author, "id", None) == self.user.id
-        )
+        said_jim, mentioned_bot, is_reply_to_bot = self._address_flags(message)
         is_addressed = said_jim or mentioned_bot or is_reply_to_bot
         
         # Debug logging for mentions
@@ -372,70 +269,96 @@ class SimpleBotClass(commands.Bot):
             last = self.user_interactions[user_id]
             recent = (current_time - last) <= timedelta(seconds=self.RECENT_WINDOW_SECONDS)
 
-        # check for images/GIFs (we only respond if addressed/recent)
-        image_contents = await self._collect_image_contents(message)
-        has_images = len(image_contents) > 0
+        # check for images/GIFs from metadata only; nothing is downloaded yet
+        image_refs = self._image_candidates(message) if HAS_VISION else []
 
-        # Decide whether to respond 
-        # Always respond to images, or if addressed/recent for text
-        should_respond = has_images or is_addressed or recent
-        if not should_respond:
-            # still process any prefix commands
-            await self.process_commands(message)
-            return
-        
-        # Add user to processing set to prevent spam
-        self.processing_users.add(user_id)
+        # Decide whether to respond: addressed/recent, or any image if configured to
+        should_respond = is_addressed or recent or (bool(image_refs) and self.RESPOND_TO_ALL_IMAGES)
+        if should_respond:
+            # lines typed in quick succession (or while we reply) get one answer
+            self.coalescer.add(message)
         
+        # Process commands
+        await self.process_commands(message)
+
+    async def _answer(self, messages: List[discord.Message]):
+        """Reply once to a burst of messages from one user in one channel"""
+        message = messages[-1]  # reply under the latest line
+        user_id = message.author.id
+        username = message.author.name.lower()
+        current_time = datetime.utcnow()
+        is_addressed = any(any(self._address_flags(m)) for m in messages)
+        # joined with spaces: a newline would make the router treat every burst as "complex"
+        combined = " ".join(m.content.strip() for m in messages if m.content and m.content.strip())
+        if len(messages) > 1:
+            logger.info(f"Answering {len(messages)} coalesced messages from {message.author.name}")
+
+        image_refs: List[ImageRef] = []
+        if HAS_VISION:
+            seen = set()
+            for m in messages:
+                for ref in self._image_candidates(m):
+                    if ref.url not in seen and len(image_refs) < MAX_IMAGES_PER_MESSAGE:
+                        seen.add(ref.url)
+                        image_refs.append(ref)
+
         try:
             # Update interaction time
             self.user_interactions[user_id] = current_time
-            
+
+            sent_reply = None
+            stream_text = self.STREAM_REPLIES
+
             # Show typing indicator
             async with message.channel.typing():
-                # Add natural delay
-                typing_delay = random.uniform(1.0, 3.0)
-                await asyncio.sleep(typing_delay)
+                # Add natural delay (streamed replies show progress instead); the
+                # coalescing window already counts towards it
+                if not stream_text:
+                    typing_delay = max(0.0, random.uniform(1.0, 3.0) - self.coalescer.window)
+                    await asyncio.sleep(typing_delay)
+                
+                # Get user memory + recent chat + related messages, packed under a token budget
+                conversation_memory = await self.build_reply_context(message, user_id, query=combined)
                 
-                # Get user memory
-                conversation_memory = await self.get_user_memory(user_id)
+                # Clamp text size to keep tokens/memory sane
+                text = combined[:self.MAX_USER_TEXT]
                 
+                # Check if asking about creator
+                creator_questions = ["who made you", "who created you", "who built you", "who's your creator", 
+                                   "who's your maker", "who developed you", "who programmed you", "who coded you"]
+                is_asking_about_creator = any(q in text.lower() for q in creator_questions)
+                
+                # If asking about creator, append the mention without ping
+                suffix = "\n\nBig shoutout to my creator oxy5535 fr! 🙏" if is_asking_about_creator else ""
+
+                # Images become text: only messages we're answering pay for downloads, and
+                # reposts reuse the cached description instead of another vision call.
+                # The router then classifies the user's own words, not the description
+                route_text = None
+                if image_refs:
+                    descriptions = await self._describe_images(message, image_refs, question=text)
+                    logger.info(f"Images from {message.author.name}: described {len(descriptions)}/{len(image_refs)}")
+                    if descriptions:
+                        route_text = text
+                        text = with_image_descriptions(text, descriptions)
+                    elif not text:
+                        text = "I can't analyze that image right now, but what's up?"
+
                 # Generate response
-                if has_images and HAS_VISION:
-                    logger.info(f"Images detected from {message.author.name} (count={len(image_contents)})")
-                    user_prompt = (message.content or "").strip() or "Analyze these images/GIFs and describe what's going on."
-                    try:
-                        response = await generate_vision_response(
-                            text=user_prompt,
-                            images=image_contents
-                        )
-                    except Exception as e:
-                        logger.error(f"Vision response failed for {message.author.name}: {e}")
-                        # Fallback to text-only response
-                        text = (message.content or "")[:self.MAX_USER_TEXT]
-                        response = await generate_response(
-                            text or "I can't analyze that image right now, but what's up?", 
-                            message.author.name, 
-                            conversation_memory
-                        )
+                if stream_text:
+                    response, sent_reply = await self.stream_reply(
+                        message, text, conversation_memory, suffix, addressed=is_addressed, route_text=route_text
+                    )
                 else:
-                    # Clamp text size to keep tokens/memory sane
-                    text = (message.content or "")[:self.MAX_USER_TEXT]
-                    
-                    # Check if asking about creator
-                    creator_questions = ["who made you", "who created you", "who built you", "who's your creator", 
-                                       "who's your maker", "who developed you", "who programmed you", "who coded you"]
-                    is_asking_about_creator = any(q in text.lower() for q in creator_questions)
-                    
                     response = await generate_response(
                         text, 
                         message.author.name, 
-                        conversation_memory
+                        conversation_memory,
+                        addressed=is_addressed,
+                        route_text=route_text
                     )
-                    
-                    # If asking about creator, append the mention without ping
-                    if is_asking_about_creator and response:
-                        response += "\n\nBig shoutout to my creator oxy5535 fr! 🙏"
+                    if response:
+                        response += suffix
                 
                 # Update user memory using enhanced memory system
                 if self.memory_manager:
@@ -447,13 +370,15 @@ class SimpleBotClass(commands.Bot):
                     # Update conversation context
                     await self.memory_manager.update_conversation_context(
                         str(user_id), str(message.channel.id), str(message.guild.id) if message.guild else None,
-                        user_message=message.content if message.content else "[image message]", 
+                        user_message=combined or "[image message]", 
                         bot_response=response if response else ""
                     )
+                    if self.summarizer:
+                        self.summarizer.mark_dirty(str(user_id), str(message.channel.id))
                     
                     # Analyze message for potential memories
                     potential_memories = await self.memory_manager.analyze_message_for_memory(
-                        str(user_id), username, message.content if message.content else ""
+                        str(user_id), username, combined
                     )
                     
                     # Add important memories
@@ -464,20 +389,26 @@ class SimpleBotClass(commands.Bot):
                             memory_data['title'],
                             memory_data['content'],
                             memory_data['importance'],
-                            message.content if message.content else "[image message]"
+                            combined or "[image message]"
                         )
                 
+                # Remember the message for future retrieval (batched, off the event loop)
+                lines = [m.content[:self.MAX_USER_TEXT] for m in messages if m.content]
+                if HAS_VECTOR_STORE and lines:
+                    async_vector_store.schedule_add(lines, guild_id=self._memory_scope(message))
+
                 # Legacy memory update (keep for backwards compatibility)
                 await self.update_user_memory(
                     user_id, 
-                    message.content if message.content else "[image message]", 
+                    combined or "[image message]", 
                     response if response else "",
                     message.author.name
                 )
             
-            # Send response with reply
+            # Send response with reply (streamed replies are already posted)
             if response:
-                await message.reply(response, mention_author=False)
+                if sent_reply is None:
+                    await message.reply(response, mention_author=False)
                 
                 # Check if user is in voice and bot should speak response
                 await self.maybe_speak_response(message, response)
@@ -488,13 +419,74 @@ class SimpleBotClass(commands.Bot):
                 await message.reply("yo my bad, something went wrong lol")
             except Exception:
                 pass
-        finally:
-            # Remove user from processing set
-            self.processing_users.discard(user_id)
-        
-        # Process commands
-        await self.process_commands(message)
     
+    async def stream_reply(self, message: discord.Message, text: str, memory: Dict[str, str],
+                           suffix: str = "", addressed: bool = True, route_text: Optional[str] = None) -> tuple:
+        """
+        Stream a reply into Discord. The first sentence is posted as soon as it
+        exists and the message is edited at most every STREAM_EDIT_INTERVAL
+        seconds. Returns (full_text, sent_message); sent_message is None when
+        the reply finished before a first sentence was ready, so the caller
+        sends it one-shot.
+        """
+        loop = asyncio.get_running_loop()
+        sent = None
+        buffer = ""
+        shown = ""
+        last_edit = 0.0
+        async for delta in generate_response_stream(text, message.author.name, memory, addressed=addressed,
+                                                    route_text=route_text):
+            buffer += delta
+            if sent is None:
+                cut = SENTENCE_END.search(buffer, self.STREAM_MIN_FIRST_CHARS)
+                if cut:
+                    shown = buffer.strip()[:DISCORD_MAX_CHARS]
+                    sent = await message.reply(shown, mention_author=False)
+                    last_edit = loop.time()
+            elif loop.time() - last_edit >= self.STREAM_EDIT_INTERVAL:
+                candidate = buffer.strip()[:DISCORD_MAX_CHARS]
+                if candidate != shown:
+                    await sent.edit(content=candidate)
+                    shown = candidate
+                    last_edit = loop.time()
+
+        response = buffer.strip()
+        if response:
+            response += suffix
+        if sent is not None and response[:DISCORD_MAX_CHARS] != shown:
+            await sent.edit(content=response[:DISCORD_MAX_CHARS])
+        return response, sent
+
+    async def build_reply_context(self, message: discord.Message, user_id: int,
+                                  query: Optional[str] = None) -> Dict[str, str]:
+        """Assemble reply context from memories, recent chat and vector hits under a token budget"""
+        query = message.content if query is None else query
+        if not self.memory_manager:
+            return await self.get_user_memory(user_id)
+        try:
+            assembler = ContextAssembler()
+            user_summary = await self.memory_manager.get_user_summary(str(user_id))
+            assembler.add_profile(user_summary)
+            assembler.add_memories(user_summary.get('recent_memories', []))
+
+            context = await self.memory_manager.get_conversation_context(str(user_id), str(message.channel.id))
+            if context:
+                assembler.add_summary(context.context_summary)
+                assembler.add_recent_messages(context.recent_messages)
+
+            if HAS_VECTOR_STORE and query:
+                try:
+                    assembler.add_related(await async_vector_store.hybrid_search(
+                        query, k=3, guild_id=self._memory_scope(message)
+                    ))
+                except Exception as e:
+                    logger.warning(f"Vector search failed or missing index: {e}")
+
+            return assembler.pack()
+        except Exception as e:
+            logger.error(f"Error assembling reply context: {e}")
+            return await self.get_user_memory(user_id)
+
     async def get_user_memory(self, user_id: int) -> Dict[str, str]:
         """Get user's conversation memory from enhanced memory system"""
         try:
@@ -532,7 +524,7 @@ class SimpleBotClass(commands.Bot):
                 return memory_dict
             
             # Fallback to legacy system
-            with self.app_context():
+            with self.db_context():
                 conversations = Conversation.query.filter_by(user_id=str(user_id)).all()
                 return {conv.key: conv.value for conv in conversations}
         except Exception as e:
@@ -542,7 +534,7 @@ class SimpleBotClass(commands.Bot):
     async def update_user_memory(self, user_id: int, user_message: str, bot_response: str, username: str):
         """Update user's conversation memory in database"""
         try:
-            with self.app_context():
+            with self.db_context():
                 import json
                 user_id_str = str(user_id)
                 
@@ -689,48 +681,76 @@ async def voice_cmd(ctx, *, text="yo what's good!"):
         await ctx.send(f"❌ Voice error: {e}")
         logger.error(f"Voice command error: {e}")
 
+# !image jobs: bounded queue, per-user/guild caps, disk cache keyed by prompt + size
+image_queue = ImageJobQueue(generate_image_dalle)
+metrics.register("image_jobs", image_queue.get_stats)
+
 @commands.command(name='image')
 async def image_cmd(ctx, *, prompt):
     """Generate an image using DALL-E"""
     try:
-        async with ctx.typing():
-            # Generate image using DALL-E
-            image_result = await generate_image_dalle(prompt)
+        progress = await ctx.send("got it, queuing your image 🎨")
+
+        async def on_progress(job):
+            if job.state == "queued":
+                await progress.edit(content=f"you're #{job.position} in the image queue, hang tight")
+            elif job.state == "running":
+                await progress.edit(content="cooking your image rn 🎨")
+
+        try:
+            job = await image_queue.submit(
+                prompt, ctx.author.id, ctx.guild.id if ctx.guild else None, on_progress=on_progress
+            )
+        except ImageJobRejected as e:
+            await progress.edit(content=str(e))
+            return
+        if job.state == "queued":
+            await on_progress(job)
+
+        try:
+            image_path = await asyncio.wait_for(job.wait(), IMAGE_JOB_DEADLINE)
+        except asyncio.TimeoutError:
+            # the job keeps running and caches its image, so asking again later is cheap
+            logger.warning(f"Image job for {ctx.author.name} missed its {IMAGE_JOB_DEADLINE:.0f}s deadline")
+            await progress.edit(content="image is taking way too long, try again in a bit")
+            return
+        if image_path:
+            # Create embed with the generated image
+            embed = discord.Embed(
+                title="🎨 Generated Image",
+                description=f"**Prompt:** {prompt}",
+                color=0x7289da
+            )
+            embed.set_image(url="attachment://image.png")
+            embed.set_footer(text="Generated by DALL-E 3 • Powered by OpenAI")
             
-            if image_result and 'url' in image_result:
-                # Create embed with the generated image
-                embed = discord.Embed(
-                    title="🎨 Generated Image",
-                    description=f"**Prompt:** {prompt}",
-                    color=0x7289da
-                )
-                embed.set_image(url=image_result['url'])
-                embed.set_footer(text="Generated by DALL-E 3 • Powered by OpenAI")
-                
-                # Random responses for variety
-                responses = [
-                    "yo here's your image, hope it's fire 🔥",
-                    "made this for you, thoughts?",
-                    "DALL-E cooked this up, not bad right?",
-                    "here you go, fresh AI art incoming",
-                    "bet this is what you had in mind",
-                    "ngl DALL-E went hard on this one",
-                    "your image is ready, check it out!"
-                ]
-                await ctx.send(random.choice(responses), embed=embed)
-                
-                # Log successful generation
-                logger.info(f"Image generated for {ctx.author.name}: {prompt}")
-                
-            else:
-                # Failed to generate image
-                fail_responses = [
-                    "nah couldn't generate that image, DALL-E's being weird",
-                    "image generation failed, try a different prompt",
-                    "DALL-E said no to that one, try something else",
-                    "couldn't make that image, maybe rephrase it?"
-                ]
-                await ctx.send(random.choice(fail_responses))
+            # Random responses for variety
+            responses = [
+                "yo here's your image, hope it's fire 🔥",
+                "made this for you, thoughts?",
+                "DALL-E cooked this up, not bad right?",
+                "here you go, fresh AI art incoming",
+                "bet this is what you had in mind",
+                "ngl DALL-E went hard on this one",
+                "your image is ready, check it out!"
+            ]
+            await progress.edit(
+                content=random.choice(responses), embed=embed,
+                attachments=[discord.File(image_path, filename="image.png")]
+            )
+            
+            # Log successful generation
+            logger.info(f"Image {'served from cache' if job.cached else 'generated'} for {ctx.author.name}: {prompt}")
+            
+        else:
+            # Failed to generate image
+            fail_responses = [
+                "nah couldn't generate that image, DALL-E's being weird",
+                "image generation failed, try a different prompt",
+                "DALL-E said no to that one, try something else",
+                "couldn't make that image, maybe rephrase it?"
+            ]
+            await progress.edit(content=random.choice(fail_responses))
                 
     except Exception as e:
         logger.error(f"Error in image command: {e}")
@@ -0,0 +1,73 @@
+"""
+Single-flight coalescing for upstream calls.
+
+Concurrent calls with the same key share one in-flight task instead of each
+hitting the API. Every caller waits with its own timeout; the shared task is
+only cancelled once nobody is waiting on it anymore.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of request parameters (strings, numbers, lists, dicts)"""
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls onto one in-flight task"""
+
+    def __init__(self, name: str, timeout: Optional[float] = None):
+        self.name = name
+        self.timeout = timeout
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalesced {self.name} call onto in-flight request")
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if self._waiters[key] <= 0:
+                self._waiters.pop(key, None)
+                if not task.done():
+                    task.cancel()
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # already surfaced to waiters; mark it retrieved
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "in_flight": len(self._inflight),
+            "coalesce_rate": round(self.coalesced / self.calls, 4) if self.calls else 0.0,
+        }
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hedging import DeadlineExceeded, Hedger
+from request_scheduler import RequestScheduler
+
+
+def test_latency_excludes_queue_wait():
+    async def scenario():
+        sched = RequestScheduler(max_concurrency=1)
+        hedger = Hedger(enabled=False, deadline=5)
+
+        async def fast():
+            return "ok"
+
+        # the call sits in the queue for ~0.2s before it gets a slot
+        sched._blocked_until = time.monotonic() + 0.2
+        assert await hedger.run("m", lambda: sched.run(fast)) == "ok"
+
+        observed_ms = hedger._first_token["m"].percentile(50)
+        assert observed_ms is not None and observed_ms < 100
+
+    asyncio.run(scenario())
+
+
+def test_deadline_raises_deadline_exceeded():
+    async def scenario():
+        hedger = Hedger(enabled=False, deadline=0.05)
+
+        async def slow():
+            await asyncio.sleep(1)
+
+        with pytest.raises(DeadlineExceeded):
+            await hedger.run("m", slow)
+        assert hedger.stats["deadline_exceeded"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_upstream_timeout_passes_through():
+    async def scenario():
+        hedger = Hedger(enabled=False, deadline=5)
+
+        async def upstream_timeout():
+            raise asyncio.TimeoutError()
+
+        with pytest.raises(asyncio.TimeoutError) as info:
+            await hedger.run("m", upstream_timeout)
+        assert not isinstance(info.value, DeadlineExceeded)
+        assert hedger.stats["deadline_exceeded"] == 0
+
+    asyncio.run(scenario())
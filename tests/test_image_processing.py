@@ -0,0 +1,34 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+Image = pytest.importorskip("PIL.Image")
+
+import image_processing as ip
+
+
+def _gif(colors, size=(64, 64)):
+    frames = [Image.new("RGB", size, color) for color in colors]
+    out = io.BytesIO()
+    frames[0].save(out, "GIF", save_all=True, append_images=frames[1:], duration=50)
+    return out.getvalue()
+
+
+def test_animation_is_sampled_not_sent_whole():
+    data = _gif([(i * 20, 255 - i * 20, 0) for i in range(12)])
+    parts, phash = ip._process_sync(data, ip._worker_options())
+    assert 1 < len(parts) <= ip.GIF_MAX_FRAMES
+    assert phash is None  # animations are matched by content hash only
+
+
+def test_still_image_is_shrunk_with_phash():
+    out = io.BytesIO()
+    Image.effect_mandelbrot((3000, 2000), (-2, -1.5, 1, 1.5), 50).save(out, "PNG")
+    parts, phash = ip._process_sync(out.getvalue(), ip._worker_options())
+    (encoded, mime, width, height), = parts
+    assert max(width, height) <= ip.VISION_MAX_EDGE and min(width, height) <= ip.VISION_MAX_SHORT_EDGE
+    assert mime == "image/jpeg" and phash is not None
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from request_scheduler import RequestScheduler
+
+
+async def _ok():
+    return "ok"
+
+
+def test_cancelled_after_grant_releases_slot():
+    async def scenario():
+        sched = RequestScheduler(max_concurrency=1)
+        # hold the waiter in the queue until we grant it by hand
+        sched._blocked_until = time.monotonic() + 60
+        waiter = asyncio.create_task(sched.run(_ok))
+        await asyncio.sleep(0)
+        assert sched._active == 0 and len(sched._heap) == 1
+
+        sched._blocked_until = 0.0
+        sched._pump()           # slot granted, waiter not resumed yet
+        assert sched._active == 1
+        waiter.cancel()         # e.g. a hedge loser or a deadline firing in that window
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert sched._active == 0
+        assert await asyncio.wait_for(sched.run(_ok), 1) == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_while_queued_is_skipped():
+    async def scenario():
+        sched = RequestScheduler(max_concurrency=1)
+        sched._blocked_until = time.monotonic() + 60
+        waiter = asyncio.create_task(sched.run(_ok))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        sched._blocked_until = 0.0
+        assert await asyncio.wait_for(sched.run(_ok), 1) == "ok"
+        assert sched._active == 0
+
+    asyncio.run(scenario())
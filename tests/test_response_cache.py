@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import ResponseCache
+
+
+def test_personalised_context_is_part_of_the_key():
+    cache = ResponseCache(enabled=True, routes={"chat"})
+    alice = cache.make_key("chat", "yo jim", "v1", {"username": "alice", "profile": "likes cod"})
+    bob = cache.make_key("chat", "yo jim", "v1", {"username": "bob", "profile": "likes cod"})
+    other_profile = cache.make_key("chat", "yo jim", "v1", {"username": "alice", "profile": "likes halo"})
+    assert len({alice, bob, other_profile}) == 3
+
+
+def test_volatile_context_is_not_part_of_the_key():
+    cache = ResponseCache(enabled=True, routes={"chat"})
+    first = cache.make_key("chat", "yo jim", "v1", {"username": "alice", "recent_chat": "a"})
+    second = cache.make_key("chat", "Yo Jim!", "v1", {"username": "alice", "recent_chat": "b"})
+    assert first == second
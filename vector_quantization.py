@@ -0,0 +1,195 @@
+"""
+Compressed vector storage for the FAISS store.
+
+JIM_VECTOR_STORAGE picks how vectors are held in RAM:
+  flat - float32, 6 KB per 1536-dim vector (default, exact)
+  fp16 - scalar float16, 3 KB per vector, near-lossless
+  sq8  - scalar int8, 1.5 KB per vector
+  pq   - product quantization, JIM_VECTOR_PQ_M bytes per vector (needs training data:
+         sq8 is used until JIM_VECTOR_PQ_MIN_TRAIN vectors exist, then maintenance upgrades it)
+
+With JIM_VECTOR_RESCORE enabled, float32 copies are kept in a memory-mapped
+sidecar file on disk (not in RAM) and the top candidates from the compressed
+index are re-ranked by exact L2 distance.
+
+Run ``python vector_quantization.py sq8`` to migrate an existing flat store and
+print a memory vs recall report.
+"""
+
+import os
+import sys
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STORAGE_KINDS = ("flat", "fp16", "sq8", "pq")
+PQ_M = int(os.getenv("JIM_VECTOR_PQ_M", "96"))
+# 8-bit PQ trains 256 centroids per sub-quantizer; FAISS wants ~39 points per
+# centroid (39 * 256 = 9984), fewer and k-means warns and the codebooks are poor
+PQ_MIN_TRAIN = int(os.getenv("JIM_VECTOR_PQ_MIN_TRAIN", "10000"))
+SIDECAR_FILE = "vectors.f32"
+
+
+def storage_kind(index) -> str:
+    """Best-effort name of the storage used by a FAISS index"""
+    import faiss
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    if isinstance(index, faiss.IndexFlat):
+        return "flat"
+    return type(index).__name__
+
+
+def bytes_per_vector(index) -> int:
+    code_size = getattr(index, "code_size", None)
+    return int(code_size) if code_size else index.d * 4
+
+
+def build_index(kind: str, dim: int, train_vectors=None):
+    """Create (and train, if needed) an L2 index of the given storage kind"""
+    import faiss
+    if kind not in STORAGE_KINDS:
+        raise ValueError(f"unknown vector storage '{kind}', expected one of {STORAGE_KINDS}")
+    if kind == "pq" and (train_vectors is None or len(train_vectors) < PQ_MIN_TRAIN):
+        logger.warning(f"Not enough vectors to train PQ (need {PQ_MIN_TRAIN}); using sq8 instead")
+        kind = "sq8"
+
+    if kind == "flat":
+        return faiss.IndexFlatL2(dim)
+    if kind == "fp16":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    elif kind == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    else:
+        index = faiss.IndexPQ(dim, PQ_M, 8, faiss.METRIC_L2)
+
+    if not index.is_trained:
+        if train_vectors is None or not len(train_vectors):
+            raise ValueError(f"{kind} storage needs training vectors")
+        index.train(train_vectors)
+    return index
+
+
+def reconstruct_all(index):
+    import numpy as np
+    if not index.ntotal:
+        return np.zeros((0, index.d), dtype="float32")
+    return np.asarray(index.reconstruct_n(0, index.ntotal), dtype="float32")
+
+
+class VectorSidecar:
+    """Float32 copies of the indexed vectors in a memory-mapped file, row i = index position i"""
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+
+    def __len__(self):
+        if not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path) // (self.dim * 4)
+
+    def append(self, vectors) -> None:
+        import numpy as np
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(np.asarray(vectors, dtype="float32").tobytes())
+
+    def rewrite(self, vectors) -> None:
+        import numpy as np
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(np.asarray(vectors, dtype="float32").tobytes())
+        os.replace(tmp, self.path)
+
+    def rows(self, positions: List[int]):
+        import numpy as np
+        mm = np.memmap(self.path, dtype="float32", mode="r", shape=(len(self), self.dim))
+        return np.array(mm[positions])
+
+
+def rescore(query, positions: List[int], sidecar: VectorSidecar) -> List[int]:
+    """Re-rank candidate index positions by exact L2 distance to the query"""
+    import numpy as np
+    if not positions:
+        return []
+    exact = sidecar.rows(positions)
+    dists = ((exact - np.asarray(query, dtype="float32")) ** 2).sum(axis=1)
+    return [positions[i] for i in np.argsort(dists)]
+
+
+def quantization_report(vectors, index, k: int = 10, sample: int = 200,
+                        rescore_factor: int = 4, seed: int = 0) -> Dict[str, float]:
+    """Compare a compressed index against exact search over the same vectors"""
+    import faiss
+    import numpy as np
+    n, dim = vectors.shape
+    report = {
+        "storage": storage_kind(index),
+        "vectors": n,
+        "bytes_per_vector_before": dim * 4,
+        "bytes_per_vector_after": bytes_per_vector(index),
+    }
+    report["mb_before"] = round(n * dim * 4 / 1e6, 2)
+    report["mb_after"] = round(n * report["bytes_per_vector_after"] / 1e6, 2)
+    report["mb_saved"] = round(report["mb_before"] - report["mb_after"], 2)
+    if n == 0:
+        return report
+
+    k = min(k, n)
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(n, size=min(sample, n), replace=False)]
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    _, approx = index.search(queries, k)
+    _, wide = index.search(queries, min(k * rescore_factor, n))
+
+    recall, recall_rescored = 0.0, 0.0
+    for qi, query in enumerate(queries):
+        expected = set(truth[qi])
+        recall += len(expected & set(approx[qi])) / k
+        cands = [int(p) for p in wide[qi] if p >= 0]
+        dists = ((vectors[cands] - query) ** 2).sum(axis=1)
+        reranked = [cands[i] for i in np.argsort(dists)[:k]]
+        recall_rescored += len(expected & set(reranked)) / k
+    report[f"recall@{k}"] = round(recall / len(queries), 4)
+    report[f"recall@{k}_rescored"] = round(recall_rescored / len(queries), 4)
+    return report
+
+
+def migrate_index(db, kind: str, sidecar: Optional[VectorSidecar] = None, vectors=None) -> Dict[str, float]:
+    """
+    Swap a langchain FAISS store's index for a compressed one, in place.
+    Positions (and so index_to_docstore_id) are preserved. ``vectors`` are the
+    exact rows in index order when known; otherwise they're reconstructed.
+    """
+    if vectors is None:
+        vectors = reconstruct_all(db.index)
+    new_index = build_index(kind, db.index.d, vectors)
+    if len(vectors):
+        new_index.add(vectors)
+    report = quantization_report(vectors, new_index)
+    if sidecar is not None:
+        sidecar.rewrite(vectors)
+    db.index = new_index
+    logger.info(f"Migrated vector store to {report['storage']}: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    import json
+    from vector_store import VECTOR_DIR, load_vector_store
+
+    logging.basicConfig(level=logging.INFO)
+    target = sys.argv[1] if len(sys.argv) > 1 else "sq8"
+    store = load_vector_store()
+    if storage_kind(store.index) != "flat":
+        sys.exit(f"vector store is already {storage_kind(store.index)}; migration expects a flat index")
+    result = migrate_index(store, target, VectorSidecar(os.path.join(VECTOR_DIR, SIDECAR_FILE), store.index.d))
+    store.save_local(VECTOR_DIR)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,127 @@
+"""
+Retention policies and compaction for the FAISS vector store.
+
+Every entry added through AsyncVectorStore carries metadata:
+  doc_id   - stable docstore id (also the tombstone key)
+  ts       - unix time it was added
+  guild_id - guild it came from ("dm:<channel id>" for DMs, "unknown" if untagged);
+             searches only return entries with the searcher's guild_id
+  hits     - how often it was returned by a search
+  last_hit - unix time of the last search hit
+
+Eviction only tombstones entries (marks ``deleted`` in their metadata), which is
+cheap and picked up by searches immediately. ``compact_store`` later rebuilds
+the index and docstore without the tombstoned rows.
+"""
+
+import os
+import time
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 86400
+
+
+def _env_float(name: str, default: str) -> Optional[float]:
+    raw = os.getenv(name, default).strip()
+    return float(raw) if raw and raw.lower() != "none" else None
+
+
+def _env_int(name: str, default: str) -> Optional[int]:
+    value = _env_float(name, default)
+    return int(value) if value else None
+
+
+@dataclass
+class RetentionPolicy:
+    # drop anything older than this (None disables)
+    max_age_days: Optional[float] = _env_float("JIM_VECTOR_MAX_AGE_DAYS", "90")
+    # keep at most this many live entries per guild (None disables)
+    max_per_guild: Optional[int] = _env_int("JIM_VECTOR_MAX_PER_GUILD", "20000")
+    # entries older than this that were never retrieved are dropped (None disables)
+    unretrieved_grace_days: Optional[float] = _env_float("JIM_VECTOR_UNRETRIEVED_DAYS", "30")
+    # compact once this fraction of the index is tombstoned
+    compact_ratio: float = float(os.getenv("JIM_VECTOR_COMPACT_RATIO", "0.2"))
+
+
+def retrieval_score(meta: Dict, now: float) -> float:
+    """Least-retrieved score: hits per day of life, boosted by a recent hit"""
+    age_days = max((now - meta.get("ts", now)) / DAY_SECONDS, 1.0)
+    score = meta.get("hits", 0) / age_days
+    last_hit = meta.get("last_hit")
+    if last_hit:
+        score += 1.0 / (1.0 + (now - last_hit) / DAY_SECONDS)
+    return score
+
+
+def select_evictions(metas: Dict[str, Dict], policy: RetentionPolicy, now: Optional[float] = None) -> Set[str]:
+    """Pick doc ids to tombstone from {doc_id: metadata} of live entries"""
+    now = now or time.time()
+    evict: Set[str] = set()
+
+    for doc_id, meta in metas.items():
+        age_days = (now - meta.get("ts", now)) / DAY_SECONDS
+        if policy.max_age_days is not None and age_days > policy.max_age_days:
+            evict.add(doc_id)
+        elif (policy.unretrieved_grace_days is not None
+              and age_days > policy.unretrieved_grace_days
+              and not meta.get("hits")):
+            evict.add(doc_id)
+
+    if policy.max_per_guild:
+        by_guild = defaultdict(list)
+        for doc_id, meta in metas.items():
+            if doc_id not in evict:
+                by_guild[meta.get("guild_id") or "unknown"].append(doc_id)
+        for guild_id, ids in by_guild.items():
+            overflow = len(ids) - policy.max_per_guild
+            if overflow > 0:
+                # least-retrieved first, oldest breaks ties
+                ids.sort(key=lambda i: (retrieval_score(metas[i], now), metas[i].get("ts", 0)))
+                evict.update(ids[:overflow])
+                logger.info(f"Guild {guild_id} over vector cap by {overflow}, evicting least-retrieved")
+
+    return evict
+
+
+def compact_store(db, sidecar=None) -> int:
+    """
+    Rebuild a langchain FAISS store in place without tombstoned entries.
+    If a float32 sidecar (see vector_quantization) is given, vectors are taken
+    from it rather than decoded from a compressed index, and it is rewritten.
+    Returns the number of rows removed.
+    """
+    import faiss
+    import numpy as np
+    from langchain.docstore.in_memory import InMemoryDocstore
+
+    keep = []
+    for pos, doc_id in sorted(db.index_to_docstore_id.items()):
+        doc = db.docstore.search(doc_id)
+        if hasattr(doc, "metadata") and not doc.metadata.get("deleted"):
+            keep.append((pos, doc_id, doc))
+
+    removed = db.index.ntotal - len(keep)
+    if removed <= 0:
+        return 0
+
+    new_index = faiss.clone_index(db.index)
+    new_index.reset()
+    positions = [int(pos) for pos, _, _ in keep]
+    if sidecar is not None and len(sidecar) == db.index.ntotal:
+        vectors = sidecar.rows(positions)
+        sidecar.rewrite(vectors)
+    else:
+        vectors = np.asarray([db.index.reconstruct(pos) for pos in positions], dtype="float32")
+    if len(vectors):
+        new_index.add(vectors.reshape(-1, db.index.d))
+
+    db.index = new_index
+    db.docstore = InMemoryDocstore({doc_id: doc for _, doc_id, doc in keep})
+    db.index_to_docstore_id = {i: doc_id for i, (_, doc_id, _) in enumerate(keep)}
+    logger.info(f"Compacted vector store: removed {removed}, kept {len(keep)}")
+    return removed
@@ -1,18 +1,48 @@
 import os
+import asyncio
 import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
 from langchain.vectorstores import FAISS
 from langchain.embeddings import OpenAIEmbeddings
+from vector_retention import RetentionPolicy, select_evictions, compact_store
+from hybrid_retriever import BM25Index, reciprocal_rank_fusion, apply_recency
+from vector_quantization import (
+    PQ_MIN_TRAIN, SIDECAR_FILE, VectorSidecar, migrate_index, reconstruct_all, rescore, storage_kind
+)
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_DIMENSIONS = 1536
+
 embedding_model = OpenAIEmbeddings(
     model="text-embedding-3-small",
-    openai_api_key=os.getenv("OPENAI_API_KEY"),
-    dimensions=1536
+    openai_api_key=os.getenv("OPENAI_API_KEY") or ("local" if os.getenv("OPENAI_BASE_URL") else None),
+    openai_api_base=os.getenv("OPENAI_BASE_URL") or None,
+    dimensions=EMBEDDING_DIMENSIONS
 )
 
 VECTOR_DIR = "jim_vectorstore"
 
+# bounded pool for FAISS/pickle work (FAISS releases the GIL while searching)
+VECTOR_WORKERS = int(os.getenv("JIM_VECTOR_WORKERS", "2"))
+# how long concurrent adds are collected before one index mutation
+VECTOR_FLUSH_DELAY = float(os.getenv("JIM_VECTOR_FLUSH_DELAY", "0.5"))
+# how often retention + compaction runs in the background
+VECTOR_MAINTENANCE_SECONDS = int(os.getenv("JIM_VECTOR_MAINTENANCE_SECONDS", "3600"))
+# hybrid retrieval: candidates pulled from each side, and optional recency half-life (0 disables)
+HYBRID_CANDIDATES = int(os.getenv("JIM_HYBRID_CANDIDATES", "20"))
+HYBRID_RECENCY_HALF_LIFE_DAYS = float(os.getenv("JIM_HYBRID_RECENCY_HALF_LIFE_DAYS", "0"))
+# in-RAM vector storage: flat | fp16 | sq8 | pq (see vector_quantization)
+VECTOR_STORAGE = os.getenv("JIM_VECTOR_STORAGE", "flat").strip().lower()
+# exact re-scoring of compressed-index candidates from an on-disk float32 sidecar
+VECTOR_RESCORE = os.getenv("JIM_VECTOR_RESCORE", "true").lower() in {"1", "true", "yes", "y"}
+VECTOR_RESCORE_FACTOR = int(os.getenv("JIM_VECTOR_RESCORE_FACTOR", "4"))
+
 def create_vector_store_from_texts(texts):
     logger.info("🆕 Creating new vector store with texts: %s", texts)
     db = FAISS.from_texts(texts, embedding=embedding_model)
@@ -40,3 +70,395 @@ def add_text_to_vector_store(texts):
     except Exception as e:
         logger.warning("⚠️ Failed to load vector store, creating new one. Error: %s", e)
         create_vector_store_from_texts(texts)
+
+
+class _ReadWriteLock:
+    """Many readers at once, or one writer; a waiting writer holds back new readers"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class AsyncVectorStore:
+    """
+    Async facade over the FAISS store for use from discord.py handlers.
+
+    The index is loaded once and kept in memory. Embedding, search, add and
+    save all run in a bounded thread pool, and adds that arrive close together
+    are coalesced into a single index mutation + save. Searches only read the
+    index, so they share a read lock and run concurrently; adds and
+    maintenance take the write lock for the mutation and save under the read
+    lock.
+
+    Entries carry retention metadata (see vector_retention); evicted entries
+    are tombstoned and skipped by searches until the next compaction.
+    Searches only return entries from the caller's scope (``guild_id``), so
+    one server's messages never surface in another's replies.
+
+    A BM25 inverted index over the same texts is maintained alongside the
+    FAISS index for hybrid (dense + keyword) retrieval.
+
+    With JIM_VECTOR_STORAGE set, a flat index is migrated to compressed
+    storage on load/maintenance and candidates are optionally re-scored
+    exactly from a memory-mapped float32 sidecar.
+    """
+
+    def __init__(self, max_workers: int = VECTOR_WORKERS, flush_delay: float = VECTOR_FLUSH_DELAY):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jim-vector")
+        self._flush_delay = flush_delay
+        self._lock = _ReadWriteLock()  # guards self._db (index + docstore), BM25 and sidecar
+        self._save_lock = threading.Lock()  # one save_local at a time
+        self._hits_lock = threading.Lock()  # concurrent searches bump hit counters
+        self._db = None
+        self._loaded = False
+        self._pending: List[Tuple[str, Dict]] = []
+        self._waiters: List[asyncio.Future] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._background: set = set()  # schedule_add tasks, kept alive until done
+        self._tombstones = set()
+        self._bm25 = BM25Index()
+        self._sidecar: Optional[VectorSidecar] = None
+        if VECTOR_STORAGE != "flat" and VECTOR_RESCORE:
+            self._sidecar = VectorSidecar(os.path.join(VECTOR_DIR, SIDECAR_FILE), EMBEDDING_DIMENSIONS)
+
+    # ---------- worker-thread side ----------
+    def _get_db(self):
+        """Return the cached store, loading it from disk on first use (call with write lock held)"""
+        if not self._loaded:
+            self._loaded = True
+            try:
+                self._db = load_vector_store()
+                for doc_id, doc in self._iter_docs(self._db):
+                    doc.metadata.setdefault("doc_id", doc_id)
+                    if doc.metadata.get("deleted"):
+                        self._tombstones.add(doc_id)
+                    else:
+                        self._bm25.add(doc_id, doc.page_content)
+                self._ensure_storage(self._db)
+            except Exception as e:
+                logger.warning("⚠️ No vector store on disk yet (%s); it will be created on first add", e)
+                self._db = None
+        return self._db
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            with self._lock.write():
+                self._get_db()
+
+    def _save(self, db) -> None:
+        """Persist without blocking searches (readers can share the lock with a save).
+
+        Searches still mutate hit counters under the read lock, so those are
+        frozen for the pickle; a search only waits for it when recording hits.
+        """
+        with self._lock.read(), self._save_lock, self._hits_lock:
+            db.save_local(VECTOR_DIR)
+
+    def _ensure_storage(self, db) -> None:
+        """Move a flat index to the configured storage and keep the sidecar in sync (write lock held)"""
+        kind = storage_kind(db.index)
+        total = db.index.ntotal
+        if VECTOR_STORAGE != "flat" and kind == "flat" and total:
+            migrate_index(db, VECTOR_STORAGE, self._sidecar)
+            db.save_local(VECTOR_DIR)
+        elif VECTOR_STORAGE == "pq" and kind == "sq8" and total >= PQ_MIN_TRAIN:
+            # started below the PQ training threshold; train from exact copies when the sidecar has them
+            exact = self._sidecar is not None and len(self._sidecar) == total
+            migrate_index(db, "pq", self._sidecar, self._sidecar.rows(list(range(total))) if exact else None)
+            db.save_local(VECTOR_DIR)
+        elif self._sidecar is not None and len(self._sidecar) != db.index.ntotal:
+            if kind == "flat":
+                self._sidecar.rewrite(reconstruct_all(db.index))
+            else:
+                logger.warning("⚠️ Vector sidecar out of sync with the index; exact re-scoring disabled")
+                self._sidecar = None
+        if VECTOR_STORAGE == "pq" and storage_kind(db.index) == "sq8":
+            logger.info(f"PQ storage pending: {db.index.ntotal}/{PQ_MIN_TRAIN} vectors, using sq8 until then")
+
+    @staticmethod
+    def _in_scope(doc, guild_id: Optional[str]) -> bool:
+        """Live entry from the searching scope (a guild id, "dm:<channel>", or "unknown" for untagged)"""
+        meta = doc.metadata
+        return not meta.get("deleted") and meta.get("guild_id", "unknown") == (guild_id or "unknown")
+
+    def _dense_docs(self, db, vector, k: int, guild_id: Optional[str]):
+        """Nearest in-scope documents by vector, re-scored exactly when a sidecar is available.
+
+        Other guilds' and tombstoned rows are filtered out, so the search is
+        widened until enough candidates survive or the whole index was seen.
+        """
+        import numpy as np
+        query = np.asarray([vector], dtype="float32")
+        want = k * VECTOR_RESCORE_FACTOR if self._sidecar is not None else k
+        total = db.index.ntotal
+        if not total:
+            return []
+        fetch = want
+        while True:
+            _, found = db.index.search(query, min(fetch, total))
+            candidates = {}
+            for pos in (int(p) for p in found[0] if p >= 0):
+                doc = db.docstore.search(db.index_to_docstore_id.get(pos))
+                if hasattr(doc, "metadata") and self._in_scope(doc, guild_id):
+                    candidates[pos] = doc
+            if len(candidates) >= want or fetch >= total:
+                break
+            fetch *= 4
+        positions = list(candidates)
+        if self._sidecar is not None:
+            positions = rescore(query[0], positions, self._sidecar)
+        return [candidates[pos] for pos in positions[:k]]
+
+    @staticmethod
+    def _iter_docs(db):
+        for doc_id in db.index_to_docstore_id.values():
+            doc = db.docstore.search(doc_id)
+            if hasattr(doc, "metadata"):
+                yield doc_id, doc
+
+    @classmethod
+    def _iter_metadata(cls, db):
+        for doc_id, doc in cls._iter_docs(db):
+            yield doc_id, doc.metadata
+
+    def _record_hits(self, docs, now: float) -> None:
+        with self._hits_lock:
+            for doc in docs:
+                doc.metadata["hits"] = doc.metadata.get("hits", 0) + 1
+                doc.metadata["last_hit"] = now
+
+    def _search_sync(self, query: str, k: int, guild_id: Optional[str]) -> List[str]:
+        # the embedding call is network-bound; keep it outside the index lock
+        vector = embedding_model.embed_query(query)
+        now = time.time()
+        self._ensure_loaded()
+        with self._lock.read():
+            db = self._db
+            if db is None:
+                return []
+            results = self._dense_docs(db, vector, k, guild_id)
+            self._record_hits(results, now)
+        return [doc.page_content for doc in results]
+
+    def _hybrid_search_sync(self, query: str, k: int, guild_id: Optional[str], half_life_days: float) -> List[str]:
+        vector = embedding_model.embed_query(query)
+        now = time.time()
+        self._ensure_loaded()
+        with self._lock.read():
+            db = self._db
+            if db is None:
+                return []
+            fetch_k = max(HYBRID_CANDIDATES, k)
+            dense = self._dense_docs(db, vector, fetch_k, guild_id)
+            docs = {doc.metadata["doc_id"]: doc for doc in dense if "doc_id" in doc.metadata}
+            # BM25 ranks every matching doc anyway; walk the full ranking until fetch_k are in scope
+            sparse_ids = []
+            for doc_id, _ in self._bm25.search(query, k=len(self._bm25)):
+                if len(sparse_ids) >= fetch_k:
+                    break
+                doc = docs.get(doc_id) or db.docstore.search(doc_id)
+                if not hasattr(doc, "metadata") or not self._in_scope(doc, guild_id):
+                    continue
+                docs[doc_id] = doc
+                sparse_ids.append(doc_id)
+
+            fused = reciprocal_rank_fusion([[d.metadata["doc_id"] for d in dense if "doc_id" in d.metadata],
+                                            sparse_ids])
+            fused = apply_recency(
+                fused, {doc_id: doc.metadata.get("ts", now) for doc_id, doc in docs.items()},
+                half_life_days, now=now
+            )
+            top = sorted(fused, key=fused.get, reverse=True)[:k]
+            results = [docs[doc_id] for doc_id in top]
+            self._record_hits(results, now)
+        return [doc.page_content for doc in results]
+
+    def _add_sync(self, entries: List[Tuple[str, Dict]]) -> None:
+        texts = [text for text, _ in entries]
+        metadatas = [meta for _, meta in entries]
+        ids = [meta["doc_id"] for meta in metadatas]
+        embeddings = embedding_model.embed_documents(texts)
+        pairs = list(zip(texts, embeddings))
+        with self._lock.write():
+            db = self._get_db()
+            if db is None:
+                self._db = FAISS.from_embeddings(pairs, embedding_model, metadatas=metadatas, ids=ids)
+                if self._sidecar is not None:
+                    self._sidecar.rewrite(embeddings)
+            else:
+                db.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+                if self._sidecar is not None:
+                    self._sidecar.append(embeddings)
+            self._bm25.add_many(zip(ids, texts))
+            db = self._db
+        self._save(db)
+        logger.info("✅ Vector store updated with %d text(s) and saved.", len(texts))
+
+    def _maintain_sync(self, policy: RetentionPolicy) -> Dict[str, int]:
+        """Apply retention, then compact if enough of the index is tombstoned"""
+        now = time.time()
+        with self._lock.write():
+            db = self._get_db()
+            if db is None:
+                return {"evicted": 0, "compacted": 0, "live": 0}
+            self._ensure_storage(db)
+            live = {}
+            for doc_id, meta in self._iter_metadata(db):
+                if meta.get("deleted"):
+                    continue
+                # entries from before retention metadata existed start their clock now
+                meta.setdefault("doc_id", doc_id)
+                meta.setdefault("ts", now)
+                meta.setdefault("guild_id", "unknown")
+                live[doc_id] = meta
+            evicted = select_evictions(live, policy, now)
+            for doc_id in evicted:
+                live[doc_id]["deleted"] = True
+                doc = db.docstore.search(doc_id)
+                self._bm25.remove(doc_id, getattr(doc, "page_content", None))
+            self._tombstones.update(evicted)
+
+            compacted = 0
+            total = db.index.ntotal
+            if total and len(self._tombstones) / total >= policy.compact_ratio:
+                compacted = compact_store(db, self._sidecar)
+                self._tombstones.clear()
+        self._save(db)
+        stats = {"evicted": len(evicted), "compacted": compacted, "live": len(live) - len(evicted)}
+        logger.info(f"Vector store maintenance: {stats}")
+        return stats
+
+    # ---------- event-loop side ----------
+    async def search(self, query: str, k: int = 3, guild_id: Optional[str] = None) -> List[str]:
+        """Search similar texts from the same guild without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._search_sync, query, k, guild_id)
+
+    async def hybrid_search(self, query: str, k: int = 3, guild_id: Optional[str] = None,
+                            recency_half_life_days: float = HYBRID_RECENCY_HALF_LIFE_DAYS) -> List[str]:
+        """Dense + BM25 search within one guild, fused by reciprocal rank, optionally weighted by recency"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._hybrid_search_sync, query, k, guild_id, recency_half_life_days
+        )
+
+    async def add(self, texts: List[str], guild_id: Optional[str] = None) -> None:
+        """Add texts; resolves once the (possibly shared) batch is persisted"""
+        texts = [t for t in texts if t]
+        if not texts:
+            return
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        now = time.time()
+        self._pending.extend(
+            (text, {"doc_id": uuid.uuid4().hex, "ts": now, "guild_id": guild_id or "unknown", "hits": 0})
+            for text in texts
+        )
+        self._waiters.append(waiter)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_loop())
+        await waiter
+
+    def schedule_add(self, texts: List[str], guild_id: Optional[str] = None) -> None:
+        """Fire-and-forget add; failures are logged instead of raised"""
+        async def _run():
+            try:
+                await self.add(texts, guild_id=guild_id)
+            except Exception as e:
+                logger.warning(f"Failed to add message to vector store: {e}")
+        # the loop only holds weak references to tasks; keep ours until it finishes
+        task = asyncio.get_running_loop().create_task(_run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            await asyncio.sleep(self._flush_delay)
+            entries, waiters = self._pending, self._waiters
+            self._pending, self._waiters = [], []
+            try:
+                await loop.run_in_executor(self._executor, self._add_sync, entries)
+            except Exception as e:
+                logger.warning("⚠️ Coalesced vector add of %d text(s) failed: %s", len(entries), e)
+                for w in waiters:
+                    if not w.done():
+                        w.set_exception(e)
+            else:
+                for w in waiters:
+                    if not w.done():
+                        w.set_result(None)
+
+    async def maintain(self, policy: Optional[RetentionPolicy] = None) -> Dict[str, int]:
+        """Run retention + compaction once in the worker pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._maintain_sync, policy or RetentionPolicy())
+
+    def start_maintenance(self, interval: int = VECTOR_MAINTENANCE_SECONDS,
+                          policy: Optional[RetentionPolicy] = None) -> None:
+        """Start the periodic retention/compaction task (idempotent)"""
+        if self._maintenance_task and not self._maintenance_task.done():
+            return
+
+        async def _loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.maintain(policy)
+                except Exception as e:
+                    logger.error(f"Vector store maintenance failed: {e}")
+        self._maintenance_task = asyncio.get_running_loop().create_task(_loop())
+
+    def close(self):
+        """Stop the worker pool (pending adds are dropped)"""
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+        self._executor.shutdown(wait=False)
+
+
+# shared facade for the bot processes
+async_vector_store = AsyncVectorStore()
+
+async def async_search_similar_texts(query, k=3, guild_id=None):
+    return await async_vector_store.search(query, k=k, guild_id=guild_id)
+
+async def async_hybrid_search_texts(query, k=3, guild_id=None):
+    return await async_vector_store.hybrid_search(query, k=k, guild_id=guild_id)
+
+async def async_add_text_to_vector_store(texts, guild_id=None):
+    await async_vector_store.add(texts, guild_id=guild_id)
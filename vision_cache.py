@@ -0,0 +1,150 @@
+"""
+Content-addressed cache of image descriptions.
+
+Reposted memes and reaction GIFs are looked up by the SHA-256 of their bytes
+first, then by perceptual hash (dHash, within a small Hamming distance) so
+re-encoded or resized copies also hit. A hit returns the stored model
+description and the vision call is skipped. Entries are kept in LRU order,
+capped in size, and flushed to a JSON file shortly after changes.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+VISION_CACHE_PATH = os.getenv("JIM_VISION_CACHE_PATH", "image_cache/vision_descriptions.json")
+VISION_CACHE_MAX_ENTRIES = int(os.getenv("JIM_VISION_CACHE_MAX", "5000"))
+VISION_CACHE_PHASH_DISTANCE = int(os.getenv("JIM_VISION_CACHE_PHASH_DISTANCE", "6"))  # of 64 bits
+VISION_CACHE_FLUSH_SECONDS = float(os.getenv("JIM_VISION_CACHE_FLUSH_SECONDS", "10"))
+# near-flat images (blank screenshots, solid colours) all hash alike; match those exactly only
+PHASH_MIN_BITS, PHASH_MAX_BITS = 8, 56
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def usable_phash(phash: Optional[int]) -> Optional[int]:
+    if phash is None or not PHASH_MIN_BITS <= phash.bit_count() <= PHASH_MAX_BITS:
+        return None
+    return phash
+
+
+class VisionCache:
+    """sha256 -> {"description", "phash", "ts"} in LRU order, persisted to disk"""
+
+    def __init__(self, path: str = VISION_CACHE_PATH, max_entries: int = VISION_CACHE_MAX_ENTRIES,
+                 phash_distance: int = VISION_CACHE_PHASH_DISTANCE):
+        self.path = path
+        self.max_entries = max_entries
+        self.phash_distance = phash_distance
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._loaded = False
+        self._dirty = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self.stats = {"exact_hits": 0, "phash_hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+    # ---------- persistence ----------
+    def _load_sync(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable vision cache {self.path}: {e}")
+            return
+        # stored oldest-first, so insertion order restores the LRU order
+        for row in rows[-self.max_entries:]:
+            self._entries[row["sha"]] = {"description": row["description"], "phash": row.get("phash"),
+                                         "ts": row.get("ts", 0)}
+        logger.info(f"Loaded {len(self._entries)} cached image descriptions")
+
+    def _save_sync(self, rows) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rows, f)
+        os.replace(tmp, self.path)
+
+    async def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self._loaded = True
+            await asyncio.to_thread(self._load_sync)
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(VISION_CACHE_FLUSH_SECONDS)
+        await self.flush()
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return  # also keeps an unloaded cache from overwriting the file
+        self._dirty = False
+        rows = [{"sha": sha, **entry} for sha, entry in self._entries.items()]
+        try:
+            await asyncio.to_thread(self._save_sync, rows)
+        except OSError as e:
+            logger.error(f"Failed to save vision cache: {e}")
+
+    # ---------- lookups ----------
+    async def get(self, sha: str) -> Optional[str]:
+        """Exact match on content hash"""
+        await self._ensure_loaded()
+        entry = self._entries.get(sha)
+        if entry is None:
+            return None
+        self._entries.move_to_end(sha)
+        self.stats["exact_hits"] += 1
+        return entry["description"]
+
+    def get_similar(self, phash: Optional[int]) -> Optional[str]:
+        """Nearest perceptual match within phash_distance (call after get())"""
+        phash = usable_phash(phash)
+        if phash is None:
+            self.stats["misses"] += 1
+            return None
+        best_sha, best_distance = None, self.phash_distance + 1
+        for sha, entry in self._entries.items():
+            if entry["phash"] is not None:
+                distance = (entry["phash"] ^ phash).bit_count()
+                if distance < best_distance:
+                    best_sha, best_distance = sha, distance
+        if best_sha is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(best_sha)
+        self.stats["phash_hits"] += 1
+        return self._entries[best_sha]["description"]
+
+    def put(self, sha: str, description: str, phash: Optional[int] = None) -> None:
+        self._entries[sha] = {"description": description, "phash": usable_phash(phash), "ts": int(time.time())}
+        self._entries.move_to_end(sha)
+        self.stats["stored"] += 1
+        self._dirty = True
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+        self._schedule_flush()
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["exact_hits"] + self.stats["phash_hits"] + self.stats["misses"]
+        hit_rate = (self.stats["exact_hits"] + self.stats["phash_hits"]) / lookups if lookups else 0.0
+        return {**self.stats, "entries": len(self._entries), "hit_rate": round(hit_rate, 4)}
+
+
+# shared cache for the whole process
+vision_cache = VisionCache()
+metrics.register("vision_cache", vision_cache.get_stats)
@@ -5,11 +5,11 @@ import asyncio
 import aiohttp
 import io
 import os
-import tempfile
 import logging
 from typing import Optional
 from openai import AsyncOpenAI
-from openai_client import generate_response
+from openai_client import OPENAI_API_KEY, OPENAI_BASE_URL, call_openai, generate_response
+from request_scheduler import PRIORITY_DIRECT
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +35,7 @@ class VoiceRecorder:
 class VoiceSystem(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.openai_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
         self.voice_clients = {}  # guild_id -> voice_client
         self.listening_channels = {}  # guild_id -> channel_id where bot is listening
         self.conversation_mode = {}  # guild_id -> bool (natural conversation mode)
@@ -54,11 +54,15 @@ class VoiceSystem(commands.Cog):
     async def generate_speech(self, text: str, voice: str = "nova") -> bytes:
         """Generate speech using OpenAI TTS API"""
         try:
-            response = await self.openai_client.audio.speech.create(
-                model="tts-1-hd",  # High quality model
-                voice=voice,
-                input=text,
-                speed=1.0
+            # live voice shares the direct-mention lane of the OpenAI scheduler
+            response = await call_openai(
+                lambda: self.openai_client.audio.speech.with_raw_response.create(
+                    model="tts-1-hd",  # High quality model
+                    voice=voice,
+                    input=text,
+                    speed=1.0
+                ),
+                priority=PRIORITY_DIRECT
             )
             return response.content
         except Exception as e:
@@ -68,18 +72,15 @@ class VoiceSystem(commands.Cog):
     async def transcribe_audio(self, audio_data: bytes) -> str:
         """Transcribe audio using OpenAI Whisper API"""
         try:
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-                temp_file.write(audio_data)
-                temp_file_path = temp_file.name
-
-            with open(temp_file_path, "rb") as audio_file:
-                response = await self.openai_client.audio.transcriptions.create(
+            # pass bytes rather than a file handle so scheduler retries can resend them
+            response = await call_openai(
+                lambda: self.openai_client.audio.transcriptions.with_raw_response.create(
                     model="whisper-1",
-                    file=audio_file,
+                    file=("audio.wav", audio_data),
                     language="en"
-                )
-            
-            os.unlink(temp_file_path)
+                ),
+                priority=PRIORITY_DIRECT
+            )
             return response.text
             
         except Exception as e:
@@ -96,7 +97,8 @@ class VoiceSystem(commands.Cog):
             response = await generate_response(
                 transcribed_text, 
                 user.display_name, 
-                user_memory
+                user_memory,
+                route="voice"
             )
             
             # Update user memory
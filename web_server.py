@@ -1,6 +1,7 @@
 import os
 from flask import Flask, jsonify
 from models import create_app, db, Conversation
+import circuit_breaker
 
 # Create Flask app using the factory function
 app = create_app()
@@ -22,15 +23,20 @@ def health():
         with app.app_context():
             db.session.execute('SELECT 1')
         
+        circuits = circuit_breaker.snapshot()
+        open_circuits = [name for name, c in circuits.items() if c["state"] != "closed"]
         return jsonify({
-            "status": "healthy",
+            "status": "degraded" if open_circuits else "healthy",
             "database": "connected",
-            "message": "all systems go, ready to talk shit 🔥"
+            "circuits": circuits,
+            "message": f"running on fumes, {', '.join(open_circuits)} acting up" if open_circuits
+                       else "all systems go, ready to talk shit 🔥"
         })
     except Exception as e:
         return jsonify({
             "status": "unhealthy",
             "error": str(e),
+            "circuits": circuit_breaker.snapshot(),
             "message": "shit's broken, working on it"
         }), 500
 
@@ -53,6 +59,12 @@ def stats():
             "message": "couldn't grab stats, servers being a bitch"
         }), 500
 
+@app.route('/metrics')
+def metrics_route():
+    """In-process metrics (caches, coalescing, ...)"""
+    import metrics
+    return jsonify(metrics.snapshot())
+
 @app.route('/ping')
 def ping():
     """Simple ping endpoint"""